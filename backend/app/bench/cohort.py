@@ -0,0 +1,217 @@
+"""Synthetic cohort: N users with up to 28 days of history each, for capacity planning.
+
+Each user gets a timezone, a signup date, a daily check-in probability and a dropout rate, so
+histories have gaps that break streaks and users who stop early. A per-user on-chain propensity
+decides which logs are confirmed and which confirmed days are minted; complete 7/14/28-day
+prefixes may mint milestones. Proofs use the real compute_proof_hash/generate_salt_hex, and
+UserProgress, ProgressSummary and MilestoneToken rows are derived from the generated logs with
+the same masks, streak rule and token ids the app uses, so `cli check-progress-summaries` finds
+no drift.
+
+Rows go in with executemany Core inserts, ``batch_users`` users per transaction.
+Run from backend/: python -m app.cli seed-cohort --users 100000
+"""
+import hashlib
+import random
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy.engine import Engine
+
+from ..config import settings
+from ..models import DailyLog, MilestoneToken, ProgressSummary, UserProgress
+from ..services import progress_summary
+from ..services.crypto import compute_proof_hash, generate_salt_hex, normalize_text, sha256_hex
+from ..services.milestones import token_id_for_milestone
+from ..services.time import add_days
+
+# (timezone, weight): roughly where the users are
+TIMEZONES = (
+    ("Asia/Shanghai", 55), ("Asia/Tokyo", 8), ("Asia/Singapore", 7), ("Europe/London", 6),
+    ("Europe/Berlin", 6), ("America/New_York", 8), ("America/Los_Angeles", 7), ("Australia/Sydney", 3),
+)
+PHRASES = (
+    "今天还活着", "下班路上看了一会儿晚霞", "和朋友打了十分钟电话", "早起喝了一杯温水",
+    "有点累，但还是出门走了走", "把房间收拾了一角", "认真吃了一顿午饭", "睡前读了几页书",
+    "今天的情绪像阴天，慢慢在变亮", "给自己写了一句鼓励的话",
+)
+REFLECTIONS = (
+    {"note": "你今天照顾了自己，这一步很重要。", "next": "现在喝一杯温水。"},
+    {"note": "愿意写下来，就是在给自己空间。", "next": "起身伸展一分钟。"},
+    {"note": "小小的行动也在累积力量。", "next": "把明天的第一件事写下来。"},
+)
+MILESTONE_DAYS = ((1, 7), (2, 14), (3, 28))
+
+
+@dataclass
+class CohortStats:
+    users: int = 0
+    logs: int = 0
+    submitted: int = 0
+    day_mints: int = 0
+    milestones: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        rows = self.users * 2 + self.logs + self.milestones
+        return rows / self.seconds if self.seconds else 0.0
+
+
+def _hex(rng: random.Random, nbytes: int) -> str:
+    return "0x" + rng.getrandbits(nbytes * 8).to_bytes(nbytes, "big").hex()
+
+
+def _address(seed: int, index: int) -> str:
+    return "0x" + hashlib.sha256(f"cohort|{seed}|{index}".encode()).hexdigest()[:40]
+
+
+def _user_rows(rng: random.Random, address: str, start_date_key: str, challenge_id: int, now: datetime) -> Dict[str, list]:
+    timezone = rng.choices([tz for tz, _ in TIMEZONES], weights=[w for _, w in TIMEZONES])[0]
+    show_up = rng.betavariate(5, 1.6)  # most users check in most days
+    dropout = rng.choice((0.0, 0.0, 0.02, 0.05, 0.12))
+    onchain = rng.random() < 0.7
+    confirm_rate = rng.uniform(0.6, 1.0)
+    mint_rate = rng.uniform(0.3, 0.9)
+
+    logs: List[dict] = []
+    completed = submitted_mask = minted = streak = 0
+    for day_index in range(1, progress_summary.DAYS + 1):
+        if logs and rng.random() < dropout:
+            break
+        if rng.random() > show_up:
+            continue
+        # dates follow day indexes, so consecutive days are consecutive dates (the streak rule)
+        streak = streak + 1 if logs and logs[-1]["day_index"] == day_index - 1 else 1
+        date_key = add_days(start_date_key, day_index - 1)
+        text = normalize_text(" ".join(rng.sample(PHRASES, rng.randint(1, 3))))
+        salt = generate_salt_hex()
+        submitted = onchain and rng.random() < confirm_rate
+        day_nft = submitted and rng.random() < mint_rate
+        bit = progress_summary.day_bit(day_index)
+        completed |= bit
+        submitted_mask |= bit if submitted else 0
+        minted |= bit if day_nft else 0
+        created_at = datetime.fromisoformat(date_key) + timedelta(hours=rng.randint(7, 23), minutes=rng.randint(0, 59))
+        logs.append({
+            "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            "address": address,
+            "challenge_id": challenge_id,
+            "day_index": day_index,
+            "date_key": date_key,
+            "input_hash": sha256_hex(text),
+            "normalized_text": text,
+            "reflection": rng.choice(REFLECTIONS),
+            "reflection_status": "READY",
+            "salt_hex": salt,
+            "proof_hash": compute_proof_hash(date_key, text, salt),
+            "status": "SUBMITTED" if submitted else "CREATED",
+            "chain_id": settings.chain_id if submitted else None,
+            "contract_address": settings.proof_registry_address if submitted else None,
+            "tx_hash": _hex(rng, 32) if submitted else None,
+            "day_nft_tx_hash": _hex(rng, 32) if day_nft else None,
+            "block_number": None,
+            "created_at": created_at,
+        })
+
+    # the masks summary_from_logs would rebuild, without a model instance per log
+    mint_count = progress_summary.count_days(minted)
+    milestones: Dict[str, Optional[str]] = {"1": None, "2": None, "3": None}
+    tokens = []
+    for milestone_id, last_day in MILESTONE_DAYS:
+        if progress_summary.has_days_through(completed, last_day) and rng.random() < mint_rate:
+            tx_hash = _hex(rng, 32)
+            milestones[str(milestone_id)] = tx_hash
+            tokens.append({
+                "token_id": str(token_id_for_milestone(address, milestone_id)),
+                "address": address,
+                "milestone_id": milestone_id,
+                "tx_hash": tx_hash,
+                "created_at": now,
+            })
+    final_minted = mint_count == progress_summary.DAYS and rng.random() < mint_rate
+    last = logs[-1] if logs else None
+    progress = {
+        "address": address,
+        "display_name": None,
+        "avatar_url": None,
+        "timezone": timezone,
+        "challenge_id": challenge_id,
+        "start_date_key": start_date_key,
+        "streak": streak,
+        "last_date_key": last["date_key"] if last else None,
+        "last_day_index": last["day_index"] if last else None,
+        "day_mint_count": mint_count,
+        "final_minted": final_minted,
+        "final_nft_tx_hash": _hex(rng, 32) if final_minted else None,
+        "milestones": milestones,
+        "created_at": now,
+        "updated_at": now,
+    }
+    summary_row = {
+        "address": address,
+        "challenge_id": challenge_id,
+        "completed_mask": completed,
+        "submitted_mask": submitted_mask,
+        "minted_mask": minted,
+        "mint_count": mint_count,
+        "streak": streak,
+        "updated_at": now,
+    }
+    return {"progress": [progress], "logs": logs, "summaries": [summary_row], "tokens": tokens}
+
+
+def _flush(engine: Engine, batch: Dict[str, list]) -> None:
+    with engine.begin() as conn:
+        for table, rows in (
+            (UserProgress.__table__, batch["progress"]),
+            (DailyLog.__table__, batch["logs"]),
+            (ProgressSummary.__table__, batch["summaries"]),
+            (MilestoneToken.__table__, batch["tokens"]),
+        ):
+            if rows:
+                conn.execute(table.insert(), rows)
+
+
+def generate_cohort(
+    engine: Engine,
+    users: int,
+    seed: int = 1,
+    start_date_key: Optional[str] = None,
+    spread_days: int = 60,
+    batch_users: int = 2000,
+    challenge_id: Optional[int] = None,
+    progress=None,
+) -> CohortStats:
+    """Insert ``users`` synthetic users. Signups are spread over ``spread_days`` days starting at
+    ``start_date_key`` (default: 90 days ago). Addresses depend only on seed and index, so the
+    same seed cannot be loaded twice into one database."""
+    rng = random.Random(seed)
+    challenge_id = settings.challenge_id if challenge_id is None else challenge_id
+    start = date.fromisoformat(start_date_key) if start_date_key else date.today() - timedelta(days=90)
+    now = datetime.utcnow()
+    stats = CohortStats()
+    started = time.perf_counter()
+    batch: Dict[str, list] = {"progress": [], "logs": [], "summaries": [], "tokens": []}
+
+    for index in range(users):
+        signup = (start + timedelta(days=rng.randrange(max(1, spread_days)))).isoformat()
+        rows = _user_rows(rng, _address(seed, index), signup, challenge_id, now)
+        for name, values in rows.items():
+            batch[name].extend(values)
+        stats.users += 1
+        stats.logs += len(rows["logs"])
+        stats.submitted += sum(1 for log in rows["logs"] if log["tx_hash"])
+        stats.day_mints += sum(1 for log in rows["logs"] if log["day_nft_tx_hash"])
+        stats.milestones += len(rows["tokens"])
+        if stats.users % batch_users == 0:
+            _flush(engine, batch)
+            batch = {name: [] for name in batch}
+            if progress is not None:
+                progress(stats)
+    _flush(engine, batch)
+    stats.seconds = time.perf_counter() - started
+    return stats
@@ -0,0 +1,278 @@
+"""In-process load harness: N synthetic users walking the daily journey against a scratch database.
+
+Each user runs, per day: POST /user -> GET /homeSnapshot -> GET /dailySnapshot -> POST /checkin
+-> POST /tx/confirm [-> POST /ai/generate-nft] -> GET /progress -> GET /report. ChatBot and the
+image providers are replaced by offline stubs whose latency is drawn from a configurable
+distribution (seeded, so runs are repeatable); everything else is the real app.
+
+Run from backend/: python -m app.bench.load --users 50 --days 3 --llm-latency lognormal:0.8:0.4
+Latency specs: 0.5 (fixed seconds), uniform:A:B, normal:MEAN:SD, lognormal:MEDIAN:SIGMA, exp:MEAN.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import httpx
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel, create_engine
+
+from .. import database
+from ..config import settings
+from ..main import app
+from ..metrics import percentile
+from ..services import image_store, llm, nft_image, nft_jobs
+
+Latency = Callable[[], float]
+
+JOURNEY = (
+    "POST /user", "GET /homeSnapshot", "GET /dailySnapshot", "POST /checkin",
+    "POST /tx/confirm", "POST /ai/generate-nft", "GET /progress", "GET /report",
+)
+TIMEZONES = ("Asia/Shanghai", "Asia/Tokyo", "Europe/London", "America/New_York", "America/Los_Angeles")
+
+
+def parse_latency(spec: str, rng: random.Random) -> Latency:
+    kind, _, rest = spec.partition(":")
+    if not rest:
+        value = float(kind)
+        return lambda: value
+    args = [float(part) for part in rest.split(":")]
+    if kind == "uniform":
+        return lambda: rng.uniform(args[0], args[1])
+    if kind == "normal":
+        return lambda: max(0.0, rng.gauss(args[0], args[1]))
+    if kind == "lognormal":
+        return lambda: args[0] * math.exp(rng.gauss(0.0, args[1]))
+    if kind == "exp":
+        return lambda: rng.expovariate(1.0 / args[0])
+    raise ValueError(f"unknown latency distribution {kind!r}")
+
+
+def _digest(*parts: Any) -> str:
+    return hashlib.sha256("|".join(str(p) for p in parts).encode()).hexdigest()
+
+
+def _stub_chatbot(latency: Latency):
+    class StubStreamManager:
+        async def chat_stream(self, messages, provider=None, **kwargs):
+            reply = StubChatBot.reply_for(messages[-1].content, "JSON" in (messages[0].content if messages else ""))
+            await asyncio.sleep(latency())
+            for i in range(0, len(reply), 16):
+                yield reply[i:i + 16]
+
+    class StubChatBot:
+        """Offline ChatBot: answers after latency() seconds with text derived from the prompt."""
+
+        llm_provider = "stub"
+        llm_manager = StubStreamManager()
+
+        def __init__(self, *args, **kwargs):
+            pass
+
+        @staticmethod
+        def reply_for(prompt: str, wants_json: bool) -> str:
+            token = _digest(prompt)[:8]
+            if wants_json:
+                return json.dumps({"note": f"今天的记录已收到（{token}），你把感受说清楚了。", "next": "现在起身喝一杯温水。"}, ensure_ascii=False)
+            return f"这段时间你保持了记录的节奏（{token}），继续每天一小步。"
+
+        async def ask(self, messages, system_msg=None, output_queue=None):
+            await asyncio.sleep(latency())
+            return self.reply_for(messages[-1]["content"], "JSON" in (system_msg or ""))
+
+    return StubChatBot
+
+
+def _stub_provider(name: str, latency: Latency):
+    async def provider(client, prompt, *args):
+        store = args[-1]
+        await asyncio.sleep(latency())
+        # a tiny deterministic SVG per prompt; same prompt, same digest
+        return store.put(f'<svg xmlns="http://www.w3.org/2000/svg"><!-- {name} {_digest(prompt)} --></svg>'.encode(), "image/svg+xml")
+
+    return provider
+
+
+@contextmanager
+def patched(target, **values) -> Iterator[None]:
+    saved = {name: getattr(target, name) for name in values}
+    for name, value in values.items():
+        setattr(target, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(target, name, value)
+
+
+@contextmanager
+def harness(database_url: str, workdir: Path, llm_latency: Latency, image_latency: Latency) -> Iterator[None]:
+    """Point the app at a scratch database and stubbed LLM/image providers; undone on exit."""
+    engine = create_engine(database.sync_url(database_url), connect_args=database._connect_args(database_url))
+    SQLModel.metadata.create_all(engine)
+    async_engine = create_async_engine(database_url) if database.is_async_url(database_url) else None
+    store = image_store.ImageStore(workdir / "images", max_bytes=256 * 1024 * 1024)
+    try:
+        with patched(database, engine=engine, async_engine=async_engine), \
+                patched(llm, ChatBot=_stub_chatbot(llm_latency), _pool=None), \
+                patched(nft_image, _pollinations_image=_stub_provider("pollinations", image_latency),
+                        _gemini_image=_stub_provider("gemini", image_latency)), \
+                patched(image_store, _store=store), \
+                patched(nft_jobs, _queue=None), \
+                patched(settings, demo_mode=True, demo_start_date_key="2026-01-01", reflection_mode="sync"):
+            try:
+                yield
+            finally:
+                nft_jobs.shutdown_nft_job_queue()
+    finally:
+        engine.dispose()
+
+
+class Recorder:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {step: [] for step in JOURNEY}
+        self.errors: Dict[str, int] = {step: 0 for step in JOURNEY}
+
+    async def call(self, step: str, request) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await request
+        except Exception:
+            response = None
+        self.samples[step].append(time.perf_counter() - started)
+        if response is None or response.status_code >= 400:
+            self.errors[step] += 1
+        return response
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        endpoints = {}
+        total = 0
+        for step in JOURNEY:
+            values = sorted(self.samples[step])
+            if not values:
+                continue
+            total += len(values)
+            endpoints[step] = {
+                "count": len(values),
+                "errors": self.errors[step],
+                "rps": round(len(values) / elapsed, 2),
+                "mean_ms": round(sum(values) / len(values) * 1000, 2),
+                "p50_ms": round(percentile(values, 50) * 1000, 2),
+                "p95_ms": round(percentile(values, 95) * 1000, 2),
+                "p99_ms": round(percentile(values, 99) * 1000, 2),
+                "max_ms": round(values[-1] * 1000, 2),
+            }
+        return {
+            "elapsed_s": round(elapsed, 3),
+            "requests": total,
+            "errors": sum(self.errors.values()),
+            "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+            "endpoints": endpoints,
+        }
+
+
+async def _journey(client: httpx.AsyncClient, rec: Recorder, user: int, days: int, with_nft: bool, rng: random.Random) -> None:
+    address = "0x" + _digest("load", user)[:40]
+    timezone = TIMEZONES[user % len(TIMEZONES)]
+    await rec.call("POST /user", client.post("/user", json={"address": address, "timezone": timezone, "displayName": f"load{user}"}))
+    for day in range(1, days + 1):
+        await rec.call("GET /homeSnapshot", client.get("/homeSnapshot", params={"address": address}))
+        await rec.call("GET /dailySnapshot", client.get("/dailySnapshot", params={"address": address, "dayIndex": day}))
+        text = f"第{day}天：{_digest(address, day)[:12]} 今天也在慢慢来。"
+        checkin = await rec.call("POST /checkin", client.post("/checkin", json={
+            "address": address, "dayIndex": day, "text": text, "timezone": timezone,
+        }))
+        if checkin is not None and checkin.status_code == 200:
+            log = checkin.json()["log"]
+            await rec.call("POST /tx/confirm", client.post("/tx/confirm", json={
+                "address": address, "logId": log["id"], "txHash": "0x" + _digest("tx", log["id"]),
+                "chainId": settings.chain_id, "contractAddress": settings.proof_registry_address,
+            }))
+            if with_nft:
+                await rec.call("POST /ai/generate-nft", client.post("/ai/generate-nft", json={
+                    "dayIndex": day, "taskTitle": f"Day {day}", "userText": text,
+                    "reflectionNote": log["reflection"]["note"],
+                }))
+        await rec.call("GET /progress", client.get("/progress", params={"address": address}))
+        await rec.call("GET /report", client.get("/report", params={"address": address, "range": "week"}))
+        # think time between days keeps users from moving in lockstep
+        await asyncio.sleep(rng.uniform(0, 0.01))
+
+
+async def _drive(users: int, days: int, concurrency: int, with_nft: bool, seed: int) -> Dict[str, Any]:
+    rec = Recorder()
+    gate = asyncio.Semaphore(concurrency)
+    rngs = [random.Random(seed + user) for user in range(users)]
+
+    async def one(user: int) -> None:
+        async with gate:
+            await _journey(client, rec, user, days, with_nft, rngs[user])
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://load", timeout=120) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(one(user) for user in range(users)))
+        elapsed = time.perf_counter() - started
+    return rec.summary(elapsed)
+
+
+def run(
+    users: int = 20,
+    days: int = 3,
+    concurrency: Optional[int] = None,
+    database_url: Optional[str] = None,
+    llm_latency: str = "0.05",
+    image_latency: str = "0.1",
+    with_nft: bool = False,
+    seed: int = 1,
+) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory(prefix="alive-load-") as tmp:
+        workdir = Path(tmp)
+        url = database_url or f"sqlite:///{workdir / 'load.db'}"
+        with harness(url, workdir, parse_latency(llm_latency, rng), parse_latency(image_latency, rng)):
+            result = asyncio.run(_drive(users, days, concurrency or users, with_nft, seed))
+    result["config"] = {
+        "users": users,
+        "days": days,
+        "concurrency": concurrency or users,
+        "database": "sqlite (temp)" if database_url is None else database_url.split(":", 1)[0],
+        "llm_latency": llm_latency,
+        "image_latency": image_latency,
+        "with_nft": with_nft,
+        "seed": seed,
+    }
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.bench.load")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--days", type=int, default=3, help="journeys per user (dayIndex 1..days)")
+    parser.add_argument("--concurrency", type=int, default=None, help="users in flight at once (default: all)")
+    parser.add_argument("--database-url", default=None, help="scratch database; default is a temp SQLite file")
+    parser.add_argument("--llm-latency", default="0.05")
+    parser.add_argument("--image-latency", default="0.1")
+    parser.add_argument("--with-nft", action="store_true", help="also generate the Day NFT image each day")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", default="load-results.json")
+    args = parser.parse_args()
+    if args.days < 1 or args.days > 28:
+        parser.error("--days must be between 1 and 28")
+    result = run(args.users, args.days, args.concurrency, args.database_url, args.llm_latency,
+                 args.image_latency, args.with_nft, args.seed)
+    Path(args.out).write_text(json.dumps(result, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(json.dumps({k: result[k] for k in ("requests", "errors", "throughput_rps", "elapsed_s")}, indent=2))
+    print(f"per-endpoint latencies written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Micro-benchmarks for the helpers every request runs: text normalization and hashing, milestone
+token ids and date-key arithmetic.
+
+Each case is timed with timeit (autoranged loop, best of --repeat runs) and reported as ns per
+call. ``run`` writes a JSON baseline; ``compare`` times the current tree (or reads a second file)
+and flags cases slower than the baseline by more than --threshold, exiting 1 if any are.
+
+Run from backend/:
+    python -m app.bench.micro run --out micro-baseline.json
+    python -m app.bench.micro compare micro-baseline.json --threshold 0.25
+"""
+import argparse
+import json
+import platform
+import sys
+import timeit
+from itertools import cycle
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from ..services.crypto import compute_proof_hash, normalize_text, sha256_hex
+from ..services.milestones import token_id_for_milestone
+from ..services.time import date_key_for_day_index, date_key_for_timezone, diff_days
+
+Case = Tuple[str, Callable[[], Any]]
+
+SALT = "0x" + "5a" * 16
+ADDRESS = "0x" + "ab" * 20
+SENTENCE = "今天下班路上看了一会儿晚霞，  心情慢慢  平静下来。\n"
+TEXT_SIZES = (16, 120, 500, 2000)  # 2000 exercises the 500-char cap
+TIMEZONES = (
+    "Asia/Shanghai", "Asia/Tokyo", "Asia/Singapore", "Asia/Kolkata", "Europe/London", "Europe/Berlin",
+    "America/New_York", "America/Los_Angeles", "America/Sao_Paulo", "Australia/Sydney", "Pacific/Auckland", "UTC",
+)
+
+
+def _text(chars: int) -> str:
+    return (SENTENCE * (chars // len(SENTENCE) + 1))[:chars]
+
+
+def cases() -> List[Case]:
+    result: List[Case] = []
+    for size in TEXT_SIZES:
+        raw = _text(size)
+        normalized = normalize_text(raw)
+        result += [
+            (f"normalize_text[{size}]", lambda raw=raw: normalize_text(raw)),
+            (f"sha256_hex[{size}]", lambda text=normalized: sha256_hex(text)),
+            (f"compute_proof_hash[{size}]", lambda text=normalized: compute_proof_hash("2026-01-01", text, SALT)),
+        ]
+    milestone = cycle((1, 2, 3))
+    zones = cycle(TIMEZONES)
+    days = cycle(range(1, 29))
+    result += [
+        ("token_id_for_milestone", lambda: token_id_for_milestone(ADDRESS, next(milestone))),
+        (f"date_key_for_timezone[{len(TIMEZONES)} zones]", lambda: date_key_for_timezone(next(zones))),
+        ("diff_days", lambda: diff_days("2026-01-01", "2026-01-28")),
+        ("date_key_for_day_index", lambda: date_key_for_day_index("2026-01-01", next(days))),
+    ]
+    return result
+
+
+def time_case(fn: Callable[[], Any], repeat: int) -> float:
+    """Best-of-``repeat`` nanoseconds per call; each run loops long enough (~0.2s) to be stable."""
+    timer = timeit.Timer(fn)
+    loops, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=loops)) / loops * 1e9
+
+
+def run(repeat: int = 5, only: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    selected = [(name, fn) for name, fn in cases() if not only or any(part in name for part in only)]
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "repeat": repeat,
+        "results": {name: round(time_case(fn, repeat), 1) for name, fn in selected},
+    }
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """One row per case present in both, with ``regressed`` set when current/baseline > 1 + threshold."""
+    rows = []
+    for name, before in baseline["results"].items():
+        after = current["results"].get(name)
+        if after is None or not before:
+            continue
+        ratio = after / before
+        rows.append({"case": name, "baseline_ns": before, "current_ns": after, "ratio": round(ratio, 3),
+                     "regressed": ratio > 1 + threshold})
+    return rows
+
+
+def _print_rows(rows: List[Dict[str, Any]]) -> None:
+    width = max((len(row["case"]) for row in rows), default=10)
+    for row in rows:
+        flag = "  REGRESSED" if row["regressed"] else ""
+        print(f"{row['case']:<{width}}  {row['baseline_ns']:>10.1f} -> {row['current_ns']:>10.1f} ns  x{row['ratio']:.2f}{flag}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.bench.micro")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("run", help="time every case and write a baseline")
+    p.add_argument("--out", default="micro-baseline.json")
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--only", nargs="*", help="substrings of case names to run")
+
+    p = sub.add_parser("compare", help="compare against a baseline; exit 1 on regressions")
+    p.add_argument("baseline")
+    p.add_argument("current", nargs="?", help="results file to compare; default times the current tree")
+    p.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%")
+    p.add_argument("--repeat", type=int, default=5)
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        result = run(args.repeat, args.only)
+        Path(args.out).write_text(json.dumps(result, indent=2), encoding="utf-8")
+        for name, ns in result["results"].items():
+            print(f"{name}: {ns:.1f} ns")
+        print(f"baseline written to {args.out}")
+        return 0
+
+    baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+    if args.current:
+        current = json.loads(Path(args.current).read_text(encoding="utf-8"))
+    else:
+        current = run(args.repeat, baseline["results"].keys())
+    rows = compare(baseline, current, args.threshold)
+    _print_rows(rows)
+    regressed = [row["case"] for row in rows if row["regressed"]]
+    print(f"{len(regressed)} of {len(rows)} cases slower than baseline by more than {args.threshold:.0%}")
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
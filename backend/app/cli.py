@@ -0,0 +1,116 @@
+"""Operator commands. Run from backend/: python -m app.cli <command>"""
+import argparse
+import sys
+
+from sqlmodel import Session
+
+from . import database
+from .database import init_db
+
+
+def _backfill_milestone_tokens(args: argparse.Namespace) -> int:
+    from .services.milestones import backfill_milestone_tokens
+
+    init_db()
+    with Session(database.engine) as session:
+        created = backfill_milestone_tokens(session)
+    print(f"indexed {created} milestone tokens")
+    return 0
+
+
+def _check_progress_summaries(args: argparse.Namespace) -> int:
+    from .services.progress_summary import check_progress_summaries
+
+    init_db()
+    with Session(database.engine) as session:
+        drift = check_progress_summaries(session, fix=args.fix)
+    for d in drift:
+        print(f"{d.address} challenge={d.challenge_id} {d.field}: stored={d.stored} expected={d.expected}")
+    verb = "fixed" if args.fix else "found"
+    print(f"{verb} {len(drift)} drifted fields")
+    return 1 if drift and not args.fix else 0
+
+
+def _seed_cohort(args: argparse.Namespace) -> int:
+    from .bench.cohort import generate_cohort
+
+    init_db()
+
+    def report(stats) -> None:
+        print(f"  {stats.users} users, {stats.logs} logs", flush=True)
+
+    stats = generate_cohort(
+        database.engine,
+        args.users,
+        seed=args.seed,
+        start_date_key=args.start_date,
+        spread_days=args.spread_days,
+        batch_users=args.batch_size,
+        progress=report if args.verbose else None,
+    )
+    print(
+        f"inserted {stats.users} users, {stats.logs} logs ({stats.submitted} on-chain, {stats.day_mints} day mints), "
+        f"{stats.milestones} milestone tokens in {stats.seconds:.1f}s ({stats.rows_per_second:.0f} rows/s)"
+    )
+    return 0
+
+
+def _pregenerate_weekly_reports(args: argparse.Namespace) -> int:
+    import asyncio
+    import json
+    from pathlib import Path
+
+    from .report_batch import pregenerate_weekly_reports
+
+    init_db()
+    result = asyncio.run(pregenerate_weekly_reports(
+        concurrency=args.concurrency,
+        rate=args.rate,
+        checkpoint=Path(args.checkpoint) if args.checkpoint else None,
+        as_of=args.as_of,
+        lookback_days=args.lookback_days,
+    ))
+    for address, error in result.failures.items():
+        print(f"{address}: {error}")
+    print(json.dumps(result.summary()))
+    return 1 if result.failed else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("backfill-milestone-tokens", help="index milestones already recorded in UserProgress")
+    p.set_defaults(func=_backfill_milestone_tokens)
+
+    p = sub.add_parser("check-progress-summaries", help="rebuild progress summaries from DailyLog and report drift")
+    p.add_argument("--fix", action="store_true", help="overwrite drifted summaries with the rebuilt values")
+    p.set_defaults(func=_check_progress_summaries)
+
+    p = sub.add_parser("seed-cohort", help="bulk-insert a synthetic cohort for capacity planning")
+    p.add_argument("--users", type=int, required=True)
+    p.add_argument("--seed", type=int, default=1, help="addresses depend on it; reuse it only on an empty database")
+    p.add_argument("--start-date", default=None, help="first signup date YYYY-MM-DD (default: 90 days ago)")
+    p.add_argument("--spread-days", type=int, default=60, help="signups are spread over this many days")
+    p.add_argument("--batch-size", type=int, default=2000, help="users per insert transaction")
+    p.add_argument("--verbose", action="store_true", help="print progress after each batch")
+    p.set_defaults(func=_seed_cohort)
+
+    p = sub.add_parser("pregenerate-weekly-reports", help="generate weekly reports for users whose week just ended")
+    p.add_argument("--concurrency", type=int, default=4, help="LLM calls in flight at once")
+    p.add_argument("--rate", type=float, default=2.0, help="max report starts per second (0: unlimited)")
+    p.add_argument("--checkpoint", default="weekly-reports.checkpoint.jsonl", help="resume file; empty to disable")
+    p.add_argument("--as-of", default=None, help="treat this date (YYYY-MM-DD) as every user's local today")
+    p.add_argument("--lookback-days", type=int, default=1, help="also pick up weeks that ended this many days back")
+    p.set_defaults(func=_pregenerate_weekly_reports)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
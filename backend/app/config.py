@@ -13,7 +13,35 @@ class Settings(BaseModel):
     milestone_base_uri: str = os.getenv("MILESTONE_BASE_URI", "https://api.YOUR_DOMAIN/metadata/")
     llm_provider: str = os.getenv("DEFAULT_LLM_PROVIDER", "deepseek")
     llm_model: str = os.getenv("DEFAULT_MODEL", "deepseek-chat")
+    llm_max_clients_per_provider: int = int(os.getenv("LLM_MAX_CLIENTS_PER_PROVIDER", "8"))
+    llm_tokens_per_minute: int = int(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))  # 0: no budget
+    llm_provider_limits: str = os.getenv("LLM_PROVIDER_LIMITS", "")  # deepseek=8/60000,openai=4/30000
+    llm_queue_size: int = int(os.getenv("LLM_QUEUE_SIZE", "64"))
+    llm_queue_timeout_seconds: float = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "20"))
     demo_mode: bool = os.getenv("DEMO_MODE", "false").lower() == "true"
     demo_start_date_key: str = os.getenv("DEMO_START_DATE_KEY", "")
+    reflection_mode: str = os.getenv("REFLECTION_MODE", "sync")  # sync | async
+    reflection_workers: int = int(os.getenv("REFLECTION_WORKERS", "2"))
+    reflection_queue_size: int = int(os.getenv("REFLECTION_QUEUE_SIZE", "256"))
+    reflection_sweep_seconds: int = int(os.getenv("REFLECTION_SWEEP_SECONDS", "60"))
+    reflection_cache_backend: str = os.getenv("REFLECTION_CACHE_BACKEND", "memory")  # memory | sql | off
+    reflection_cache_ttl_seconds: int = int(os.getenv("REFLECTION_CACHE_TTL_SECONDS", "86400"))
+    reflection_cache_max_entries: int = int(os.getenv("REFLECTION_CACHE_MAX_ENTRIES", "2048"))
+    report_cache: str = os.getenv("REPORT_CACHE", "fresh")  # fresh | swr | off
+    report_prompt_token_budget: int = int(os.getenv("REPORT_PROMPT_TOKEN_BUDGET", "1200"))
+    nft_image_workers: int = int(os.getenv("NFT_IMAGE_WORKERS", "4"))
+    nft_image_queue_size: int = int(os.getenv("NFT_IMAGE_QUEUE_SIZE", "16"))
+    nft_job_ttl_seconds: int = int(os.getenv("NFT_JOB_TTL_SECONDS", "600"))
+    nft_image_mode: str = os.getenv("NFT_IMAGE_MODE", "hedged")  # hedged | sequential
+    nft_hedge_delay_seconds: float = float(os.getenv("NFT_HEDGE_DELAY_SECONDS", "4"))
+    nft_image_deadline_seconds: float = float(os.getenv("NFT_IMAGE_DEADLINE_SECONDS", "30"))
+    pollinations_base_url: str = os.getenv("POLLINATIONS_BASE_URL", "https://pollinations.ai")
+    gemini_base_url: str = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com")
+    nft_image_dir: str = os.getenv("NFT_IMAGE_DIR", "./nft_images")
+    nft_image_store_max_mb: int = int(os.getenv("NFT_IMAGE_STORE_MAX_MB", "1024"))
+    debug_headers: bool = os.getenv("DEBUG_HEADERS", "false").lower() == "true"
+    query_repeat_warn: int = int(os.getenv("QUERY_REPEAT_WARN", "5"))
+    trace_sample_rate: float = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+    trace_file: str = os.getenv("TRACE_FILE", "")
 
 settings = Settings()
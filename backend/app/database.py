@@ -1,12 +1,203 @@
-﻿from sqlmodel import SQLModel, create_engine, Session
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, List, Optional, Union
+
+from sqlalchemy import inspect, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
 from .config import settings
 
-connect_args = {"check_same_thread": False}
-engine = create_engine(settings.database_url, echo=False, connect_args=connect_args)
+# DATABASE_URL picks the mode: an async driver (sqlite+aiosqlite, postgresql+asyncpg) gives
+# async routes a native AsyncSession; a sync URL gives them ThreadedSession instead.
+# The sync engine always exists (init_db, sync routes, CLI), so an async URL needs both
+# drivers installed: aiosqlite + sqlite3, or asyncpg + psycopg2.
+ASYNC_DRIVERS = {"sqlite+aiosqlite": "sqlite", "postgresql+asyncpg": "postgresql"}
+
+
+def _scheme(url: str) -> str:
+    return url.split(":", 1)[0]
+
+
+def is_async_url(url: str) -> bool:
+    return _scheme(url) in ASYNC_DRIVERS
+
+
+def sync_url(url: str) -> str:
+    scheme = _scheme(url)
+    if scheme in ASYNC_DRIVERS:
+        return ASYNC_DRIVERS[scheme] + url[len(scheme):]
+    return url
+
+
+def _connect_args(url: str) -> dict:
+    return {"check_same_thread": False} if url.startswith("sqlite") else {}
+
+
+engine = create_engine(sync_url(settings.database_url), echo=False, connect_args=_connect_args(settings.database_url))
+async_engine: Optional[AsyncEngine] = None
+if is_async_url(settings.database_url):
+    async_engine = create_async_engine(settings.database_url, echo=False)
+
+
+# Columns added to tables that deployed databases already have. create_all only creates missing
+# tables, so init_db adds these (with their index) when a table lacks them:
+# (table, column, column DDL, index name or None)
+ADDED_COLUMNS = (
+    ("dailylog", "reflection_status", "VARCHAR(16) NOT NULL DEFAULT 'READY'", "ix_dailylog_reflection_status"),
+)
+
+
+def _add_missing_columns(bind) -> None:
+    inspector = inspect(bind)
+    for table, column, ddl, index in ADDED_COLUMNS:
+        if not inspector.has_table(table) or column in {c["name"] for c in inspector.get_columns(table)}:
+            continue
+        with bind.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+            if index:
+                conn.execute(text(f"CREATE INDEX IF NOT EXISTS {index} ON {table} ({column})"))
+
 
 def init_db() -> None:
     SQLModel.metadata.create_all(engine)
+    _add_missing_columns(engine)
+
+
+def insert_ignore(bind, model, values: dict):
+    """INSERT of one row that silently skips a unique-key conflict, or None if the dialect has no
+    such clause and the caller must catch IntegrityError inside a savepoint instead.
+
+    On SQLite this also avoids SAVEPOINT altogether: pysqlite starts its transaction lazily, so a
+    savepoint opened first would begin (and its release would commit) the outer transaction.
+    """
+    dialect = bind.dialect.name
+    if dialect == "sqlite":
+        return sqlite.insert(model).values(**values).on_conflict_do_nothing()
+    if dialect == "postgresql":
+        return postgresql.insert(model).values(**values).on_conflict_do_nothing()
+    return None
+
 
 def get_session():
     with Session(engine) as session:
         yield session
+
+
+class BufferedResult:
+    """Rows fetched inside the worker thread, so reading them never touches the connection."""
+
+    def __init__(self, rows: List[Any], rowcount: int = -1):
+        self._rows = rows
+        self.rowcount = rowcount
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def all(self) -> List[Any]:
+        return list(self._rows)
+
+    def first(self) -> Any:
+        return self._rows[0] if self._rows else None
+
+    def one_or_none(self) -> Any:
+        if len(self._rows) > 1:
+            raise ValueError("expected at most one row")
+        return self.first()
+
+
+class ThreadedSession:
+    """AsyncSession-compatible facade over a sync Session.
+
+    Every database call runs in the threadpool, one at a time, so async routes and graph
+    nodes can ``await`` it without blocking the event loop.
+    """
+
+    def __init__(self, session: Session):
+        self.sync_session = session
+        self._lock = asyncio.Lock()
+
+    async def _run(self, fn, *args, **kwargs):
+        async with self._lock:
+            return await run_in_threadpool(fn, *args, **kwargs)
+
+    async def exec(self, statement) -> BufferedResult:
+        def run():
+            result = self.sync_session.exec(statement)
+            if getattr(result, "returns_rows", True):
+                return BufferedResult(result.all())
+            return BufferedResult([], result.rowcount)
+
+        return await self._run(run)
+
+    async def execute(self, statement, *args, **kwargs):
+        return await self._run(self.sync_session.execute, statement, *args, **kwargs)
+
+    async def get(self, model, ident):
+        return await self._run(self.sync_session.get, model, ident)
+
+    def get_bind(self):
+        return self.sync_session.get_bind()
+
+    @asynccontextmanager
+    async def begin_nested(self):
+        nested = await self._run(self.sync_session.begin_nested)
+        try:
+            yield nested
+        except BaseException:
+            await self._run(nested.rollback)
+            raise
+        try:
+            await self._run(nested.commit)
+        except BaseException:
+            await self._run(nested.rollback)
+            raise
+
+    def add(self, instance) -> None:
+        self.sync_session.add(instance)
+
+    def add_all(self, instances) -> None:
+        self.sync_session.add_all(instances)
+
+    async def delete(self, instance) -> None:
+        await self._run(self.sync_session.delete, instance)
+
+    async def flush(self) -> None:
+        await self._run(self.sync_session.flush)
+
+    async def commit(self) -> None:
+        await self._run(self.sync_session.commit)
+
+    async def rollback(self) -> None:
+        await self._run(self.sync_session.rollback)
+
+    async def refresh(self, instance) -> None:
+        await self._run(self.sync_session.refresh, instance)
+
+    async def close(self) -> None:
+        await self._run(self.sync_session.close)
+
+
+AsyncDb = Union[AsyncSession, ThreadedSession]
+
+
+@asynccontextmanager
+async def session_scope() -> AsyncIterator[AsyncDb]:
+    # expire_on_commit=False: attribute reads after commit must not trigger hidden I/O
+    if async_engine is not None:
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            yield session
+        return
+    session = ThreadedSession(Session(engine, expire_on_commit=False))
+    try:
+        yield session
+    finally:
+        await session.close()
+
+
+async def get_async_session():
+    async with session_scope() as session:
+        yield session
@@ -1,11 +1,20 @@
-from spoon_ai.graph import StateGraph, END
+import asyncio
+import functools
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from spoon_ai.graph import StateGraph, CompiledGraph, END
 from spoon_ai.graph.agent import GraphAgent as GraphRunner
+from .. import tracing
+from ..metrics import histogram
 from .state import GraphState
 from .nodes import (
     daily_prompt_node,
     user_input_node,
     reflection_node,
     proof_builder_node,
+    checkin_prefetch_node,
     onchain_submit_node,
     tx_confirm_node,
     progress_update_node,
@@ -15,19 +24,93 @@ from .nodes import (
 )
 
 
+NODES = (
+    ("DailyPrompt", daily_prompt_node),
+    ("UserInput", user_input_node),
+    ("Reflection", reflection_node),
+    ("ProofBuilder", proof_builder_node),
+    ("CheckinPrefetch", checkin_prefetch_node),
+    ("OnchainSubmit", onchain_submit_node),
+    ("TxConfirm", tx_confirm_node),
+    ("ProgressUpdate", progress_update_node),
+    ("BadgeCheck", badge_check_node),
+    ("WeeklyReport", weekly_report_node),
+    ("FinalReport", final_report_node),
+)
+
+# Fan-out nodes: branches that only read state run concurrently and are joined into one delta.
+# The check-in hashing and DB reads do not depend on the reflection, so they overlap the LLM call.
+FAN_OUTS = {
+    "Prepare": ("Reflection", "ProofBuilder", "CheckinPrefetch"),
+    "PrepareDeferred": ("ProofBuilder", "CheckinPrefetch"),
+}
+
+Node = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+node_seconds = histogram("graph_node_seconds", "Graph node run time by node and outcome (ok/error)", ("node", "outcome"))
+
+
+def _instrumented(name: str, node: Node, kind: str = "node"):
+    """Times every node into graph_node_seconds and, for traced requests, a span."""
+    @functools.wraps(node)
+    async def run(state: Dict[str, Any]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        error = None
+        try:
+            return await node(state)
+        except BaseException as exc:
+            error = exc
+            raise
+        finally:
+            node_seconds.observe(time.perf_counter() - started, node=name, outcome="ok" if error is None else "error")
+            tracing.record_span(name, kind, state.get("flow"), started, error)
+
+    return run
+
+
+def join_deltas(names: Sequence[str], deltas: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """Merge branch results into one state update; two branches writing different values to the
+    same key is a wiring bug, not something to resolve by order."""
+    merged: Dict[str, Any] = {}
+    owners: Dict[str, str] = {}
+    for name, delta in zip(names, deltas):
+        for key, value in (delta or {}).items():
+            if key in merged and merged[key] != value:
+                raise ValueError(f"branches {owners[key]} and {name} both set {key!r}")
+            merged[key] = value
+            owners[key] = name
+    return merged
+
+
+def fan_out(names: Sequence[str], nodes: Sequence[Node]) -> Node:
+    """One graph node running ``nodes`` concurrently on the same state, then joining their deltas.
+
+    Branches share the request's session, so at most one of them may use the database. If a
+    branch fails the others are cancelled and the error propagates like a single node's would.
+    """
+    async def run(state: Dict[str, Any]) -> Dict[str, Any]:
+        tasks: List[asyncio.Future] = [asyncio.ensure_future(node(state)) for node in nodes]
+        try:
+            deltas = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        return join_deltas(names, deltas)
+
+    return run
+
+
 def build_graph() -> StateGraph:
     graph = StateGraph(GraphState)
 
-    graph.add_node("DailyPrompt", daily_prompt_node)
-    graph.add_node("UserInput", user_input_node)
-    graph.add_node("Reflection", reflection_node)
-    graph.add_node("ProofBuilder", proof_builder_node)
-    graph.add_node("OnchainSubmit", onchain_submit_node)
-    graph.add_node("TxConfirm", tx_confirm_node)
-    graph.add_node("ProgressUpdate", progress_update_node)
-    graph.add_node("BadgeCheck", badge_check_node)
-    graph.add_node("WeeklyReport", weekly_report_node)
-    graph.add_node("FinalReport", final_report_node)
+    nodes = {name: _instrumented(name, node) for name, node in NODES}
+    branches = {name for names in FAN_OUTS.values() for name in names}
+    for name, node in nodes.items():
+        if name not in branches:
+            graph.add_node(name, node)
+    for name, names in FAN_OUTS.items():
+        graph.add_node(name, _instrumented(name, fan_out(names, [nodes[n] for n in names]), kind="group"))
 
     graph.set_entry_point("DailyPrompt")
 
@@ -53,9 +136,16 @@ def build_graph() -> StateGraph:
         "input": "UserInput",
     })
 
-    graph.add_edge("UserInput", "Reflection")
-    graph.add_edge("Reflection", "ProofBuilder")
-    graph.add_edge("ProofBuilder", "OnchainSubmit")
+    def after_user_input(state):
+        # REFLECTION_MODE=async: the log is stored PENDING and the reflection worker fills it in
+        return "defer" if state.get("deferReflection") else "reflect"
+
+    graph.add_conditional_edges("UserInput", after_user_input, {
+        "reflect": "Prepare",
+        "defer": "PrepareDeferred",
+    })
+    graph.add_edge("Prepare", "OnchainSubmit")
+    graph.add_edge("PrepareDeferred", "OnchainSubmit")
 
     def after_onchain(state):
         return "tx" if state.get("txHash") else "no_tx"
@@ -89,3 +179,31 @@ def build_graph() -> StateGraph:
 def create_agent() -> GraphRunner:
     graph = build_graph()
     return GraphRunner(name="alive_graph_agent", graph=graph)
+
+
+_compiled_graph: Optional[CompiledGraph] = None
+_compile_lock = threading.Lock()
+
+
+def get_compiled_graph() -> CompiledGraph:
+    """Process-wide compiled graph. Nodes keep no per-run state, so one instance serves all requests."""
+    global _compiled_graph
+    if _compiled_graph is None:
+        with _compile_lock:
+            if _compiled_graph is None:
+                _compiled_graph = build_graph().compile()
+    return _compiled_graph
+
+
+async def invoke_graph(state: Dict[str, Any]) -> Dict[str, Any]:
+    started = time.perf_counter()
+    error = None
+    try:
+        # CompiledGraph.invoke mutates the dict it is given; copy so callers' state is never shared
+        return await get_compiled_graph().invoke(dict(state))
+    except BaseException as exc:
+        error = exc
+        raise
+    finally:
+        # graph span minus its node spans is dispatch overhead
+        tracing.record_span("graph", "graph", state.get("flow"), started, error)
@@ -1,8 +1,8 @@
 ﻿import json
 import uuid
-from typing import Dict, Any
+from typing import Awaitable, Callable, Dict, Any, Optional, Tuple
 from datetime import datetime
-from sqlmodel import Session, select
+from sqlmodel import select
 from sqlalchemy.exc import IntegrityError
 
 from ..config import settings
@@ -10,12 +10,48 @@ from ..services.tasks import get_task_by_day_index
 from ..services.crypto import normalize_text, sha256_hex, generate_salt_hex, compute_proof_hash
 from ..services.reflection import generate_reflection
 from ..services.time import date_key_for_timezone, diff_days
-from ..services.report import generate_report_text
+from ..services.report import final_prompt, generate_report_text, stream_report_text
+from ..services import progress_summary, weekly_summary
+from ..services.report_cache import get_report_cache
 from ..models import DailyLog, UserProgress
+from ..database import AsyncDb, insert_ignore
+from ..request_context import RequestContext
 
 
-def _ensure_progress(db: Session, address: str, timezone: str, date_key: str, start_date_key_override: str | None = None) -> UserProgress:
-    progress = db.exec(select(UserProgress).where(UserProgress.address == address)).first()
+def _milestones(progress: UserProgress) -> Dict[str, Any]:
+    """progress.milestones with all three keys present; a copy, so reading it never dirties the row."""
+    current = progress.milestones if isinstance(progress.milestones, dict) else {}
+    return {key: current.get(key) for key in ("1", "2", "3")}
+
+
+async def _insert_once(db: AsyncDb, row) -> bool:
+    """Insert ``row`` unless a concurrent request already inserted the same unique key; True if
+    this call created it.
+
+    The duplicate is absorbed inside the flow's transaction (ON CONFLICT DO NOTHING, or a
+    savepoint where the dialect lacks it), so the rest of the flow is not rolled back with it.
+    """
+    stmt = insert_ignore(db.get_bind(), type(row), row.model_dump(exclude_none=True))
+    if stmt is not None:
+        return (await db.exec(stmt)).rowcount == 1
+    try:
+        async with db.begin_nested():
+            db.add(row)
+        return True
+    except IntegrityError:
+        return False
+
+
+def _ctx(state: Dict[str, Any]) -> RequestContext:
+    # routes pass one in; a bare invoke (bench, tests) gets a context for this node only
+    return state.get("ctx") or RequestContext(state.get("db"))
+
+
+async def _ensure_progress(ctx: RequestContext, address: str, timezone: str, date_key: str,
+                           start_date_key_override: str | None = None, persist: bool = True) -> UserProgress:
+    """The user's progress row, created if missing. Without ``persist`` a missing row is returned
+    unsaved, so read flows never write."""
+    progress = await ctx.progress(address)
     if not progress:
         progress = UserProgress(
             address=address,
@@ -25,19 +61,11 @@ def _ensure_progress(db: Session, address: str, timezone: str, date_key: str, st
             streak=0,
             milestones={"1": None, "2": None, "3": None},
         )
-        db.add(progress)
-        db.commit()
-    changed = False
-    if not isinstance(progress.milestones, dict):
-        progress.milestones = {"1": None, "2": None, "3": None}
-        changed = True
-    for key in ("1", "2", "3"):
-        if key not in progress.milestones:
-            progress.milestones[key] = None
-            changed = True
-    if changed:
-        db.add(progress)
-        db.commit()
+        if persist:
+            await _insert_once(ctx.db, progress)
+            # inserted (or raced) outside the identity map: read the row back
+            ctx.invalidate("progress", address)
+            progress = await ctx.progress(address)
     return progress
 
 
@@ -46,18 +74,11 @@ async def daily_prompt_node(state: Dict[str, Any]) -> Dict[str, Any]:
     if flow != "checkin":
         return {}
 
-    db: Session = state.get("db")
     address = state.get("address")
     date_key = state.get("dateKey")
     challenge_id = state.get("challengeId", settings.challenge_id)
-    if db and address and date_key:
-        log = db.exec(
-            select(DailyLog).where(
-                DailyLog.address == address,
-                DailyLog.challenge_id == challenge_id,
-                DailyLog.date_key == date_key,
-            )
-        ).first()
+    if state.get("db") and address and date_key:
+        log = await _ctx(state).daily_log(address, challenge_id, date_key)
         if log:
             return {"alreadyCheckedIn": True, "logId": log.id}
 
@@ -94,6 +115,22 @@ async def proof_builder_node(state: Dict[str, Any]) -> Dict[str, Any]:
     return {"saltHex": salt_hex, "proofHash": proof_hash, "inputHash": input_hash}
 
 
+async def checkin_prefetch_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    """The reads ProgressUpdate needs (progress row and summary), run while the reflection is
+    generated. Results, misses included, land in the request context, not in state.
+
+    Read-only on purpose: a write here would start the request's write transaction (on SQLite,
+    take the database write lock) for the whole LLM call. ProgressUpdate creates what is missing.
+    """
+    ctx = state.get("ctx")
+    address = state.get("address")
+    if ctx is None or not address or state.get("flow", "checkin") != "checkin":
+        return {}
+    await ctx.progress(address)
+    await ctx.summary(address, state.get("challengeId", settings.challenge_id), persist=False)
+    return {}
+
+
 async def onchain_submit_node(state: Dict[str, Any]) -> Dict[str, Any]:
     return {
         "submitHint": {
@@ -105,7 +142,7 @@ async def onchain_submit_node(state: Dict[str, Any]) -> Dict[str, Any]:
 
 
 async def tx_confirm_node(state: Dict[str, Any]) -> Dict[str, Any]:
-    db: Session = state["db"]
+    ctx = _ctx(state)
     log_id = state.get("logId")
     tx_hash = state.get("txHash")
     chain_id = state.get("chainId")
@@ -113,19 +150,21 @@ async def tx_confirm_node(state: Dict[str, Any]) -> Dict[str, Any]:
     if not log_id:
         return {"txStatus": "CREATED"}
 
-    log = db.exec(select(DailyLog).where(DailyLog.id == log_id)).first()
+    log = await ctx.log(log_id)
     if log and tx_hash and not log.tx_hash:
+        summary = await ctx.summary(log.address, log.challenge_id)
         log.tx_hash = tx_hash
         log.chain_id = chain_id
         log.contract_address = contract_address
         log.status = "SUBMITTED"
-        db.add(log)
-        db.commit()
+        ctx.db.add(log)
+        await ctx.db.exec(progress_summary.mark_submitted(summary, log.day_index))
     return {"txStatus": "SUBMITTED" if tx_hash else "CREATED"}
 
 
 async def progress_update_node(state: Dict[str, Any]) -> Dict[str, Any]:
-    db: Session = state["db"]
+    ctx = _ctx(state)
+    db: AsyncDb = ctx.db
     flow = state.get("flow", "checkin")
     address = state.get("address")
     challenge_id = state.get("challengeId", settings.challenge_id)
@@ -136,24 +175,22 @@ async def progress_update_node(state: Dict[str, Any]) -> Dict[str, Any]:
         return {}
 
     start_date_key_override = state.get("startDateKey")
-    progress = _ensure_progress(db, address, timezone, date_key, start_date_key_override)
+    progress = await _ensure_progress(ctx, address, timezone, date_key, start_date_key_override, persist=flow == "checkin")
 
     log = None
     already_checked_in = False
 
     if flow == "checkin":
-        log = db.exec(
-            select(DailyLog).where(
-                DailyLog.address == address,
-                DailyLog.challenge_id == challenge_id,
-                DailyLog.date_key == date_key,
-            )
-        ).first()
+        log = await ctx.daily_log(address, challenge_id, date_key)
         already_checked_in = bool(log)
 
         if not log:
             day_index = state.get("dayIndex")
             reflection = state.get("reflection")
+            reflection_status = "READY"
+            if state.get("deferReflection") and not reflection:
+                reflection = {"note": "", "next": ""}
+                reflection_status = "PENDING"
             salt_hex = state.get("saltHex")
             proof_hash = state.get("proofHash")
             input_hash = state.get("inputHash")
@@ -170,22 +207,20 @@ async def progress_update_node(state: Dict[str, Any]) -> Dict[str, Any]:
                 input_hash=input_hash,
                 normalized_text=normalized_text,
                 reflection=reflection,
+                reflection_status=reflection_status,
                 salt_hex=salt_hex,
                 proof_hash=proof_hash,
                 status="CREATED",
             )
-            db.add(log)
-            try:
-                db.commit()
-            except IntegrityError:
-                db.rollback()
-                log = db.exec(
-                    select(DailyLog).where(
-                        DailyLog.address == address,
-                        DailyLog.challenge_id == challenge_id,
-                        DailyLog.date_key == date_key,
-                    )
-                ).first()
+            if await _insert_once(db, log):
+                # the row holds exactly these values; no need to read it back
+                ctx.remember("daily_log", address, challenge_id, date_key, value=log)
+                cache = get_report_cache()
+                if cache is not None:
+                    cache.invalidate(address, challenge_id)
+            else:
+                ctx.invalidate("daily_log", address, challenge_id, date_key)
+                log = await ctx.daily_log(address, challenge_id, date_key)
                 already_checked_in = True
 
         if log and not already_checked_in:
@@ -202,31 +237,25 @@ async def progress_update_node(state: Dict[str, Any]) -> Dict[str, Any]:
             progress.last_day_index = log.day_index
             progress.updated_at = datetime.utcnow()
             db.add(progress)
-            db.commit()
+            summary = await ctx.summary(address, challenge_id)
+            await db.exec(progress_summary.mark_completed(summary, log.day_index, progress.streak))
     else:
-        log = db.exec(
-            select(DailyLog).where(
-                DailyLog.address == address,
-                DailyLog.challenge_id == challenge_id,
-                DailyLog.date_key == date_key,
-            )
-        ).first()
+        log = await ctx.daily_log(address, challenge_id, date_key)
 
-    logs = db.exec(
-        select(DailyLog).where(
-            DailyLog.address == address,
-            DailyLog.challenge_id == challenge_id,
-        )
-    ).all()
-    completed_days = sorted({l.day_index for l in logs})
+    summary = await ctx.summary(address, challenge_id, persist=False)
 
     today_checked_in = bool(log)
-    milestones = progress.milestones or {"1": None, "2": None, "3": None}
+    milestones = _milestones(progress)
 
     return {
         "logId": log.id if log else None,
+        "reflectionStatus": log.reflection_status if log else None,
         "streak": progress.streak or 0,
-        "completedDays": completed_days,
+        "completedDays": progress_summary.days_in(summary.completed_mask),
+        "completedMask": summary.completed_mask,
+        "submittedMask": summary.submitted_mask,
+        "mintedMask": summary.minted_mask,
+        "dayMintCount": summary.mint_count,
         "todayCheckedIn": today_checked_in,
         "dateKey": date_key,
         "startDateKey": progress.start_date_key,
@@ -236,15 +265,14 @@ async def progress_update_node(state: Dict[str, Any]) -> Dict[str, Any]:
 
 
 async def badge_check_node(state: Dict[str, Any]) -> Dict[str, Any]:
-    completed_days = set(state.get("completedDays") or [])
+    completed = state.get("completedMask")
+    if completed is None:
+        completed = sum(progress_summary.day_bit(day) for day in set(state.get("completedDays") or []))
     milestones = state.get("milestones") or {"1": None, "2": None, "3": None}
     eligible = []
-    if milestones.get("1") is None and all(day in completed_days for day in range(1, 8)):
-        eligible.append(1)
-    if milestones.get("2") is None and all(day in completed_days for day in range(1, 15)):
-        eligible.append(2)
-    if milestones.get("3") is None and all(day in completed_days for day in range(1, 29)):
-        eligible.append(3)
+    for milestone_id, last_day in ((1, 7), (2, 14), (3, 28)):
+        if milestones.get(str(milestone_id)) is None and progress_summary.has_days_through(completed, last_day):
+            eligible.append(milestone_id)
     return {
         "eligibleMilestones": eligible,
         "alreadyCheckedIn": state.get("alreadyCheckedIn", False),
@@ -275,34 +303,95 @@ def _report_payload(logs: list, title: str, range_value: str) -> Dict[str, Any]:
     }
 
 
-async def weekly_report_node(state: Dict[str, Any]) -> Dict[str, Any]:
-    db: Session = state["db"]
-    address = state.get("address")
-    challenge_id = state.get("challengeId", settings.challenge_id)
-    logs = db.exec(
+async def load_report(db: AsyncDb, address: str, challenge_id: int, range_value: str) -> Tuple[Dict[str, Any], list]:
+    """Report payload with the placeholder text, plus the logs its LLM text should be generated from.
+    The week report covers the challenge week of the latest check-in."""
+    logs = (await db.exec(
         select(DailyLog).where(
             DailyLog.address == address,
             DailyLog.challenge_id == challenge_id,
         ).order_by(DailyLog.date_key)
-    ).all()
-    range_logs = logs[-7:] if logs else []
-    payload = _report_payload(range_logs, "周报（模拟）", "week")
+    )).all()
+    if range_value == "week":
+        range_logs = []
+        if logs:
+            week = weekly_summary.week_of(logs[-1].day_index)
+            range_logs = [log for log in logs if weekly_summary.week_of(log.day_index) == week]
+        return _report_payload(range_logs, "周报（模拟）", "week"), range_logs
+    return _report_payload(logs, "结营报告（模拟）", "final"), logs
+
+
+async def _emit(state: Dict[str, Any], kind: str, value: Any) -> None:
+    # when the caller put a queue in state["reportStream"], progress is pushed to it as
+    # ("meta", payload) and then ("delta", text) items
+    sink = state.get("reportStream")
+    if sink is not None:
+        await sink.put((kind, value))
+
+
+async def _report_text(state: Dict[str, Any], logs: list, range_value: str, user_prompt: Optional[str] = None) -> str:
+    """LLM report text, streamed to state["reportStream"] as it is generated when there is one."""
+    if state.get("reportStream") is None:
+        return await generate_report_text(logs, range_value, user_prompt)
+    text = ""
+    async for kind, value in stream_report_text(logs, range_value, user_prompt):
+        if kind == "delta":
+            await _emit(state, "delta", value)
+        else:
+            text = value
+    return text
+
+
+async def _cached_report_text(state: Dict[str, Any], range_value: str, logs: list,
+                              produce: Callable[[bool], Awaitable[str]]) -> str:
+    """Report text from the report cache while ``logs`` are unchanged, else ``produce(streaming)``."""
+    cache = get_report_cache()
+    if cache is None:
+        return await produce(True)
+    key = (state.get("address"), state.get("challengeId", settings.challenge_id), range_value)
+    text, cached = await cache.text(key, weekly_summary.fingerprint(logs), produce)
+    if cached:
+        await _emit(state, "delta", text)
+    return text
+
+
+async def weekly_report_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    db: AsyncDb = state["db"]
+    address = state.get("address")
+    challenge_id = state.get("challengeId", settings.challenge_id)
+    payload, range_logs = await load_report(db, address, challenge_id, "week")
     if range_logs:
-        payload["reportText"] = await generate_report_text(range_logs, "week")
+        await _emit(state, "meta", payload)
+        week = weekly_summary.week_of(range_logs[-1].day_index)
+        # a completed week is summarized once and stored; the week in progress goes through the report cache
+        stored = await weekly_summary.weekly_summaries(address, challenge_id, {week: range_logs}, only=(week,))
+        if week in stored:
+            payload["reportText"] = stored[week]
+            await _emit(state, "delta", stored[week])
+        else:
+            async def produce(streaming: bool) -> str:
+                return await _report_text(state if streaming else {}, range_logs, "week")
+
+            payload["reportText"] = await _cached_report_text(state, "week", range_logs, produce)
     return payload
 
 
 async def final_report_node(state: Dict[str, Any]) -> Dict[str, Any]:
-    db: Session = state["db"]
+    db: AsyncDb = state["db"]
     address = state.get("address")
     challenge_id = state.get("challengeId", settings.challenge_id)
-    logs = db.exec(
-        select(DailyLog).where(
-            DailyLog.address == address,
-            DailyLog.challenge_id == challenge_id,
-        ).order_by(DailyLog.date_key)
-    ).all()
-    payload = _report_payload(logs, "结营报告（模拟）", "final")
+    payload, logs = await load_report(db, address, challenge_id, "final")
     if logs:
-        payload["reportText"] = await generate_report_text(logs, "final")
+        await _emit(state, "meta", payload)
+
+        async def produce(streaming: bool) -> str:
+            # map: one stored summary per completed week; reduce: one call over the summaries plus
+            # the days no summary covers, within the prompt token budget
+            weeks = weekly_summary.split_weeks(logs)
+            summaries = await weekly_summary.weekly_summaries(address, challenge_id, weeks)
+            pending = [log for week, week_logs in weeks.items() if week not in summaries for log in week_logs]
+            prompt = final_prompt(summaries, pending, settings.report_prompt_token_budget)
+            return await _report_text(state if streaming else {}, logs, "final", prompt)
+
+        payload["reportText"] = await _cached_report_text(state, "final", logs, produce)
     return payload
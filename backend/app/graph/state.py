@@ -14,6 +14,8 @@ class GraphState(TypedDict, total=False):
     imageDesc: Optional[str]
     task: Dict[str, Any]
     reflection: Dict[str, str]
+    deferReflection: bool
+    reflectionStatus: Optional[str]
     saltHex: str
     proofHash: str
     inputHash: Optional[str]
@@ -25,14 +27,24 @@ class GraphState(TypedDict, total=False):
     contractAddress: Optional[str]
     streak: int
     completedDays: List[int]
+    # ProgressSummary day masks, bit d-1 = day d
+    completedMask: int
+    submittedMask: int
+    mintedMask: int
+    dayMintCount: int
     todayCheckedIn: bool
     reportRange: Optional[str]
     reportText: Optional[str]
     chartByDay: Optional[List[int]]
     recentLogs: Optional[List[Any]]
     title: Optional[str]
+    # asyncio.Queue set by /report/stream; report nodes push ("meta"|"delta", value) items to it
+    reportStream: Any
     startDateKey: Optional[str]
     milestones: Optional[Dict[str, Optional[str]]]
     eligibleMilestones: Optional[List[int]]
     alreadyCheckedIn: bool
     db: Any
+    # RequestContext over db: routes and nodes share its UserProgress / DailyLog / ProgressSummary
+    # lookups, so each row is selected at most once per request unless a write invalidates it
+    ctx: Any
@@ -1,9 +1,19 @@
-﻿from fastapi import FastAPI
+﻿import asyncio
+
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from .config import settings
 from .database import init_db
+from .metrics import RequestMetricsMiddleware
+from .query_stats import QueryStatsMiddleware, install_query_hooks
+from .tracing import TracingMiddleware
 from .routes import router
+from .services.tasks import get_catalog, install_reload_signal
+from .graph.agent import get_compiled_graph
+from .services.llm import get_llm_pool, close_llm_pool
+from .services.reflection_worker import get_reflection_worker, stop_reflection_worker
+from .services.nft_jobs import shutdown_nft_job_queue
 
 app = FastAPI(title=settings.app_name, version=settings.version)
 
@@ -15,8 +25,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(QueryStatsMiddleware)
+app.add_middleware(RequestMetricsMiddleware)
+app.add_middleware(TracingMiddleware)
+install_query_hooks()
+
 app.include_router(router)
 
 @app.on_event("startup")
-def on_startup():
+async def on_startup():
     init_db()
+    get_catalog()
+    install_reload_signal(asyncio.get_running_loop())
+    get_compiled_graph()
+    get_llm_pool()
+    if settings.reflection_mode == "async":
+        # also re-queues PENDING reflections left by a previous process
+        get_reflection_worker().start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await stop_reflection_worker()
+    await close_llm_pool()
+    shutdown_nft_job_queue()
@@ -37,6 +37,7 @@ class DailyLog(SQLModel, table=True):
     input_hash: Optional[str] = Field(default=None, max_length=64)
     normalized_text: Optional[str] = Field(default=None)
     reflection: dict = Field(sa_column=Column(JSON))
+    reflection_status: str = Field(default="READY", max_length=16, index=True)
     salt_hex: str = Field(max_length=128)
     proof_hash: str = Field(max_length=66)
     status: str = Field(default="CREATED", max_length=24, index=True)
@@ -46,3 +47,51 @@ class DailyLog(SQLModel, table=True):
     day_nft_tx_hash: Optional[str] = Field(default=None, max_length=66)
     block_number: Optional[int] = Field(default=None)
     created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class ProgressSummary(SQLModel, table=True):
+    # bit d-1 of each mask is day d; see services/progress_summary.py
+    address: str = Field(primary_key=True, max_length=42)
+    challenge_id: int = Field(primary_key=True)
+    completed_mask: int = Field(default=0)
+    submitted_mask: int = Field(default=0)
+    minted_mask: int = Field(default=0)
+    mint_count: int = Field(default=0)
+    streak: int = Field(default=0)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class MilestoneToken(SQLModel, table=True):
+    # token_id is a uint256 keccak digest, so it is stored as its decimal string
+    token_id: str = Field(primary_key=True, max_length=78)
+    address: str = Field(max_length=42, index=True)
+    milestone_id: int = Field(index=True)
+    tx_hash: Optional[str] = Field(default=None, max_length=66)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class ReflectionCacheEntry(SQLModel, table=True):
+    key: str = Field(primary_key=True, max_length=64)
+    value: dict = Field(sa_column=Column(JSON))
+    expires_at: datetime = Field(index=True)
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+
+class WeeklySummary(SQLModel, table=True):
+    # LLM summary of one completed challenge week; fingerprint covers the logs it was written from
+    address: str = Field(primary_key=True, max_length=42)
+    challenge_id: int = Field(primary_key=True)
+    week: int = Field(primary_key=True)
+    fingerprint: str = Field(max_length=64)
+    text: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class ReportCacheEntry(SQLModel, table=True):
+    # last generated report text per range; fingerprint covers the logs it was generated from
+    address: str = Field(primary_key=True, max_length=42)
+    challenge_id: int = Field(primary_key=True)
+    range: str = Field(primary_key=True, max_length=8)
+    fingerprint: str = Field(max_length=64)
+    text: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,144 @@
+"""Per-request SQL statistics: statement count, total DB time, slowest and most repeated statement.
+
+Engine events feed whichever QueryStats the current context holds; QueryStatsMiddleware opens one
+per HTTP request. Worker threads (sync routes, ThreadedSession) and aiosqlite greenlets run in a
+copy of the request's context, so they report into the same object.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .config import settings
+from .metrics import counter, histogram, route_label
+
+db_statements = histogram(
+    "db_statements_per_request",
+    "SQL statements issued while serving one request",
+    ["route"],
+    buckets=(1, 2, 5, 10, 20, 50, 100),
+)
+db_seconds = histogram("db_seconds_per_request", "Time spent in SQL statements while serving one request", ["route"])
+db_repeated = counter(
+    "db_repeated_statements_total",
+    "Requests that issued one statement text more often than QUERY_REPEAT_WARN times (likely N+1)",
+    ["route"],
+)
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    seconds: float = 0.0
+    slowest_seconds: float = 0.0
+    slowest_statement: Optional[str] = None
+    by_statement: Dict[str, int] = field(default_factory=dict)
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.count += 1
+        self.seconds += seconds
+        self.by_statement[statement] = self.by_statement.get(statement, 0) + 1
+        if seconds >= self.slowest_seconds:
+            self.slowest_seconds = seconds
+            self.slowest_statement = statement
+
+    def most_repeated(self) -> Tuple[Optional[str], int]:
+        if not self.by_statement:
+            return None, 0
+        statement = max(self.by_statement, key=self.by_statement.get)
+        return statement, self.by_statement[statement]
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+_listeners: List[Callable[[str, QueryStats], None]] = []
+
+
+def current_stats() -> Optional[QueryStats]:
+    return _current.get()
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    stats = QueryStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+def add_listener(fn: Callable[[str, QueryStats], None]) -> None:
+    """Call fn(route, stats) as each request finishes (used by the query_budget test fixture)."""
+    _listeners.append(fn)
+
+
+def remove_listener(fn: Callable[[str, QueryStats], None]) -> None:
+    _listeners.remove(fn)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is not None:
+        starts = conn.info.get("query_start")
+        if starts:
+            stats.record(statement, time.perf_counter() - starts.pop())
+
+
+def install_query_hooks() -> None:
+    """Listen on every Engine, including the sync side of async engines and test engines."""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class QueryStatsMiddleware:
+    """Opens a QueryStats per HTTP request, records it as metrics and, with DEBUG_HEADERS on,
+    reports it in X-DB-* response headers. Statements issued after the headers are sent
+    (streaming bodies) are counted in the metrics only."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with track_queries() as stats:
+            async def send_with_headers(message):
+                if message["type"] == "http.response.start" and settings.debug_headers:
+                    message["headers"] = list(message.get("headers", [])) + _debug_headers(stats)
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_headers)
+            finally:
+                _finish(route_label(scope), stats)
+
+
+def _debug_headers(stats: QueryStats) -> List[Tuple[bytes, bytes]]:
+    _, repeats = stats.most_repeated()
+    return [
+        (b"x-db-queries", str(stats.count).encode()),
+        (b"x-db-time-ms", f"{stats.seconds * 1000:.2f}".encode()),
+        (b"x-db-slowest-ms", f"{stats.slowest_seconds * 1000:.2f}".encode()),
+        (b"x-db-max-repeats", str(repeats).encode()),
+    ]
+
+
+def _finish(route: str, stats: QueryStats) -> None:
+    db_statements.observe(stats.count, route=route)
+    db_seconds.observe(stats.seconds, route=route)
+    if stats.most_repeated()[1] > settings.query_repeat_warn:
+        db_repeated.inc(route=route)
+    for listener in list(_listeners):
+        listener(route, stats)
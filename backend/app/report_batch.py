@@ -0,0 +1,167 @@
+"""Nightly pre-generation of weekly reports, so the Monday-morning /report is a cache read.
+
+A user is due when a challenge week ended in their own timezone within the last
+``lookback_days`` days and they have a log in that week. Each due user is run through
+weekly_report_node exactly as GET /report?range=week would, which fills the weekly summary
+store (completed week) or the report cache (week with gaps). LLM work is bounded by a
+concurrency cap and a start-rate limit, and queues behind interactive calls in the LLM governor.
+Finished users are appended to a checkpoint file, so an interrupted run resumes where it
+stopped; failed users are not recorded and are retried.
+
+Run from backend/: python -m app.cli pregenerate-weekly-reports --concurrency 4 --rate 2
+"""
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from sqlmodel import select
+
+from .config import settings
+from .database import session_scope
+from .graph.nodes import weekly_report_node
+from .metrics import percentile
+from .models import UserProgress
+from .services.llm import BACKGROUND, llm_priority
+from .services.report import FALLBACK_WEEK
+from .services.time import add_days, date_key_for_timezone, diff_days
+from .services.weekly_summary import WEEK_DAYS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BatchResult:
+    processed: int = 0
+    failed: int = 0
+    skipped: int = 0
+    latencies: List[float] = field(default_factory=list)
+    failures: Dict[str, str] = field(default_factory=dict)
+
+    def summary(self) -> Dict[str, object]:
+        values = sorted(self.latencies)
+        return {
+            "processed": self.processed,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "p50_ms": round(percentile(values, 50) * 1000, 1),
+            "p95_ms": round(percentile(values, 95) * 1000, 1),
+            "max_ms": round(values[-1] * 1000, 1) if values else 0.0,
+        }
+
+
+class RateLimiter:
+    """Spaces call starts at least 1/rate seconds apart; rate <= 0 means unlimited."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            if self._next > now:
+                await asyncio.sleep(self._next - now)
+            self._next = max(now, self._next) + self.interval
+
+
+def due_week(progress, today: str, lookback_days: int = 1) -> Optional[int]:
+    """The challenge week that ended in the ``lookback_days`` days before ``today`` (the user's
+    local date) and has at least one of the user's logs, if any."""
+    if not progress.start_date_key or not progress.last_date_key:
+        return None
+    yesterday_day = diff_days(progress.start_date_key, today)  # challenge day of yesterday
+    for day in range(yesterday_day, yesterday_day - max(1, lookback_days), -1):
+        if day >= WEEK_DAYS and day % WEEK_DAYS == 0 and day <= 28:
+            week = day // WEEK_DAYS
+            week_start = add_days(progress.start_date_key, (week - 1) * WEEK_DAYS)
+            return week if progress.last_date_key >= week_start else None
+    return None
+
+
+def _load_checkpoint(path: Optional[Path], run: str) -> Set[str]:
+    if path is None or not path.exists():
+        return set()
+    lines = path.read_text(encoding="utf-8").splitlines()
+    if not lines or json.loads(lines[0]).get("run") != run:
+        return set()
+    return {json.loads(line)["address"] for line in lines[1:] if line.strip()}
+
+
+def _start_checkpoint(path: Optional[Path], run: str, done: Set[str]) -> None:
+    if path is not None and not done:
+        path.write_text(json.dumps({"run": run}) + "\n", encoding="utf-8")
+
+
+def _record(path: Optional[Path], address: str, outcome: str) -> None:
+    if path is not None:
+        with path.open("a", encoding="utf-8") as handle:
+            handle.write(json.dumps({"address": address, "outcome": outcome}) + "\n")
+
+
+async def _active_users() -> list:
+    # only the columns due_week reads; rows have the same attribute names as UserProgress
+    async with session_scope() as db:
+        users = (await db.exec(
+            select(UserProgress.address, UserProgress.timezone, UserProgress.start_date_key, UserProgress.last_date_key).where(
+                UserProgress.challenge_id == settings.challenge_id,
+                UserProgress.last_date_key.is_not(None),
+            ).order_by(UserProgress.address)
+        )).all()
+    return users
+
+
+async def pregenerate_weekly_reports(
+    concurrency: int = 4,
+    rate: float = 0.0,
+    checkpoint: Optional[Path] = None,
+    as_of: Optional[str] = None,
+    lookback_days: int = 1,
+) -> BatchResult:
+    run = as_of or datetime.now(dt_timezone.utc).date().isoformat()
+    done = _load_checkpoint(checkpoint, run)
+    _start_checkpoint(checkpoint, run, done)
+    result = BatchResult()
+    gate = asyncio.Semaphore(max(1, concurrency))
+    limiter = RateLimiter(rate)
+
+    async def one(address: str) -> None:
+        async with gate:
+            await limiter.wait()
+            started = time.perf_counter()
+            try:
+                async with session_scope() as db:
+                    payload = await weekly_report_node({
+                        "db": db, "flow": "report_week", "address": address, "challengeId": settings.challenge_id,
+                    })
+            except Exception as exc:
+                logger.exception("weekly report for %s failed", address)
+                result.failed += 1
+                result.failures[address] = f"{exc.__class__.__name__}: {exc}"
+                return
+            result.latencies.append(time.perf_counter() - started)
+            text = payload.get("reportText")
+            if not text or text == FALLBACK_WEEK:
+                result.failed += 1
+                result.failures[address] = "LLM returned no usable text"
+                return
+            result.processed += 1
+            _record(checkpoint, address, "processed")
+
+    users = await _active_users()
+    todo = [
+        u.address for u in users
+        if u.address not in done and due_week(u, as_of or date_key_for_timezone(u.timezone), lookback_days)
+    ]
+    # not due this run, or already done by an earlier attempt of it
+    result.skipped = len(users) - len(todo)
+    with llm_priority(BACKGROUND):
+        await asyncio.gather(*(one(address) for address in todo))
+    return result
@@ -0,0 +1,76 @@
+"""Entity lookups memoized for the length of one request.
+
+Routes build a RequestContext around their session and pass it to the graph as state["ctx"];
+nodes and the route then share each UserProgress / DailyLog / ProgressSummary lookup instead of
+re-selecting it. A miss is remembered too. Code that writes a row outside the ORM identity map
+(insert_ignore, bulk UPDATE) calls invalidate() so the next lookup reads it back.
+"""
+from collections import Counter
+from typing import Any, Dict, Optional, Tuple
+
+from sqlmodel import select
+
+from .database import AsyncDb
+from .models import DailyLog, ProgressSummary, UserProgress
+from .services import progress_summary
+
+Key = Tuple[Any, ...]
+
+
+class RequestContext:
+    def __init__(self, db: AsyncDb):
+        self.db = db
+        self._entities: Dict[Key, Any] = {}
+        # SELECTs issued per entity kind; tests assert on it
+        self.fetches: Counter = Counter()
+
+    async def _load(self, key: Key, statement) -> Any:
+        if key in self._entities:
+            return self._entities[key]
+        self.fetches[key[0]] += 1
+        value = (await self.db.exec(statement)).first()
+        self._remember(key, value)
+        return value
+
+    def _remember(self, key: Key, value: Any) -> None:
+        self._entities[key] = value
+        # a log is looked up both by id and by (address, challenge, date); either fills both
+        if isinstance(value, DailyLog):
+            self._entities[("log", value.id)] = value
+            self._entities[("daily_log", value.address, value.challenge_id, value.date_key)] = value
+
+    async def progress(self, address: str) -> Optional[UserProgress]:
+        return await self._load(("progress", address), select(UserProgress).where(UserProgress.address == address))
+
+    async def daily_log(self, address: str, challenge_id: int, date_key: str) -> Optional[DailyLog]:
+        return await self._load(
+            ("daily_log", address, challenge_id, date_key),
+            select(DailyLog).where(
+                DailyLog.address == address,
+                DailyLog.challenge_id == challenge_id,
+                DailyLog.date_key == date_key,
+            ),
+        )
+
+    async def log(self, log_id: str) -> Optional[DailyLog]:
+        return await self._load(("log", log_id), select(DailyLog).where(DailyLog.id == log_id))
+
+    async def summary(self, address: str, challenge_id: int, persist: bool = True) -> ProgressSummary:
+        """progress_summary.load_summary, once per request. A row rebuilt by a read is only
+        stored when a later caller asks for ``persist``."""
+        key = ("summary", address, challenge_id)
+        summary = self._entities.get(key)
+        if summary is None:
+            self.fetches["summary"] += 1
+            summary = await progress_summary.load_summary(self.db, address, challenge_id, persist=persist)
+        elif persist and not progress_summary.is_stored(summary):
+            summary = await progress_summary.store_summary(self.db, summary)
+        self._entities[key] = summary
+        return summary
+
+    def remember(self, kind: str, *key: Any, value: Any) -> None:
+        """Record a row this request wrote, so later lookups by the same key return it."""
+        self._remember((kind, *key), value)
+
+    def invalidate(self, kind: str, *key: Any) -> None:
+        self._entities.pop((kind, *key), None)
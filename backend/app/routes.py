@@ -1,16 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import FileResponse, PlainTextResponse, Response, StreamingResponse
 from sqlmodel import Session, select
 from datetime import datetime
+import asyncio
 import os
 import json
 from typing import Dict, Any, Optional
 
-from eth_utils import keccak
-
-from .database import get_session
+from .database import get_session, get_async_session, session_scope, AsyncDb
 from .config import settings
+from .metrics import render_text
 from .schemas import (
     HealthResponse,
+    ReflectionStatusResponse,
     DailyPromptResponse,
     UserResponse,
     UserUpdateRequest,
@@ -31,19 +33,29 @@ from .schemas import (
     AiReflectionResponse,
     GenerateNftRequest,
     GenerateNftResponse,
+    NftJobResponse,
 )
 from .models import UserProgress, DailyLog
+from .request_context import RequestContext
 from .services.tasks import get_task_by_day_index
 from .services.time import date_key_for_timezone, diff_days, date_key_for_day_index
-from .graph.agent import create_agent
-from .services.reflection import generate_reflection
-from .services.nft_image import generate_nft_image
+from .graph.agent import invoke_graph
+from .services.reflection import generate_reflection, stream_reflection
+from .services.reflection_worker import get_reflection_worker, PENDING
+from .services.nft_jobs import NftJob, QueueFull, DONE, get_nft_job_queue
+from .services.image_store import get_image_store
+from .services import progress_summary
+from .services.milestones import record_milestone_token, find_milestone_token
 
 router = APIRouter()
 
 
-def _http_error(status: int, code: str, message: str, details: Optional[dict] = None):
-    raise HTTPException(status_code=status, detail={"error": {"code": code, "message": message, "details": details or {}}})
+def _http_error(status: int, code: str, message: str, details: Optional[dict] = None, headers: Optional[Dict[str, str]] = None):
+    raise HTTPException(
+        status_code=status,
+        detail={"error": {"code": code, "message": message, "details": details or {}}},
+        headers=headers,
+    )
 
 
 def _lower_address(addr: str) -> str:
@@ -64,19 +76,10 @@ def _demo_start_date_key(timezone: str) -> str:
     return settings.demo_start_date_key or date_key_for_timezone(timezone)
 
 
-def _ensure_milestones(progress: UserProgress, session: Optional[Session] = None) -> Dict[str, Optional[str]]:
-    changed = False
-    if not isinstance(progress.milestones, dict):
-        progress.milestones = {}
-        changed = True
-    for key in ("1", "2", "3"):
-        if key not in progress.milestones:
-            progress.milestones[key] = None
-            changed = True
-    if changed and session:
-        session.add(progress)
-        session.commit()
-    return progress.milestones
+def _ensure_milestones(progress: UserProgress) -> Dict[str, Optional[str]]:
+    """All three milestone keys, as a copy; callers that change it assign it back to the row."""
+    current = progress.milestones if isinstance(progress.milestones, dict) else {}
+    return {key: current.get(key) for key in ("1", "2", "3")}
 
 
 def _parse_reflection(value: Any) -> Dict[str, str]:
@@ -99,6 +102,7 @@ def _log_to_response(log: DailyLog) -> Dict[str, Any]:
         "dateKey": log.date_key,
         "normalizedText": log.normalized_text or "",
         "reflection": _parse_reflection(log.reflection),
+        "reflectionStatus": log.reflection_status or "READY",
         "saltHex": log.salt_hex,
         "proofHash": log.proof_hash,
         "status": log.status,
@@ -108,12 +112,6 @@ def _log_to_response(log: DailyLog) -> Dict[str, Any]:
     }
 
 
-def _token_id_for_milestone(address: str, milestone_id: int) -> int:
-    addr_bytes = bytes.fromhex(address[2:])
-    packed = addr_bytes + bytes([milestone_id])
-    return int.from_bytes(keccak(packed), "big")
-
-
 def _parse_token_id(token_id: str) -> int:
     token_id = token_id.strip()
     if token_id.startswith("0x"):
@@ -121,9 +119,20 @@ def _parse_token_id(token_id: str) -> int:
     return int(token_id)
 
 
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
 async def _invoke_graph(state: Dict[str, Any]):
-    agent = create_agent()
-    return await agent.graph.invoke(state)
+    return await invoke_graph(state)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(render_text(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 @router.get("/health", response_model=HealthResponse)
@@ -247,7 +256,7 @@ def daily_snapshot(address: str, dayIndex: int, session: Session = Depends(get_s
 
 
 @router.post("/checkin", response_model=CheckinResponse)
-async def checkin(payload: CheckinRequest, session: Session = Depends(get_session)):
+async def checkin(payload: CheckinRequest, session: AsyncDb = Depends(get_async_session)):
     address = _require_address(payload.address)
     if payload.dayIndex < 1 or payload.dayIndex > 28:
         _http_error(400, "INVALID_ARGUMENT", "dayIndex must be between 1 and 28")
@@ -255,7 +264,8 @@ async def checkin(payload: CheckinRequest, session: Session = Depends(get_sessio
         _http_error(400, "INVALID_ARGUMENT", "text or imageUrl required")
 
     timezone = payload.timezone or settings.default_timezone
-    progress = session.exec(select(UserProgress).where(UserProgress.address == address)).first()
+    ctx = RequestContext(session)
+    progress = await ctx.progress(address)
     start_date_key = None
     if settings.demo_mode:
         start_date_key = progress.start_date_key if progress and progress.start_date_key else _demo_start_date_key(timezone)
@@ -265,6 +275,7 @@ async def checkin(payload: CheckinRequest, session: Session = Depends(get_sessio
 
     state = {
         "db": session,
+        "ctx": ctx,
         "flow": "checkin",
         "address": address,
         "timezone": timezone,
@@ -273,39 +284,52 @@ async def checkin(payload: CheckinRequest, session: Session = Depends(get_sessio
         "dayIndex": payload.dayIndex,
         "text": payload.text,
         "imageUrl": payload.imageUrl,
+        "deferReflection": settings.reflection_mode == "async",
     }
     if start_date_key:
         state["startDateKey"] = start_date_key
     result = await _invoke_graph(state)
+    # the whole flow (progress row, log, streak, summary) lands in this one commit
+    await session.commit()
     log_id = result.get("logId")
     if not log_id:
-        log = session.exec(
-            select(DailyLog).where(
-                DailyLog.address == address,
-                DailyLog.challenge_id == settings.challenge_id,
-                DailyLog.date_key == date_key,
-            )
-        ).first()
+        log = await ctx.daily_log(address, settings.challenge_id, date_key)
     else:
-        log = session.exec(select(DailyLog).where(DailyLog.id == log_id)).first()
+        log = await ctx.log(log_id)
     if not log:
         _http_error(500, "INTERNAL", "failed to create log")
+    if log.reflection_status == PENDING:
+        get_reflection_worker().enqueue(log.id)
     return {
         "log": _log_to_response(log),
         "alreadyCheckedIn": bool(result.get("alreadyCheckedIn")),
     }
 
 
+@router.get("/reflection/status", response_model=ReflectionStatusResponse)
+def reflection_status(logId: str, session: Session = Depends(get_session)):
+    log = session.exec(select(DailyLog).where(DailyLog.id == logId)).first()
+    if not log:
+        _http_error(404, "NOT_FOUND", "logId not found")
+    return {
+        "logId": log.id,
+        "status": log.reflection_status or "READY",
+        "reflection": _parse_reflection(log.reflection),
+    }
+
+
 @router.post("/tx/confirm", response_model=TxConfirmResponse)
-async def tx_confirm(payload: TxConfirmRequest, session: Session = Depends(get_session)):
+async def tx_confirm(payload: TxConfirmRequest, session: AsyncDb = Depends(get_async_session)):
     address = _require_address(payload.address)
-    log = session.exec(select(DailyLog).where(DailyLog.id == payload.logId)).first()
+    ctx = RequestContext(session)
+    log = await ctx.log(payload.logId)
     if not log:
         _http_error(404, "NOT_FOUND", "logId not found")
     if log.tx_hash:
         return {"ok": True}
     state = {
         "db": session,
+        "ctx": ctx,
         "flow": "tx_confirm",
         "address": address,
         "logId": payload.logId,
@@ -314,6 +338,7 @@ async def tx_confirm(payload: TxConfirmRequest, session: Session = Depends(get_s
         "contractAddress": payload.contractAddress,
     }
     await _invoke_graph(state)
+    await session.commit()
     return {"ok": True}
 
 
@@ -336,6 +361,8 @@ def nft_confirm(payload: NftConfirmRequest, session: Session = Depends(get_sessi
             return {"ok": True}
         log.day_nft_tx_hash = payload.txHash
         session.add(log)
+        summary = progress_summary.load_summary_sync(session, address, settings.challenge_id)
+        session.exec(progress_summary.mark_minted(summary, log.day_index))
         progress = session.exec(select(UserProgress).where(UserProgress.address == address)).first()
         if progress:
             progress.day_mint_count = (progress.day_mint_count or 0) + 1
@@ -368,19 +395,13 @@ def milestone_mint(payload: MilestoneMintRequest, session: Session = Depends(get
     progress = session.exec(select(UserProgress).where(UserProgress.address == address)).first()
     if not progress:
         _http_error(404, "NOT_FOUND", "user not found")
-    milestones = _ensure_milestones(progress, session)
+    milestones = _ensure_milestones(progress)
 
     if milestones.get(str(milestone_id)):
         return {"ok": True, "milestones": milestones}
 
-    logs = session.exec(
-        select(DailyLog).where(
-            DailyLog.address == address,
-            DailyLog.challenge_id == settings.challenge_id,
-        )
-    ).all()
-    completed_days = {l.day_index for l in logs}
-    completed_count = len(completed_days)
+    summary = progress_summary.load_summary_sync(session, address, settings.challenge_id)
+    completed_count = progress_summary.count_days(summary.completed_mask)
     required = 7 if milestone_id == 1 else 14 if milestone_id == 2 else 28
 
     if completed_count < required:
@@ -390,14 +411,16 @@ def milestone_mint(payload: MilestoneMintRequest, session: Session = Depends(get
     progress.milestones = milestones
     progress.updated_at = datetime.utcnow()
     session.add(progress)
+    record_milestone_token(session, address, milestone_id, payload.txHash)
     session.commit()
     return {"ok": True, "milestones": milestones}
 
 
 @router.get("/progress", response_model=ProgressResponse)
-async def progress(address: str, session: Session = Depends(get_session)):
+async def progress(address: str, session: AsyncDb = Depends(get_async_session)):
     address = _require_address(address)
-    progress = session.exec(select(UserProgress).where(UserProgress.address == address)).first()
+    ctx = RequestContext(session)
+    progress = await ctx.progress(address)
     timezone = progress.timezone if progress else settings.default_timezone
 
     start_date_key = None
@@ -410,6 +433,7 @@ async def progress(address: str, session: Session = Depends(get_session)):
 
     state = {
         "db": session,
+        "ctx": ctx,
         "flow": "progress",
         "address": address,
         "challengeId": settings.challenge_id,
@@ -421,24 +445,23 @@ async def progress(address: str, session: Session = Depends(get_session)):
         state["dateKey"] = date_key
     result = await _invoke_graph(state)
 
-    progress = session.exec(select(UserProgress).where(UserProgress.address == address)).first()
-    if not progress:
-        _http_error(404, "NOT_FOUND", "user not found")
-    milestones = _ensure_milestones(progress, session)
-
-    logs = session.exec(
-        select(DailyLog).where(
-            DailyLog.address == address,
-            DailyLog.challenge_id == settings.challenge_id,
+    if progress is None:
+        # read-only: an unknown address gets a fresh, unsaved progress; its first check-in creates the row
+        progress = UserProgress(
+            address=address,
+            timezone=timezone,
+            challenge_id=settings.challenge_id,
+            start_date_key=result.get("startDateKey"),
+            streak=0,
+            milestones=_default_milestones(),
         )
-    ).all()
-    day_mint_count = sum(1 for l in logs if getattr(l, "day_nft_tx_hash", None))
-    mintable_day_index = None
-    for d in range(1, 29):
-        log_d = next((l for l in logs if l.day_index == d), None)
-        if log_d and log_d.tx_hash and not getattr(log_d, "day_nft_tx_hash", None):
-            mintable_day_index = d
-            break
+    milestones = _ensure_milestones(progress)
+
+    # day masks come from the ProgressSummary row the graph already read
+    day_mint_count = result.get("dayMintCount") or 0
+    mintable_day_index = progress_summary.first_day(
+        (result.get("submittedMask") or 0) & ~(result.get("mintedMask") or 0) & progress_summary.ALL_DAYS
+    )
     should_mint_day = mintable_day_index is not None
     should_compose_final = (day_mint_count == 28) and not (progress.final_minted or progress.final_nft_tx_hash)
 
@@ -501,12 +524,9 @@ def metadata(token_id: str, session: Session = Depends(get_session)):
             ],
         }
 
-    users = session.exec(select(UserProgress)).all()
-    for user in users:
-        milestones = user.milestones or {}
-        for milestone_id in (1, 2, 3):
-            if milestones.get(str(milestone_id)) and _token_id_for_milestone(user.address, milestone_id) == token_int:
-                return _milestone_meta(milestone_id)
+    token = find_milestone_token(session, token_int)
+    if token:
+        return _milestone_meta(token.milestone_id)
 
     return {
         "name": f"Alive28 - Milestone {token_id}",
@@ -529,51 +549,169 @@ async def ai_reflection(payload: AiReflectionRequest):
     return {"reflection": reflection}
 
 
-@router.post("/ai/generate-nft", response_model=GenerateNftResponse)
-def ai_generate_nft(payload: GenerateNftRequest):
+@router.post("/ai/reflection/stream")
+async def ai_reflection_stream(payload: AiReflectionRequest):
+    """SSE: "delta" events carry raw model text; the final "done" event carries the validated reflection."""
+    if not payload.userText or not payload.task:
+        _http_error(400, "INVALID_ARGUMENT", "userText and task are required")
+    task = payload.task.model_dump()
+
+    async def events():
+        async for kind, value in stream_reflection(task, payload.userText):
+            if kind == "delta":
+                yield _sse("delta", {"text": value})
+            else:
+                yield _sse("done", {"reflection": value})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+# image generation blocks for up to ~50s on provider calls; it runs on the job queue's own
+# threads so it can never starve the shared threadpool the sync routes depend on
+NFT_RETRY_AFTER_SECONDS = 5
+
+
+def _submit_nft_job(payload: GenerateNftRequest) -> NftJob:
     if payload.userText is None or payload.dayIndex is None:
         _http_error(400, "INVALID_ARGUMENT", "userText and dayIndex are required")
-    image = generate_nft_image(
-        day_index=payload.dayIndex,
-        task_title=payload.taskTitle or f"Day {payload.dayIndex}",
-        user_text=payload.userText,
-        reflection_note=payload.reflectionNote or "",
-        reflection_next=payload.reflectionNext or "",
-        gemini_api_key=os.getenv("GOOGLE_AI_API_KEY", ""),
-    )
+    try:
+        return get_nft_job_queue().submit(
+            day_index=payload.dayIndex,
+            task_title=payload.taskTitle or f"Day {payload.dayIndex}",
+            user_text=payload.userText,
+            reflection_note=payload.reflectionNote or "",
+            reflection_next=payload.reflectionNext or "",
+            gemini_api_key=os.getenv("GOOGLE_AI_API_KEY", ""),
+        )
+    except QueueFull:
+        _http_error(
+            503, "BUSY", "image generation queue is full, retry later",
+            headers={"Retry-After": str(NFT_RETRY_AFTER_SECONDS)},
+        )
+
+
+def _image_url(request: Request, job: NftJob) -> Optional[str]:
+    return str(request.url_for("nft_image_file", name=job.image.name)) if job.image else None
+
+
+def _nft_job_response(request: Request, job: NftJob) -> Dict[str, Any]:
+    return {
+        "jobId": job.id,
+        "status": job.status,
+        "dayIndex": job.day_index,
+        "image": _image_url(request, job),
+        "imageDigest": job.image.digest if job.image else None,
+        "provider": job.provider,
+        "error": job.error,
+    }
+
+
+@router.post("/ai/generate-nft", response_model=GenerateNftResponse)
+async def ai_generate_nft(payload: GenerateNftRequest, request: Request):
+    job = await get_nft_job_queue().wait(_submit_nft_job(payload))
+    if job.status != DONE:
+        _http_error(500, "INTERNAL", job.error or "image generation failed")
     return {
         "success": True,
-        "image": image,
-        "dayIndex": payload.dayIndex,
-        "message": f"Day {payload.dayIndex} NFT generated",
+        "image": _image_url(request, job),
+        "imageDigest": job.image.digest,
+        "dayIndex": job.day_index,
+        "message": f"Day {job.day_index} NFT generated",
     }
 
 
-@router.get("/report", response_model=ReportResponse)
-async def report(address: str, range: str, session: Session = Depends(get_session)):
-    address = _require_address(address)
-    if range not in ("week", "final"):
-        _http_error(400, "INVALID_ARGUMENT", "range must be week or final")
+@router.post("/ai/generate-nft/jobs", response_model=NftJobResponse, status_code=202)
+async def ai_generate_nft_job(payload: GenerateNftRequest, request: Request):
+    return _nft_job_response(request, _submit_nft_job(payload))
 
-    flow = "report_week" if range == "week" else "report_final"
-    state = {
-        "db": session,
-        "flow": flow,
-        "address": address,
-        "challengeId": settings.challenge_id,
-    }
-    result = await _invoke_graph(state)
 
-    recent_logs = result.get("recentLogs", [])
-    if recent_logs and isinstance(recent_logs[0], DailyLog):
-        recent_logs = [_log_to_response(l) for l in recent_logs]
-    elif recent_logs:
-        recent_logs = [_log_to_response(l) if isinstance(l, DailyLog) else l for l in recent_logs]
+@router.get("/ai/generate-nft/jobs/{job_id}", response_model=NftJobResponse)
+async def ai_generate_nft_job_status(job_id: str, request: Request, wait: float = 0):
+    """Poll a job; ``wait`` (seconds, at most 30) holds the request until the job finishes."""
+    queue = get_nft_job_queue()
+    job = queue.get(job_id)
+    if not job:
+        _http_error(404, "NOT_FOUND", "jobId not found")
+    if wait > 0:
+        await queue.wait(job, timeout=min(wait, 30.0))
+    return _nft_job_response(request, job)
+
+
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
 
+@router.get("/images/{name}", name="nft_image_file")
+async def nft_image_file(name: str, request: Request):
+    """Stored images never change under their digest, so they are cached forever."""
+    found = get_image_store().open(name)
+    if not found:
+        _http_error(404, "NOT_FOUND", "image not found")
+    path, content_type = found
+    headers = {"ETag": f'"{path.stem}"', "Cache-Control": IMAGE_CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match", "")
+    if headers["ETag"] in (tag.strip() for tag in if_none_match.split(",")) or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=content_type, headers=headers)
+
+
+def _report_response(result: Dict[str, Any], range: str) -> Dict[str, Any]:
+    recent_logs = [_log_to_response(l) if isinstance(l, DailyLog) else l for l in result.get("recentLogs") or []]
     return {
-        "title": result.get("title", "周报（模拟）" if range == "week" else "结营报告（模拟）"),
-        "reportText": result.get("reportText", ""),
+        "title": result.get("title") or ("周报（模拟）" if range == "week" else "结营报告（模拟）"),
+        "reportText": result.get("reportText") or "",
         "recentLogs": recent_logs,
-        "chartByDay": result.get("chartByDay", []),
+        "chartByDay": result.get("chartByDay") or [],
         "range": range,
     }
+
+
+def _report_state(db: AsyncDb, address: str, range: str) -> Dict[str, Any]:
+    return {
+        "db": db,
+        "flow": "report_week" if range == "week" else "report_final",
+        "address": address,
+        "challengeId": settings.challenge_id,
+    }
+
+
+@router.get("/report", response_model=ReportResponse)
+async def report(address: str, range: str, session: AsyncDb = Depends(get_async_session)):
+    address = _require_address(address)
+    if range not in ("week", "final"):
+        _http_error(400, "INVALID_ARGUMENT", "range must be week or final")
+
+    result = await _invoke_graph(_report_state(session, address, range))
+    return _report_response(result, range)
+
+
+@router.get("/report/stream")
+async def report_stream(address: str, range: str):
+    """SSE over the same report flow as /report: "meta" (chart and recent logs), "delta" text chunks,
+    then "done" with the full ReportResponse."""
+    address = _require_address(address)
+    if range not in ("week", "final"):
+        _http_error(400, "INVALID_ARGUMENT", "range must be week or final")
+
+    async def events():
+        queue: asyncio.Queue = asyncio.Queue()
+        # the session lives inside the generator because the graph keeps using it while we stream
+        async with session_scope() as session:
+            state = _report_state(session, address, range)
+            state["reportStream"] = queue
+            run = asyncio.create_task(_invoke_graph(state))
+            run.add_done_callback(lambda _: queue.put_nowait(None))
+            try:
+                while (item := await queue.get()) is not None:
+                    kind, value = item
+                    if kind == "meta":
+                        meta = _report_response(value, range)
+                        yield _sse("meta", {k: meta[k] for k in ("title", "recentLogs", "chartByDay", "range")})
+                    else:
+                        yield _sse("delta", {"text": value})
+                result = await run
+            finally:
+                if not run.done():
+                    run.cancel()
+        yield _sse("done", _report_response(result, range))
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
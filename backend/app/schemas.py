@@ -65,6 +65,7 @@ class DailyLogResponse(BaseModel):
     dateKey: str
     normalizedText: str
     reflection: Reflection
+    reflectionStatus: str = "READY"
     saltHex: str
     proofHash: str
     status: str
@@ -73,6 +74,12 @@ class DailyLogResponse(BaseModel):
     createdAt: str
 
 
+class ReflectionStatusResponse(BaseModel):
+    logId: str
+    status: str
+    reflection: Reflection
+
+
 class CheckinResponse(BaseModel):
     log: DailyLogResponse
     alreadyCheckedIn: bool
@@ -179,6 +186,17 @@ class GenerateNftRequest(BaseModel):
 
 class GenerateNftResponse(BaseModel):
     success: bool
-    image: str
+    image: str  # URL of the stored image
+    imageDigest: str
     dayIndex: int
     message: str
+
+
+class NftJobResponse(BaseModel):
+    jobId: str
+    status: str
+    dayIndex: int
+    image: Optional[str] = None
+    imageDigest: Optional[str] = None
+    provider: Optional[str] = None
+    error: Optional[str] = None
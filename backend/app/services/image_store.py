@@ -0,0 +1,165 @@
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS: Dict[str, str] = {
+    "image/png": ".png",
+    "image/jpeg": ".jpg",
+    "image/webp": ".webp",
+    "image/gif": ".gif",
+    "image/svg+xml": ".svg",
+}
+CONTENT_TYPES = {ext: content_type for content_type, ext in EXTENSIONS.items()}
+NAME_RE = re.compile(r"^([0-9a-f]{64})(\.[a-z]+)$")
+
+
+@dataclass(frozen=True)
+class StoredImage:
+    digest: str
+    content_type: str
+    size: int
+
+    @property
+    def name(self) -> str:
+        return self.digest + EXTENSIONS[self.content_type]
+
+
+class ImageWriter:
+    """Streams one image into a temp file while hashing it; commit() moves it into place."""
+
+    def __init__(self, store: "ImageStore", content_type: str):
+        self.store = store
+        self.content_type = content_type
+        self.size = 0
+        self._hash = hashlib.sha256()
+        fd, self._tmp = tempfile.mkstemp(dir=store.tmp_dir, suffix=".part")
+        self._file = os.fdopen(fd, "wb")
+
+    def write(self, chunk: bytes) -> None:
+        self._hash.update(chunk)
+        self._file.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self) -> StoredImage:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        stored = StoredImage(self._hash.hexdigest(), self.content_type, self.size)
+        self.store._install(self._tmp, stored)
+        self._tmp = None
+        return stored
+
+    def discard(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+        if self._tmp is not None:
+            try:
+                os.unlink(self._tmp)
+            except FileNotFoundError:
+                pass
+            self._tmp = None
+
+    def __enter__(self) -> "ImageWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        # a commit() inside the block already cleared _tmp; anything else is abandoned
+        self.discard()
+
+
+class ImageStore:
+    """Content-addressed images on disk: <root>/<aa>/<sha256><ext>.
+
+    Writes go to a temp file and are renamed into place, so a file under its final name is
+    always complete and never changes. Total size is capped at ``max_bytes``; serving a
+    file bumps its mtime and eviction removes the least recently used files first.
+    """
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.tmp_dir = self.root / "tmp"
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._total = sum(p.stat().st_size for p in self._files())
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total
+
+    def writer(self, content_type: str) -> ImageWriter:
+        if content_type not in EXTENSIONS:
+            raise ValueError(f"unsupported image type {content_type}")
+        return ImageWriter(self, content_type)
+
+    def put(self, data: bytes, content_type: str) -> StoredImage:
+        with self.writer(content_type) as writer:
+            writer.write(data)
+            return writer.commit()
+
+    def open(self, name: str) -> Optional[Tuple[Path, str]]:
+        """(path, content type) for a stored file name, marking it recently used."""
+        match = NAME_RE.match(name)
+        if not match or match.group(2) not in CONTENT_TYPES:
+            return None
+        path = self._path(match.group(1), match.group(2))
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path, CONTENT_TYPES[match.group(2)]
+
+    def _path(self, digest: str, ext: str) -> Path:
+        return self.root / digest[:2] / (digest + ext)
+
+    def _files(self):
+        return (p for p in self.root.glob("??/*") if p.is_file())
+
+    def _install(self, tmp: str, stored: StoredImage) -> None:
+        path = self._path(stored.digest, EXTENSIONS[stored.content_type])
+        with self._lock:
+            if path.exists():
+                # same bytes already stored
+                os.unlink(tmp)
+                os.utime(path)
+                return
+            path.parent.mkdir(exist_ok=True)
+            os.replace(tmp, path)
+            self._total += stored.size
+            if self._total > self.max_bytes:
+                self._evict(keep=path)
+
+    def _evict(self, keep: Path) -> None:
+        by_age = sorted(((p.stat().st_mtime, p) for p in self._files() if p != keep), key=lambda item: item[0])
+        for _, path in by_age:
+            if self._total <= self.max_bytes:
+                break
+            try:
+                size = path.stat().st_size
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            self._total -= size
+            logger.info("image store over %d bytes; evicted %s", self.max_bytes, path.name)
+
+
+_store: Optional[ImageStore] = None
+_store_lock = threading.Lock()
+
+
+def get_image_store() -> ImageStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ImageStore(Path(settings.nft_image_dir), settings.nft_image_store_max_mb * 1024 * 1024)
+        return _store
@@ -0,0 +1,324 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from spoon_ai.chat import ChatBot
+from spoon_ai.schema import Message
+
+from ..config import settings
+from ..metrics import counter, gauge, histogram
+
+logger = logging.getLogger(__name__)
+
+llm_request_seconds = histogram(
+    "llm_request_seconds",
+    "LLM call latency by operation and outcome (ok / fallback: unusable output / error: exception)",
+    ("operation", "provider", "outcome"),
+    buckets=(0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0),
+)
+llm_fallbacks = counter("llm_fallbacks_total", "LLM calls answered with the canned fallback text", ("operation", "reason"))
+llm_in_flight = gauge("llm_in_flight", "LLM calls holding a provider slot", ("provider",))
+llm_queue_depth = gauge("llm_queue_depth", "LLM calls waiting for a provider slot", ("provider", "priority"))
+llm_queue_wait_seconds = histogram(
+    "llm_queue_wait_seconds",
+    "Time an LLM call waited for a provider slot and token budget",
+    ("provider", "priority"),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+llm_rejected = counter(
+    "llm_rejected_total",
+    "LLM calls turned away by the governor (queue_full / timeout: waited longer than LLM_QUEUE_TIMEOUT_SECONDS)",
+    ("provider", "priority", "reason"),
+)
+
+# lower runs first: a check-in waiting on its reflection goes ahead of report work
+INTERACTIVE, REPORT, BACKGROUND = 0, 1, 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", REPORT: "report", BACKGROUND: "background"}
+# what a call is charged against the tokens-per-minute budget on top of its prompt
+REPLY_TOKENS = 256
+
+_priority_floor: ContextVar[int] = ContextVar("llm_priority_floor", default=INTERACTIVE)
+
+
+class LLMBusyError(RuntimeError):
+    """The governor turned a call away; callers answer with their fallback text."""
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count without a tokenizer: one per CJK character, about four characters per token otherwise."""
+    wide = sum(1 for ch in text if ord(ch) >= 0x2E80)
+    return wide + (len(text) - wide + 3) // 4
+
+
+def record_llm_call(operation: str, started: float, outcome: str) -> None:
+    """Observe one LLM call that began at time.perf_counter() == started."""
+    llm_request_seconds.observe(time.perf_counter() - started, operation=operation, provider=settings.llm_provider, outcome=outcome)
+    if outcome != "ok":
+        llm_fallbacks.inc(operation=operation, reason=outcome)
+
+
+def failure_outcome(exc: BaseException) -> str:
+    return "rejected" if isinstance(exc, LLMBusyError) else "error"
+
+
+@contextmanager
+def llm_priority(priority: int) -> Iterator[None]:
+    """Run LLM calls made inside the block (and tasks created from it) at ``priority`` or lower.
+
+    Background work (the reflection worker, report pre-generation, stale-while-revalidate
+    refreshes) wraps itself in this so the same service functions queue behind interactive calls.
+    """
+    token = _priority_floor.set(max(priority, _priority_floor.get()))
+    try:
+        yield
+    finally:
+        _priority_floor.reset(token)
+
+
+def parse_provider_limits(spec: str) -> Dict[str, Tuple[int, int]]:
+    """LLM_PROVIDER_LIMITS, e.g. "deepseek=8/60000,openai=4/30000": provider=concurrency/tokens-per-minute.
+    The tokens part may be left out (``openai=4``); 0 tokens means no budget."""
+    limits: Dict[str, Tuple[int, int]] = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        provider, _, value = item.partition("=")
+        concurrency, _, tokens = value.partition("/")
+        try:
+            limits[provider.strip()] = (max(1, int(concurrency)), max(0, int(tokens or 0)))
+        except ValueError:
+            logger.warning("ignoring malformed LLM_PROVIDER_LIMITS entry %r", item)
+    return limits
+
+
+class ProviderGovernor:
+    """Admission for one provider: at most ``max_concurrency`` calls in flight, a token bucket of
+    ``tokens_per_minute`` (0: unlimited) and at most ``max_queue`` waiting calls.
+
+    Waiting calls are served by priority, then arrival; nothing overtakes the head of the queue,
+    so a large report prompt waiting for token budget is not starved by small check-ins behind it
+    of the same priority. A call larger than the whole budget runs once the bucket is full. Calls
+    that find the queue full, or wait longer than ``timeout`` seconds, raise LLMBusyError.
+    """
+
+    def __init__(self, provider: str, max_concurrency: int, tokens_per_minute: int = 0, max_queue: int = 64, timeout: Optional[float] = None):
+        self.provider = provider
+        self.max_concurrency = max(1, max_concurrency)
+        self.tokens_per_minute = max(0, tokens_per_minute)
+        self.max_queue = max(0, max_queue)
+        self.timeout = timeout if timeout and timeout > 0 else None
+        self.in_flight = 0
+        self._tokens = float(self.tokens_per_minute)
+        self._refilled = time.monotonic()
+        self._seq = itertools.count()
+        self._waiting: List[Tuple[int, int, int, asyncio.Future]] = []
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+
+    def queued(self) -> int:
+        return len(self._waiting)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.tokens_per_minute, self._tokens + (now - self._refilled) * self.tokens_per_minute / 60)
+        self._refilled = now
+
+    def _token_shortfall(self, tokens: int) -> float:
+        if not self.tokens_per_minute:
+            return 0.0
+        self._refill()
+        return max(0.0, min(tokens, self.tokens_per_minute) - self._tokens)
+
+    def _start(self, tokens: int) -> None:
+        self.in_flight += 1
+        if self.tokens_per_minute:
+            self._tokens -= tokens
+        llm_in_flight.set(self.in_flight, provider=self.provider)
+
+    def _set_depth(self, priority: int) -> None:
+        depth = sum(1 for entry in self._waiting if entry[0] == priority)
+        llm_queue_depth.set(depth, provider=self.provider, priority=PRIORITY_NAMES[priority])
+
+    def _dispatch(self) -> None:
+        self._wakeup = None
+        while self._waiting and self.in_flight < self.max_concurrency:
+            priority, _, tokens, future = self._waiting[0]
+            shortfall = self._token_shortfall(tokens)
+            if shortfall:
+                # the head waits for the bucket; wake up when it has refilled enough
+                delay = shortfall * 60 / self.tokens_per_minute
+                self._wakeup = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            heapq.heappop(self._waiting)
+            self._set_depth(priority)
+            self._start(tokens)
+            future.set_result(None)
+
+    def _schedule(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+        self._dispatch()
+
+    def _reject(self, priority: int, reason: str) -> LLMBusyError:
+        llm_rejected.inc(provider=self.provider, priority=PRIORITY_NAMES[priority], reason=reason)
+        return LLMBusyError(f"LLM provider {self.provider} is busy ({reason})")
+
+    async def acquire(self, priority: int = INTERACTIVE, tokens: int = REPLY_TOKENS) -> None:
+        labels = {"provider": self.provider, "priority": PRIORITY_NAMES[priority]}
+        if not self._waiting and self.in_flight < self.max_concurrency and not self._token_shortfall(tokens):
+            self._start(tokens)
+            llm_queue_wait_seconds.observe(0.0, **labels)
+            return
+        if len(self._waiting) >= self.max_queue:
+            raise self._reject(priority, "queue_full")
+        started = time.perf_counter()
+        entry = (priority, next(self._seq), tokens, asyncio.get_running_loop().create_future())
+        heapq.heappush(self._waiting, entry)
+        self._set_depth(priority)
+        # a new head (higher priority) may fit where the old one did not
+        self._schedule()
+        try:
+            await asyncio.wait_for(entry[3], self.timeout)
+        except BaseException as exc:
+            if entry[3].done() and not entry[3].cancelled():
+                # admitted in the same instant we gave up: hand the slot back
+                self.release()
+            elif entry in self._waiting:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._set_depth(priority)
+                self._schedule()
+            if isinstance(exc, asyncio.TimeoutError):
+                raise self._reject(priority, "timeout") from None
+            raise
+        finally:
+            llm_queue_wait_seconds.observe(time.perf_counter() - started, **labels)
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        llm_in_flight.set(self.in_flight, provider=self.provider)
+        self._schedule()
+
+
+class _ProviderPool:
+    def __init__(self, provider: str, model: str, governor: ProviderGovernor):
+        self.provider = provider
+        self.model = model
+        self.governor = governor
+        self.created = 0
+        self._idle: List[ChatBot] = []
+
+    def _create(self) -> ChatBot:
+        self.created += 1
+        if self.provider == settings.llm_provider and self.model == settings.llm_model:
+            # the configured default: let spoon_ai resolve keys/base URL exactly as before
+            return ChatBot()
+        return ChatBot(llm_provider=self.provider, model_name=self.model)
+
+    @asynccontextmanager
+    async def acquire(self, priority: int, tokens: int) -> AsyncIterator[ChatBot]:
+        await self.governor.acquire(priority, tokens)
+        bot = self._idle.pop() if self._idle else self._create()
+        try:
+            yield bot
+        finally:
+            self._idle.append(bot)
+            self.governor.release()
+
+
+class LLMClientPool:
+    """Reusable ChatBot clients per (provider, model), admitted by one ProviderGovernor per provider.
+
+    Clients are created lazily and returned to the pool after each call, so provider setup and
+    the underlying HTTP connections are paid once per client instead of once per request. Every
+    model of a provider shares its governor: by default max_clients_per_provider calls at once
+    and no token budget, overridden per provider by ``limits`` (provider -> (concurrency, tpm)).
+    """
+
+    def __init__(
+        self,
+        max_clients_per_provider: int,
+        tokens_per_minute: int = 0,
+        max_queue: int = 64,
+        queue_timeout: Optional[float] = None,
+        limits: Optional[Dict[str, Tuple[int, int]]] = None,
+    ):
+        self.max_clients_per_provider = max_clients_per_provider
+        self.tokens_per_minute = tokens_per_minute
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.limits = limits or {}
+        self._governors: Dict[str, ProviderGovernor] = {}
+        self._pools: Dict[Tuple[str, str], _ProviderPool] = {}
+
+    def governor(self, provider: str) -> ProviderGovernor:
+        governor = self._governors.get(provider)
+        if governor is None:
+            concurrency, tokens = self.limits.get(provider, (self.max_clients_per_provider, self.tokens_per_minute))
+            governor = self._governors[provider] = ProviderGovernor(provider, concurrency, tokens, self.max_queue, self.queue_timeout)
+        return governor
+
+    def _pool(self, provider: str, model: str) -> _ProviderPool:
+        key = (provider, model)
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = self._pools[key] = _ProviderPool(provider, model, self.governor(provider))
+        return pool
+
+    def client(self, provider: Optional[str] = None, model: Optional[str] = None, *, priority: int = INTERACTIVE, prompt: str = ""):
+        """A pooled client once the provider's governor admits the call. ``prompt`` (system and
+        user text) is charged against the token budget; llm_priority() can only lower ``priority``."""
+        priority = max(priority, _priority_floor.get())
+        tokens = estimate_tokens(prompt) + REPLY_TOKENS
+        return self._pool(provider or settings.llm_provider, model or settings.llm_model).acquire(priority, tokens)
+
+    def clients_created(self) -> int:
+        return sum(pool.created for pool in self._pools.values())
+
+    async def close(self) -> None:
+        managers = {}
+        for pool in self._pools.values():
+            for bot in pool._idle:
+                manager = getattr(bot, "llm_manager", None)
+                if manager is not None:
+                    managers[id(manager)] = manager
+            pool._idle.clear()
+        for manager in managers.values():
+            try:
+                await manager.cleanup()
+            except Exception:
+                logger.exception("LLM client cleanup failed")
+
+
+async def stream_ask(bot: ChatBot, messages: List[dict], system_msg: Optional[str] = None) -> AsyncIterator[str]:
+    """Streaming counterpart of ChatBot.ask: yields text chunks as the provider produces them."""
+    formatted = [Message(role="system", content=system_msg)] if system_msg else []
+    formatted.extend(Message(**m) for m in messages)
+    async for chunk in bot.llm_manager.chat_stream(messages=formatted, provider=bot.llm_provider):
+        if chunk:
+            yield chunk
+
+
+_pool: Optional[LLMClientPool] = None
+
+
+def get_llm_pool() -> LLMClientPool:
+    global _pool
+    if _pool is None:
+        _pool = LLMClientPool(
+            settings.llm_max_clients_per_provider,
+            tokens_per_minute=settings.llm_tokens_per_minute,
+            max_queue=settings.llm_queue_size,
+            queue_timeout=settings.llm_queue_timeout_seconds,
+            limits=parse_provider_limits(settings.llm_provider_limits),
+        )
+    return _pool
+
+
+async def close_llm_pool() -> None:
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
@@ -0,0 +1,64 @@
+from typing import Optional
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+from eth_utils import keccak
+
+from ..database import insert_ignore
+from ..models import MilestoneToken, UserProgress
+
+MILESTONE_IDS = (1, 2, 3)
+
+
+def token_id_for_milestone(address: str, milestone_id: int) -> int:
+    # Must match MilestoneNFT: keccak256(abi.encodePacked(address, uint8 milestoneId))
+    addr_bytes = bytes.fromhex(address[2:])
+    packed = addr_bytes + bytes([milestone_id])
+    return int.from_bytes(keccak(packed), "big")
+
+
+def _insert_token(db: Session, token_id: str, address: str, milestone_id: int, tx_hash: Optional[str]) -> bool:
+    """Insert the token row unless it already exists; True if this call created it.
+
+    A concurrent mint of the same milestone may insert between our read and our write, so
+    the existence check happens in the INSERT itself rather than in a prior SELECT.
+    """
+    values = {"token_id": token_id, "address": address, "milestone_id": milestone_id, "tx_hash": tx_hash}
+    stmt = insert_ignore(db.get_bind(), MilestoneToken, values)
+    if stmt is not None:
+        return db.exec(stmt).rowcount == 1
+    try:
+        with db.begin_nested():
+            db.add(MilestoneToken(**values))
+        return True
+    except IntegrityError:
+        return False
+
+
+def record_milestone_token(db: Session, address: str, milestone_id: int, tx_hash: Optional[str]) -> MilestoneToken:
+    token_id = str(token_id_for_milestone(address, milestone_id))
+    token = db.get(MilestoneToken, token_id)
+    if not token:
+        _insert_token(db, token_id, address, milestone_id, tx_hash)
+        token = db.get(MilestoneToken, token_id)
+    return token
+
+
+def find_milestone_token(db: Session, token_id: int) -> Optional[MilestoneToken]:
+    return db.get(MilestoneToken, str(token_id))
+
+
+def backfill_milestone_tokens(db: Session) -> int:
+    """Index every milestone already recorded in UserProgress.milestones. Safe to re-run."""
+    created = 0
+    users = db.exec(select(UserProgress)).all()
+    for user in users:
+        milestones = user.milestones if isinstance(user.milestones, dict) else {}
+        for milestone_id in MILESTONE_IDS:
+            tx_hash = milestones.get(str(milestone_id))
+            if not tx_hash:
+                continue
+            token_id = str(token_id_for_milestone(user.address, milestone_id))
+            if _insert_token(db, token_id, user.address, milestone_id, tx_hash):
+                created += 1
+    db.commit()
+    return created
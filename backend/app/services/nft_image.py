@@ -1,9 +1,31 @@
+import asyncio
 import base64
+import logging
+import math
 import random
 import urllib.parse
-import urllib.request
-import json
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import httpx
+
+from ..config import settings
+from ..metrics import counter, histogram
+from .image_store import EXTENSIONS, ImageStore, StoredImage, get_image_store
+
+logger = logging.getLogger(__name__)
+
+provider_requests = counter(
+    "nft_image_provider_requests_total",
+    "NFT image provider attempts by provider and outcome (ok/empty/error/cancelled).",
+    ("provider", "outcome"),
+)
+provider_seconds = histogram(
+    "nft_image_provider_seconds",
+    "NFT image provider attempt duration by provider and outcome.",
+    ("provider", "outcome"),
+    buckets=(0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0),
+)
 
 
 def _build_prompt(day_index: int, task_title: str, user_text: str, reflection_note: str) -> str:
@@ -17,48 +39,45 @@ def _build_prompt(day_index: int, task_title: str, user_text: str, reflection_no
     )
 
 
-def _pollinations_image(prompt: str) -> Optional[str]:
+async def _pollinations_image(client: httpx.AsyncClient, prompt: str, store: ImageStore) -> Optional[StoredImage]:
     encoded = urllib.parse.quote(prompt)
     seed = random.randint(1, 1_000_000)
-    url = f"https://pollinations.ai/p/{encoded}?width=1024&height=1024&seed={seed}&model=flux"
-    req = urllib.request.Request(url, headers={"User-Agent": "alive28-mvp"})
-    with urllib.request.urlopen(req, timeout=20) as resp:
-        content_type = resp.headers.get("Content-Type") or ""
-        if not content_type.startswith("image"):
+    url = f"{settings.pollinations_base_url}/p/{encoded}?width=1024&height=1024&seed={seed}&model=flux"
+    async with client.stream("GET", url, headers={"User-Agent": "alive28-mvp"}, timeout=20) as resp:
+        content_type = (resp.headers.get("Content-Type") or "").split(";")[0].strip()
+        if resp.status_code != 200 or content_type not in EXTENSIONS:
             return None
-        data = resp.read()
-        b64 = base64.b64encode(data).decode("ascii")
-        return f"data:{content_type};base64,{b64}"
+        # chunks go straight to disk, so memory stays flat whatever the image size
+        with store.writer(content_type) as writer:
+            async for chunk in resp.aiter_bytes():
+                writer.write(chunk)
+            return writer.commit()
 
 
-def _gemini_image(prompt: str, api_key: str) -> Optional[str]:
-    if not api_key:
-        return None
+async def _gemini_image(client: httpx.AsyncClient, prompt: str, api_key: str, store: ImageStore) -> Optional[StoredImage]:
     url = (
-        "https://generativelanguage.googleapis.com/v1beta/models/"
+        f"{settings.gemini_base_url}/v1beta/models/"
         "gemini-2.5-flash-image:generateContent?key="
         + api_key
     )
-    body = json.dumps(
-        {
-            "contents": [{"parts": [{"text": prompt}]}],
-            "generationConfig": {"responseModalities": ["TEXT", "IMAGE"]},
-        }
-    ).encode("utf-8")
-    req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
-    with urllib.request.urlopen(req, timeout=30) as resp:
-        payload = json.loads(resp.read().decode("utf-8"))
+    body = {
+        "contents": [{"parts": [{"text": prompt}]}],
+        "generationConfig": {"responseModalities": ["TEXT", "IMAGE"]},
+    }
+    resp = await client.post(url, json=body, timeout=30)
+    resp.raise_for_status()
+    payload = resp.json()
     parts = payload.get("candidates", [{}])[0].get("content", {}).get("parts", [])
     for part in parts:
         inline = part.get("inlineData") or {}
         data = inline.get("data")
         if data:
             mime = inline.get("mimeType") or "image/png"
-            return f"data:{mime};base64,{data}"
+            return store.put(base64.b64decode(data), mime)
     return None
 
 
-def _fallback_svg(day_index: int) -> str:
+def _fallback_svg(day_index: int) -> bytes:
     if day_index <= 7:
         colors = ("#fce7f3", "#f9a8d4", "#ec4899", "#f472b6")
     elif day_index <= 14:
@@ -90,8 +109,107 @@ def _fallback_svg(day_index: int) -> str:
         fill="white" text-anchor="middle" opacity="0.7">DAY OF 28</text>
 </svg>
 """.strip()
-    b64 = base64.b64encode(svg.encode("utf-8")).decode("ascii")
-    return f"data:image/svg+xml;base64,{b64}"
+    return svg.encode("utf-8")
+
+
+@dataclass
+class ProviderAttempt:
+    provider: str
+    outcome: str  # ok | empty | error | cancelled
+    seconds: float
+
+
+@dataclass
+class ImageResult:
+    image: StoredImage
+    provider: str  # pollinations | gemini | fallback
+    elapsed: float
+    attempts: List[ProviderAttempt] = field(default_factory=list)
+
+
+async def _race(
+    providers: List[Tuple[str, Callable[[], Awaitable[Optional[StoredImage]]]]],
+    hedge_delay: float,
+    deadline: float,
+) -> Tuple[Optional[StoredImage], Optional[str], List[ProviderAttempt]]:
+    """Start providers in order, the next one hedge_delay after the previous (or as soon as
+    everything started so far has failed); first valid image wins and the rest are cancelled.
+
+    Gives up at ``deadline`` seconds. hedge_delay=inf is the old strictly sequential order.
+    """
+    loop = asyncio.get_running_loop()
+    started_at = loop.time()
+    attempts: List[ProviderAttempt] = []
+    names: Dict[asyncio.Task, str] = {}
+    pending: Set[asyncio.Task] = set()
+
+    async def attempt(name: str, call) -> Optional[StoredImage]:
+        t0 = loop.time()
+        outcome = "error"
+        try:
+            image = await call()
+            outcome = "ok" if image else "empty"
+            return image
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        except Exception:
+            logger.warning("NFT image provider %s failed", name, exc_info=True)
+            return None
+        finally:
+            elapsed = loop.time() - t0
+            attempts.append(ProviderAttempt(name, outcome, elapsed))
+            provider_requests.inc(provider=name, outcome=outcome)
+            provider_seconds.observe(elapsed, provider=name, outcome=outcome)
+
+    def launch(index: int) -> float:
+        name, call = providers[index]
+        task = asyncio.create_task(attempt(name, call))
+        names[task] = name
+        pending.add(task)
+        return loop.time() + hedge_delay
+
+    next_at = launch(0)
+    next_index = 1
+    deadline_at = started_at + deadline
+    try:
+        while pending or next_index < len(providers):
+            if next_index < len(providers) and (not pending or loop.time() >= next_at):
+                next_at = launch(next_index)
+                next_index += 1
+            wake_at = min(deadline_at, next_at) if next_index < len(providers) else deadline_at
+            timeout = wake_at - loop.time()
+            if timeout <= 0 and loop.time() >= deadline_at:
+                break
+            done, _ = await asyncio.wait(pending, timeout=max(timeout, 0), return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                pending.discard(task)
+                if task.result():
+                    return task.result(), names[task], attempts
+            if loop.time() >= deadline_at:
+                break
+        return None, None, attempts
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def _generate(prompt: str, day_index: int, gemini_api_key: str) -> ImageResult:
+    loop = asyncio.get_running_loop()
+    started_at = loop.time()
+    hedge_delay = settings.nft_hedge_delay_seconds if settings.nft_image_mode == "hedged" else math.inf
+    store = get_image_store()
+    async with httpx.AsyncClient() as client:
+        providers = [("pollinations", lambda: _pollinations_image(client, prompt, store))]
+        if gemini_api_key:
+            providers.append(("gemini", lambda: _gemini_image(client, prompt, gemini_api_key, store)))
+        image, provider, attempts = await _race(providers, hedge_delay, settings.nft_image_deadline_seconds)
+    if image is None:
+        image, provider = store.put(_fallback_svg(day_index), "image/svg+xml"), "fallback"
+        provider_requests.inc(provider="fallback", outcome="ok")
+    return ImageResult(image=image, provider=provider, elapsed=loop.time() - started_at, attempts=attempts)
 
 
 def generate_nft_image(
@@ -101,18 +219,13 @@ def generate_nft_image(
     reflection_note: str,
     reflection_next: str,
     gemini_api_key: str = "",
-) -> str:
+) -> ImageResult:
+    """Blocking; runs its own event loop so it can be called from the NFT job threads."""
     prompt = _build_prompt(day_index, task_title, user_text, reflection_note)
-    try:
-        image = _pollinations_image(prompt)
-        if image:
-            return image
-    except Exception:
-        pass
-    try:
-        image = _gemini_image(prompt, gemini_api_key)
-        if image:
-            return image
-    except Exception:
-        pass
-    return _fallback_svg(day_index)
+    result = asyncio.run(_generate(prompt, day_index, gemini_api_key))
+    logger.info(
+        "nft image day=%s provider=%s digest=%s elapsed=%.2fs attempts=%s",
+        day_index, result.provider, result.image.digest, result.elapsed,
+        ",".join(f"{a.provider}:{a.outcome}:{a.seconds:.2f}" for a in result.attempts),
+    )
+    return result
@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from ..config import settings
+from . import nft_image
+from .image_store import StoredImage
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "QUEUED"
+RUNNING = "RUNNING"
+DONE = "DONE"
+FAILED = "FAILED"
+
+
+class QueueFull(Exception):
+    """More image jobs are waiting or running than the queue allows; retry later."""
+
+
+@dataclass
+class NftJob:
+    id: str
+    day_index: int
+    status: str = QUEUED
+    image: Optional[StoredImage] = None
+    provider: Optional[str] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.monotonic)
+    finished_at: Optional[float] = None
+    future: Optional[Future] = field(default=None, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+
+class NftJobQueue:
+    """Runs generate_nft_image on its own threads, never on the server's shared threadpool.
+
+    At most ``workers`` images are generated at once and at most ``max_pending`` jobs
+    (running plus waiting) are accepted; beyond that submit() raises QueueFull so the
+    route can answer 503 instead of letting requests pile up. Finished jobs are kept for
+    ``ttl_seconds`` so clients can poll for the result.
+    """
+
+    def __init__(self, workers: int, max_pending: int, ttl_seconds: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.ttl_seconds = ttl_seconds
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="nft-image")
+        self._jobs: Dict[str, NftJob] = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def submit(self, **kwargs) -> NftJob:
+        with self._lock:
+            self._prune()
+            if self._pending >= self.max_pending:
+                raise QueueFull(f"{self._pending} image jobs pending")
+            self._pending += 1
+            job = NftJob(id=uuid.uuid4().hex, day_index=kwargs["day_index"])
+            self._jobs[job.id] = job
+        job.future = self._executor.submit(self._run, job, kwargs)
+        return job
+
+    def get(self, job_id: str) -> Optional[NftJob]:
+        with self._lock:
+            self._prune()
+            return self._jobs.get(job_id)
+
+    async def wait(self, job: NftJob, timeout: Optional[float] = None) -> NftJob:
+        """Wait for the job without holding a thread; returns it finished or still running."""
+        if not job.finished and job.future is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(job.future)), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return job
+
+    def _run(self, job: NftJob, kwargs: dict) -> None:
+        job.status = RUNNING
+        try:
+            result = nft_image.generate_nft_image(**kwargs)
+            job.image, job.provider = result.image, result.provider
+            job.status = DONE
+        except Exception as exc:
+            logger.exception("NFT image job %s failed", job.id)
+            job.error = str(exc) or exc.__class__.__name__
+            job.status = FAILED
+        finally:
+            job.finished_at = time.monotonic()
+            with self._lock:
+                self._pending -= 1
+
+    def _prune(self) -> None:
+        cutoff = time.monotonic() - self.ttl_seconds
+        expired = [jid for jid, job in self._jobs.items() if job.finished_at is not None and job.finished_at < cutoff]
+        for jid in expired:
+            del self._jobs[jid]
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_queue: Optional[NftJobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_nft_job_queue() -> NftJobQueue:
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = NftJobQueue(settings.nft_image_workers, settings.nft_image_queue_size, settings.nft_job_ttl_seconds)
+        return _queue
+
+
+def shutdown_nft_job_queue() -> None:
+    global _queue
+    with _queue_lock:
+        if _queue is not None:
+            _queue.shutdown()
+            _queue = None
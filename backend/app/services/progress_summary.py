@@ -0,0 +1,243 @@
+"""Per-(address, challenge) progress kept as 28-bit day masks (bit d-1 is day d).
+
+Writers flip bits in the same transaction as the DailyLog change they mirror, so /progress,
+/milestone/mint and the badge check read one row instead of every log. A missing row is
+rebuilt from DailyLog on first use, which also covers databases created before the table.
+
+Bits are set with single UPDATE statements (``mask = mask | bit``), never by writing a row back
+that was read earlier, so concurrent confirms for one user cannot overwrite each other's bits.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+from sqlalchemy import case, inspect, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlmodel import Session, select
+
+from ..database import insert_ignore
+from ..models import DailyLog, ProgressSummary
+from .time import diff_days
+
+DAYS = 28
+ALL_DAYS = (1 << DAYS) - 1
+SUMMARY_FIELDS = ("completed_mask", "submitted_mask", "minted_mask", "mint_count", "streak")
+
+
+def day_bit(day_index: int) -> int:
+    if day_index < 1 or day_index > DAYS:
+        raise ValueError("dayIndex must be between 1 and 28")
+    return 1 << (day_index - 1)
+
+
+def days_in(mask: int) -> List[int]:
+    return [day for day in range(1, DAYS + 1) if mask & (1 << (day - 1))]
+
+
+def count_days(mask: int) -> int:
+    return bin(mask & ALL_DAYS).count("1")
+
+
+def first_day(mask: int) -> Optional[int]:
+    return (mask & -mask).bit_length() or None
+
+
+def has_days_through(mask: int, last_day: int) -> bool:
+    needed = (1 << last_day) - 1
+    return mask & needed == needed
+
+
+def mintable_day(summary: ProgressSummary) -> Optional[int]:
+    """Lowest day submitted on-chain whose Day NFT is not minted yet."""
+    return first_day(summary.submitted_mask & ~summary.minted_mask & ALL_DAYS)
+
+
+def streak_from_logs(logs: Iterable[DailyLog]) -> int:
+    # same rule as the check-in flow: +1 for the next calendar day, otherwise restart at 1
+    streak, last = 0, None
+    for log in sorted(logs, key=lambda l: l.date_key):
+        streak = streak + 1 if last and diff_days(last, log.date_key) == 1 else 1
+        last = log.date_key
+    return streak
+
+
+def summary_from_logs(address: str, challenge_id: int, logs: Iterable[DailyLog]) -> ProgressSummary:
+    logs = list(logs)
+    summary = ProgressSummary(address=address, challenge_id=challenge_id, streak=streak_from_logs(logs))
+    for log in logs:
+        if not 1 <= log.day_index <= DAYS:
+            continue
+        bit = day_bit(log.day_index)
+        summary.completed_mask |= bit
+        if log.tx_hash:
+            summary.submitted_mask |= bit
+        if log.day_nft_tx_hash:
+            summary.minted_mask |= bit
+    summary.mint_count = count_days(summary.minted_mask)
+    return summary
+
+
+# The mark_* functions apply a change to ``summary`` in memory (without dirtying it, so a flush
+# never writes the row back) and return the UPDATE that applies it atomically to the stored
+# row; the caller executes it in its own transaction.
+
+def _mark(summary: ProgressSummary, memory: dict, sql: dict):
+    now = datetime.utcnow()
+    for name, value in {**memory, "updated_at": now}.items():
+        set_committed_value(summary, name, value)
+    return (
+        update(ProgressSummary)
+        .where(ProgressSummary.address == summary.address, ProgressSummary.challenge_id == summary.challenge_id)
+        .values(**sql, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def mark_completed(summary: ProgressSummary, day_index: int, streak: int):
+    bit = day_bit(day_index)
+    return _mark(
+        summary,
+        {"completed_mask": summary.completed_mask | bit, "streak": streak},
+        {"completed_mask": ProgressSummary.completed_mask.op("|")(bit), "streak": streak},
+    )
+
+
+def mark_submitted(summary: ProgressSummary, day_index: int):
+    bit = day_bit(day_index)
+    return _mark(
+        summary,
+        {"submitted_mask": summary.submitted_mask | bit},
+        {"submitted_mask": ProgressSummary.submitted_mask.op("|")(bit)},
+    )
+
+
+def mark_minted(summary: ProgressSummary, day_index: int):
+    bit = day_bit(day_index)
+    newly = 0 if summary.minted_mask & bit else 1
+    return _mark(
+        summary,
+        {"minted_mask": summary.minted_mask | bit, "mint_count": summary.mint_count + newly},
+        {
+            # SET expressions all see the row as it was before this UPDATE
+            "mint_count": ProgressSummary.mint_count + case((ProgressSummary.minted_mask.op("&")(bit) == 0, 1), else_=0),
+            "minted_mask": ProgressSummary.minted_mask.op("|")(bit),
+        },
+    )
+
+
+def _summary_query(address: str, challenge_id: int):
+    return select(ProgressSummary).where(ProgressSummary.address == address, ProgressSummary.challenge_id == challenge_id)
+
+
+def _logs_query(address: str, challenge_id: int):
+    return select(DailyLog).where(DailyLog.address == address, DailyLog.challenge_id == challenge_id)
+
+
+def _row_values(summary: ProgressSummary) -> dict:
+    return {name: getattr(summary, name) for name in ("address", "challenge_id", *SUMMARY_FIELDS, "updated_at")}
+
+
+def is_stored(summary: ProgressSummary) -> bool:
+    return not inspect(summary).transient
+
+
+def _adopt(db, summary: ProgressSummary) -> ProgressSummary:
+    # the row we just inserted holds exactly these values: attach the object instead of re-reading it
+    make_transient_to_detached(summary)
+    db.add(summary)
+    return summary
+
+
+async def store_summary(db, summary: ProgressSummary) -> ProgressSummary:
+    """Insert a rebuilt (transient) summary unless a concurrent request stored the row first, and
+    return the stored row."""
+    stmt = insert_ignore(db.get_bind(), ProgressSummary, _row_values(summary))
+    if stmt is not None:
+        if (await db.exec(stmt)).rowcount == 1:
+            return _adopt(db, summary)
+    else:
+        try:
+            async with db.begin_nested():
+                db.add(summary)
+            return summary
+        except IntegrityError:
+            pass
+    return (await db.exec(_summary_query(summary.address, summary.challenge_id))).first()
+
+
+def store_summary_sync(db: Session, summary: ProgressSummary) -> ProgressSummary:
+    stmt = insert_ignore(db.get_bind(), ProgressSummary, _row_values(summary))
+    if stmt is not None:
+        if db.exec(stmt).rowcount == 1:
+            return _adopt(db, summary)
+    else:
+        try:
+            with db.begin_nested():
+                db.add(summary)
+            return summary
+        except IntegrityError:
+            pass
+    return db.exec(_summary_query(summary.address, summary.challenge_id)).first()
+
+
+async def load_summary(db, address: str, challenge_id: int, persist: bool = True) -> ProgressSummary:
+    """The summary row for an AsyncDb session, rebuilt from DailyLog if missing.
+
+    A rebuilt row is stored only when ``persist`` is set, so read paths never write.
+    """
+    summary = (await db.exec(_summary_query(address, challenge_id))).first()
+    if summary is None:
+        summary = summary_from_logs(address, challenge_id, (await db.exec(_logs_query(address, challenge_id))).all())
+        if persist:
+            summary = await store_summary(db, summary)
+    return summary
+
+
+def load_summary_sync(db: Session, address: str, challenge_id: int) -> ProgressSummary:
+    summary = db.exec(_summary_query(address, challenge_id)).first()
+    if summary is None:
+        summary = summary_from_logs(address, challenge_id, db.exec(_logs_query(address, challenge_id)).all())
+        summary = store_summary_sync(db, summary)
+    return summary
+
+
+@dataclass
+class Drift:
+    address: str
+    challenge_id: int
+    field: str
+    stored: object
+    expected: object
+
+
+def check_progress_summaries(db: Session, fix: bool = False) -> List[Drift]:
+    """Rebuild every summary from DailyLog and report fields that differ (missing rows included).
+
+    With fix=True the stored rows are overwritten with the rebuilt values and committed.
+    """
+    logs_by_key = {}
+    for log in db.exec(select(DailyLog)).all():
+        logs_by_key.setdefault((log.address, log.challenge_id), []).append(log)
+    stored = {(s.address, s.challenge_id): s for s in db.exec(select(ProgressSummary)).all()}
+
+    drift: List[Drift] = []
+    for key in sorted(set(logs_by_key) | set(stored)):
+        expected = summary_from_logs(key[0], key[1], logs_by_key.get(key, []))
+        current = stored.get(key)
+        if current is None:
+            drift.append(Drift(key[0], key[1], "row", None, "missing"))
+            if fix:
+                db.add(expected)
+            continue
+        for field in SUMMARY_FIELDS:
+            if getattr(current, field) != getattr(expected, field):
+                drift.append(Drift(key[0], key[1], field, getattr(current, field), getattr(expected, field)))
+                if fix:
+                    setattr(current, field, getattr(expected, field))
+        if fix:
+            db.add(current)
+    if fix:
+        db.commit()
+    return drift
@@ -1,6 +1,15 @@
 ﻿import json
-from typing import Dict
-from spoon_ai.chat import ChatBot
+import logging
+import time
+from typing import AsyncIterator, Dict, Optional, Tuple
+from ..config import settings
+from .llm import failure_outcome, get_llm_pool, record_llm_call, stream_ask
+from .reflection_cache import ReflectionCache, get_reflection_cache, reflection_cache_key
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever SYSTEM_PROMPT or the user prompt template changes so cached reflections are not reused.
+PROMPT_VERSION = "v1"
 
 SYSTEM_PROMPT = """
 你是一个反思助手。只输出 JSON，不要 Markdown，不要解释。
@@ -45,18 +54,79 @@ def _extract_json(text: str) -> Dict[str, str]:
         return FALLBACK
 
 
+async def _cached(task: dict, normalized_text: str) -> Tuple[Optional[ReflectionCache], str, Optional[Dict[str, str]]]:
+    cache = get_reflection_cache()
+    key = reflection_cache_key(task, normalized_text, settings.llm_provider, settings.llm_model, PROMPT_VERSION)
+    cached = await cache.get(key) if cache is not None else None
+    return cache, key, cached
+
+
+async def _remember(cache: Optional[ReflectionCache], key: str, reflection: Dict[str, str]) -> None:
+    # FALLBACK stands in for a failed call; caching it would pin the failure for the TTL
+    if cache is None or reflection == FALLBACK:
+        return
+    try:
+        await cache.set(key, reflection)
+    except Exception:
+        # the reflection is already generated; a failed cache write must not fail the check-in
+        logger.exception("reflection cache write failed")
+
+
 async def generate_reflection(task: dict, normalized_text: str) -> Dict[str, str]:
-    bot = ChatBot()
-    user_prompt = (
+    cache, key, cached = await _cached(task, normalized_text)
+    if cached is not None:
+        return cached
+    reflection = await _ask_reflection(task, normalized_text)
+    await _remember(cache, key, reflection)
+    return reflection
+
+
+def _user_prompt(task: dict, normalized_text: str) -> str:
+    return (
         f"任务标题: {task.get('title', '')}\n"
         f"任务内容: {task.get('instruction', '')}\n"
         f"提示: {task.get('hint', '')}\n"
         f"用户输入: {normalized_text}\n"
         "请基于任务与输入生成简短反馈，只输出 JSON。"
     )
+
+
+async def _ask_reflection(task: dict, normalized_text: str) -> Dict[str, str]:
+    user_prompt = _user_prompt(task, normalized_text)
+    started = time.perf_counter()
     try:
-        raw = await bot.ask([{"role": "user", "content": user_prompt}], system_msg=SYSTEM_PROMPT)
-        obj = _extract_json(raw)
-        return _safe_reflection(obj)
-    except Exception:
+        async with get_llm_pool().client(prompt=SYSTEM_PROMPT + user_prompt) as bot:
+            raw = await bot.ask([{"role": "user", "content": user_prompt}], system_msg=SYSTEM_PROMPT)
+        reflection = _safe_reflection(_extract_json(raw))
+    except Exception as exc:
+        record_llm_call("reflection", started, failure_outcome(exc))
         return FALLBACK
+    record_llm_call("reflection", started, "fallback" if reflection == FALLBACK else "ok")
+    return reflection
+
+
+async def stream_reflection(task: dict, normalized_text: str) -> AsyncIterator[Tuple[str, object]]:
+    """Yield ("delta", text) chunks as the LLM writes, then ("done", reflection).
+
+    Deltas are raw model output for display only; the "done" value has been through
+    _extract_json/_safe_reflection and is the only thing cached.
+    """
+    cache, key, cached = await _cached(task, normalized_text)
+    if cached is not None:
+        yield "done", cached
+        return
+    user_prompt = _user_prompt(task, normalized_text)
+    parts = []
+    started = time.perf_counter()
+    try:
+        async with get_llm_pool().client(prompt=SYSTEM_PROMPT + user_prompt) as bot:
+            async for chunk in stream_ask(bot, [{"role": "user", "content": user_prompt}], SYSTEM_PROMPT):
+                parts.append(chunk)
+                yield "delta", chunk
+        reflection = _safe_reflection(_extract_json("".join(parts)))
+        outcome = "fallback" if reflection == FALLBACK else "ok"
+    except Exception as exc:
+        reflection, outcome = FALLBACK, failure_outcome(exc)
+    record_llm_call("reflection_stream", started, outcome)
+    await _remember(cache, key, reflection)
+    yield "done", reflection
@@ -0,0 +1,187 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Protocol
+
+from sqlalchemy import delete, func, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+from starlette.concurrency import run_in_threadpool
+
+from .. import database
+from ..config import settings
+from ..metrics import counter
+from ..models import ReflectionCacheEntry
+from .crypto import normalize_text, sha256_hex
+
+cache_requests = counter(
+    "reflection_cache_requests_total",
+    "Reflection cache lookups by result (hit/miss) and tier (memory/sql).",
+    ("result", "tier"),
+)
+
+
+def task_digest(task: dict) -> str:
+    """Changes whenever the task wording the prompt is built from changes."""
+    return sha256_hex(json.dumps(
+        [task.get("title") or "", task.get("instruction") or "", task.get("hint") or ""], ensure_ascii=False
+    ))
+
+
+def reflection_cache_key(task: dict, text: str, provider: str, model: str, prompt_version: str) -> str:
+    # the day alone is not enough: editing tasks.json must not serve reflections written for the old wording
+    text_digest = sha256_hex(normalize_text(text))
+    return sha256_hex(f"{task.get('dayIndex')}|{task_digest(task)}|{text_digest}|{provider}|{model}|{prompt_version}")
+
+
+class CacheBackend(Protocol):
+    def get(self, key: str) -> Optional[Dict[str, str]]: ...
+
+    def set(self, key: str, value: Dict[str, str]) -> None: ...
+
+
+class MemoryCacheBackend:
+    """Size-bounded LRU with a per-entry TTL."""
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, str]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Dict[str, str]) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, dict(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SqlCacheBackend:
+    """Persists entries in the reflectioncacheentry table so they survive restarts.
+
+    Eviction is oldest-first and only runs once the table grows past max_entries; it then
+    trims to a low-water mark so the next few hundred inserts are plain upserts. The row
+    count is tracked in-process and re-read at every eviction, so inserts from other
+    processes only delay eviction slightly.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.low_water = max(1, max_entries - max(1, max_entries // 10))
+        self._rows: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, str]]:
+        with Session(database.engine) as session:
+            entry = session.get(ReflectionCacheEntry, key)
+            if entry is None or entry.expires_at <= datetime.utcnow():
+                return None
+            return dict(entry.value)
+
+    def set(self, key: str, value: Dict[str, str]) -> None:
+        now = datetime.utcnow()
+        values = {"value": dict(value), "created_at": now, "expires_at": now + timedelta(seconds=self.ttl_seconds)}
+        with Session(database.engine) as session:
+            # identical check-ins race to store the same key; the later write simply updates it
+            inserted = self._insert(session, {"key": key, **values})
+            if not inserted:
+                session.exec(update(ReflectionCacheEntry).where(ReflectionCacheEntry.key == key).values(**values))
+            with self._lock:
+                if self._rows is None:
+                    self._rows = self._count(session)
+                elif inserted:
+                    self._rows += 1
+                if self._rows > self.max_entries:
+                    self._rows = self._evict(session, now)
+            session.commit()
+
+    def _insert(self, session: Session, values: dict) -> bool:
+        stmt = database.insert_ignore(session.get_bind(), ReflectionCacheEntry, values)
+        if stmt is not None:
+            return session.exec(stmt).rowcount == 1
+        try:
+            with session.begin_nested():
+                session.add(ReflectionCacheEntry(**values))
+            return True
+        except IntegrityError:
+            return False
+
+    def _count(self, session: Session) -> int:
+        return session.exec(select(func.count()).select_from(ReflectionCacheEntry)).one()
+
+    def _evict(self, session: Session, now: datetime) -> int:
+        session.exec(delete(ReflectionCacheEntry).where(ReflectionCacheEntry.expires_at <= now))
+        overflow = session.exec(
+            select(ReflectionCacheEntry.key)
+            .order_by(ReflectionCacheEntry.created_at.desc())
+            .offset(self.low_water)
+        ).all()
+        if overflow:
+            session.exec(delete(ReflectionCacheEntry).where(ReflectionCacheEntry.key.in_(overflow)))
+        return self._count(session)
+
+
+class ReflectionCache:
+    def __init__(self, memory: MemoryCacheBackend, persistent: Optional[CacheBackend] = None):
+        self.memory = memory
+        self.persistent = persistent
+
+    async def get(self, key: str) -> Optional[Dict[str, str]]:
+        value = self.memory.get(key)
+        if value is not None:
+            cache_requests.inc(result="hit", tier="memory")
+            return dict(value)
+        if self.persistent is not None:
+            value = await run_in_threadpool(self.persistent.get, key)
+            if value is not None:
+                cache_requests.inc(result="hit", tier="sql")
+                self.memory.set(key, value)
+                return dict(value)
+        cache_requests.inc(result="miss", tier="sql" if self.persistent is not None else "memory")
+        return None
+
+    async def set(self, key: str, value: Dict[str, str]) -> None:
+        self.memory.set(key, value)
+        if self.persistent is not None:
+            await run_in_threadpool(self.persistent.set, key, value)
+
+
+_cache: Optional[ReflectionCache] = None
+
+
+def get_reflection_cache() -> Optional[ReflectionCache]:
+    global _cache
+    backend = settings.reflection_cache_backend
+    if backend == "off":
+        return None
+    if _cache is None:
+        memory = MemoryCacheBackend(settings.reflection_cache_max_entries, settings.reflection_cache_ttl_seconds)
+        persistent = None
+        if backend == "sql":
+            persistent = SqlCacheBackend(settings.reflection_cache_max_entries, settings.reflection_cache_ttl_seconds)
+        _cache = ReflectionCache(memory, persistent)
+    return _cache
+
+
+def reset_reflection_cache() -> None:
+    global _cache
+    _cache = None
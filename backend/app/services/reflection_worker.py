@@ -0,0 +1,139 @@
+import asyncio
+import logging
+from typing import List, Optional, Set
+
+from sqlalchemy import update
+from sqlmodel import select
+
+from ..config import settings
+from ..database import session_scope
+from ..models import DailyLog
+from .llm import BACKGROUND, llm_priority
+from .reflection import generate_reflection
+from .tasks import get_task_by_day_index
+
+logger = logging.getLogger(__name__)
+
+PENDING = "PENDING"
+READY = "READY"
+
+
+class ReflectionWorker:
+    """Fills in reflections for DailyLog rows stored with reflection_status=PENDING.
+
+    At most ``concurrency`` LLM calls run at once and at most ``max_queue`` log ids wait.
+    Ids that do not fit stay PENDING in the database and are picked up by the periodic
+    sweep, which also re-queues whatever a previous process left behind.
+    """
+
+    def __init__(self, concurrency: int, max_queue: int, sweep_seconds: float):
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.sweep_seconds = sweep_seconds
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._queued: Set[str] = set()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._sweep_loop()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        self._queued.clear()
+
+    def enqueue(self, log_id: str) -> bool:
+        self.start()
+        if log_id in self._queued:
+            return True
+        try:
+            self._queue.put_nowait(log_id)
+        except asyncio.QueueFull:
+            logger.warning("reflection queue full; %s stays PENDING until the next sweep", log_id)
+            return False
+        self._queued.add(log_id)
+        return True
+
+    async def requeue_pending(self) -> int:
+        async with session_scope() as db:
+            ids = (await db.exec(
+                select(DailyLog.id).where(DailyLog.reflection_status == PENDING).order_by(DailyLog.created_at)
+            )).all()
+        return sum(1 for log_id in ids if self.enqueue(log_id))
+
+    async def process(self, log_id: str) -> bool:
+        """Generate and store one reflection; False if the row was not PENDING (any more).
+
+        No session is held across the LLM call. The write-back only matches a row that is
+        still PENDING, so when two processes pick up the same log only the first one writes.
+        """
+        async with session_scope() as db:
+            log = (await db.exec(select(DailyLog).where(DailyLog.id == log_id))).first()
+            if not log or log.reflection_status != PENDING:
+                return False
+            day_index, text = log.day_index, log.normalized_text or ""
+
+        # the user already has their check-in; live reflections go first
+        with llm_priority(BACKGROUND):
+            reflection = await generate_reflection(get_task_by_day_index(day_index), text)
+
+        async with session_scope() as db:
+            result = await db.execute(
+                update(DailyLog)
+                .where(DailyLog.id == log_id, DailyLog.reflection_status == PENDING)
+                .values(reflection=reflection, reflection_status=READY)
+            )
+            await db.commit()
+        return result.rowcount == 1
+
+    async def _run(self) -> None:
+        while True:
+            log_id = await self._queue.get()
+            try:
+                await self.process(log_id)
+            except Exception:
+                # left PENDING; the next sweep retries it
+                logger.exception("reflection for %s failed", log_id)
+            finally:
+                self._queued.discard(log_id)
+                self._queue.task_done()
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            try:
+                await self.requeue_pending()
+            except Exception:
+                logger.exception("reflection sweep failed")
+            await asyncio.sleep(self.sweep_seconds)
+
+    async def join(self) -> None:
+        if self._queue is not None:
+            await self._queue.join()
+
+
+_worker: Optional[ReflectionWorker] = None
+
+
+def get_reflection_worker() -> ReflectionWorker:
+    global _worker
+    if _worker is None:
+        _worker = ReflectionWorker(settings.reflection_workers, settings.reflection_queue_size, settings.reflection_sweep_seconds)
+    return _worker
+
+
+async def stop_reflection_worker() -> None:
+    global _worker
+    if _worker is not None:
+        await _worker.stop()
+        _worker = None
@@ -1,8 +1,12 @@
-﻿from typing import List, Dict, Any
-from spoon_ai.chat import ChatBot
+﻿import time
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
 
+from .llm import REPORT, estimate_tokens, failure_outcome, get_llm_pool, record_llm_call, stream_ask
 from .tasks import get_task_by_day_index
 
+# Bump whenever SYSTEM_PROMPT or the prompt templates change so stored weekly summaries are regenerated.
+PROMPT_VERSION = "v1"
+
 SYSTEM_PROMPT = """
 你是一个简洁的周报/结营总结助手。
 只输出纯文本，不要 Markdown，不要标题，不要列表，不要引号。
@@ -50,24 +54,96 @@ def _format_logs(logs: List[Any]) -> str:
     return "\n---\n".join(lines)
 
 
-async def generate_report_text(logs: List[Any], range_value: str) -> str:
-    if not logs:
-        return ""
-    bot = ChatBot()
+def _brief_log(log: Any) -> str:
+    # the final report only needs the gist of a day: no task wording, no reflection note
+    normalized = (log.normalized_text or "").replace("\n", " ")[:60]
+    return f"Day {log.day_index}: {normalized} / 下一步: {_parse_reflection(log.reflection).get('next', '')}"
+
+
+def final_prompt(weekly: Dict[int, str], recent_logs: List[Any], budget: int) -> str:
+    """Final report prompt from stored weekly summaries plus brief lines for days not covered by
+    one, kept within ``budget`` estimated tokens: summaries are shortened evenly if they alone
+    would not fit, then the most recent days are added while they fit."""
+    head = (
+        "请生成结营报告总结。\n"
+        "注意：不得引用/复述用户原话，只输出抽象总结。\n"
+    )
+    left = budget - estimate_tokens(head)
+    lines = []
+    if weekly:
+        header = "以下是各周总结：\n"
+        left -= estimate_tokens(header)
+        sections = [f"第{week}周: {text}" for week, text in sorted(weekly.items())]
+        if sum(estimate_tokens(line) + 1 for line in sections) > left:
+            share = max(0, left // len(sections) - 1)
+            sections = [line[:share] for line in sections]
+        lines.append(header + "\n".join(sections))
+        left -= sum(estimate_tokens(line) + 1 for line in sections)
+    if recent_logs:
+        header = "以下是尚未汇总的记录：\n"
+        left -= estimate_tokens(header)
+        picked: List[str] = []
+        for log in sorted(recent_logs, key=lambda l: l.day_index, reverse=True):
+            line = _brief_log(log)
+            cost = estimate_tokens(line) + 1
+            if cost > left:
+                break
+            picked.append(line)
+            left -= cost
+        if picked:
+            lines.append(header + "\n".join(reversed(picked)))
+    return head + "\n".join(lines)
+
+
+def _fallback(range_value: str) -> str:
+    return FALLBACK_WEEK if range_value == "week" else FALLBACK_FINAL
+
+
+def _user_prompt(logs: List[Any], range_value: str) -> str:
     summary_scope = "周报" if range_value == "week" else "结营报告"
-    user_prompt = (
+    return (
         f"请生成{summary_scope}总结。\n"
         "注意：不得引用/复述用户原话，只输出抽象总结。\n"
         "以下是记录：\n"
         f"{_format_logs(logs)}"
     )
+
+
+async def generate_report_text(logs: List[Any], range_value: str, user_prompt: Optional[str] = None) -> str:
+    """Report text for ``logs``; callers that built a prompt themselves (final_prompt) pass it in."""
+    if not logs:
+        return ""
+    user_prompt = user_prompt or _user_prompt(logs, range_value)
+    started = time.perf_counter()
     try:
-        raw = await bot.ask([
-            {"role": "user", "content": user_prompt}
-        ], system_msg=SYSTEM_PROMPT)
+        async with get_llm_pool().client(priority=REPORT, prompt=SYSTEM_PROMPT + user_prompt) as bot:
+            raw = await bot.ask([
+                {"role": "user", "content": user_prompt}
+            ], system_msg=SYSTEM_PROMPT)
         text = _truncate(raw, 120)
-        if not text:
-            return FALLBACK_WEEK if range_value == "week" else FALLBACK_FINAL
-        return text
-    except Exception:
-        return FALLBACK_WEEK if range_value == "week" else FALLBACK_FINAL
+    except Exception as exc:
+        record_llm_call("report", started, failure_outcome(exc))
+        return _fallback(range_value)
+    record_llm_call("report", started, "ok" if text else "fallback")
+    return text or _fallback(range_value)
+
+
+async def stream_report_text(logs: List[Any], range_value: str, user_prompt: Optional[str] = None) -> AsyncIterator[Tuple[str, str]]:
+    """Yield ("delta", text) chunks, then ("done", text) with the same _truncate/fallback rules as generate_report_text."""
+    if not logs:
+        yield "done", ""
+        return
+    user_prompt = user_prompt or _user_prompt(logs, range_value)
+    parts = []
+    started = time.perf_counter()
+    try:
+        async with get_llm_pool().client(priority=REPORT, prompt=SYSTEM_PROMPT + user_prompt) as bot:
+            async for chunk in stream_ask(bot, [{"role": "user", "content": user_prompt}], SYSTEM_PROMPT):
+                parts.append(chunk)
+                yield "delta", chunk
+        text = _truncate("".join(parts), 120)
+        outcome = "ok" if text else "fallback"
+    except Exception as exc:
+        text, outcome = "", failure_outcome(exc)
+    record_llm_call("report_stream", started, outcome)
+    yield "done", text or _fallback(range_value)
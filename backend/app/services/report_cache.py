@@ -0,0 +1,143 @@
+"""Generated report texts per (address, challenge, range), reused while the logs behind them are unchanged.
+
+Each entry keeps the fingerprint (weekly_summary.fingerprint) of the logs its text was generated
+from, and a lookup with any other fingerprint is stale. progress_update_node also invalidates a
+user's entries as soon as it writes a new log, which marks them stale in this process before the
+fingerprint even changes hands. REPORT_CACHE picks what a stale entry means:
+
+- ``fresh`` (default): regenerate on the request path and store the result;
+- ``swr``: serve the stale text and regenerate in a background task (one per key at a time);
+- ``off``: no caching.
+
+Entries live in reportcacheentry and are written in their own session, like the weekly summaries.
+"""
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
+from starlette.concurrency import run_in_threadpool
+
+from .. import database
+from ..config import settings
+from ..metrics import counter
+from ..models import ReportCacheEntry
+from .llm import BACKGROUND, llm_priority
+from .report import FALLBACK_FINAL, FALLBACK_WEEK
+
+logger = logging.getLogger(__name__)
+
+Key = Tuple[str, int, str]
+
+report_cache_requests = counter(
+    "report_cache_requests_total",
+    "Report cache lookups by result (hit / stale: served while regenerating / miss)",
+    ("range", "result"),
+)
+
+
+class ReportCache:
+    def __init__(self, max_invalidated: int = 4096):
+        # users with a log newer than their cached reports; bounded, since forgetting one only
+        # leaves the fingerprint check to notice
+        self.max_invalidated = max_invalidated
+        self._invalidated: "OrderedDict[Tuple[str, int], None]" = OrderedDict()
+        self._refreshing: Dict[Key, asyncio.Task] = {}
+
+    def _get(self, key: Key) -> Optional[ReportCacheEntry]:
+        with Session(database.engine) as session:
+            return session.get(ReportCacheEntry, key)
+
+    def _put(self, key: Key, fingerprint: str, text: str) -> None:
+        values = {"fingerprint": fingerprint, "text": text, "created_at": datetime.utcnow()}
+        with Session(database.engine) as session:
+            entry = session.get(ReportCacheEntry, key) or ReportCacheEntry(
+                address=key[0], challenge_id=key[1], range=key[2], **values,
+            )
+            for name, value in values.items():
+                setattr(entry, name, value)
+            session.add(entry)
+            try:
+                session.commit()
+            except IntegrityError:
+                # a concurrent miss stored the same key first; write ours over it
+                session.rollback()
+                session.exec(update(ReportCacheEntry).where(
+                    ReportCacheEntry.address == key[0],
+                    ReportCacheEntry.challenge_id == key[1],
+                    ReportCacheEntry.range == key[2],
+                ).values(**values))
+                session.commit()
+
+    def invalidate(self, address: str, challenge_id: int) -> None:
+        self._invalidated[(address, challenge_id)] = None
+        self._invalidated.move_to_end((address, challenge_id))
+        while len(self._invalidated) > self.max_invalidated:
+            self._invalidated.popitem(last=False)
+
+    async def store(self, key: Key, fingerprint: str, text: str) -> None:
+        # a fallback stands in for a failed call; storing it would pin the failure
+        if not text or text in (FALLBACK_WEEK, FALLBACK_FINAL):
+            return
+        await run_in_threadpool(self._put, key, fingerprint, text)
+        self._invalidated.pop(key[:2], None)
+
+    async def text(self, key: Key, fingerprint: str, produce: Callable[[bool], Awaitable[str]]) -> Tuple[str, bool]:
+        """The report text for ``key`` and whether it came from the cache. ``produce(streaming)``
+        generates it; it is called with streaming=False when it runs in the background."""
+        entry = await run_in_threadpool(self._get, key)
+        if entry is not None:
+            fresh = entry.fingerprint == fingerprint and key[:2] not in self._invalidated
+            if fresh:
+                report_cache_requests.inc(range=key[2], result="hit")
+                return entry.text, True
+            if settings.report_cache == "swr":
+                report_cache_requests.inc(range=key[2], result="stale")
+                self._refresh(key, fingerprint, produce)
+                return entry.text, True
+        report_cache_requests.inc(range=key[2], result="miss")
+        text = await produce(True)
+        await self.store(key, fingerprint, text)
+        return text, False
+
+    def _refresh(self, key: Key, fingerprint: str, produce: Callable[[bool], Awaitable[str]]) -> None:
+        if key in self._refreshing:
+            return
+
+        async def run() -> None:
+            try:
+                with llm_priority(BACKGROUND):
+                    text = await produce(False)
+                await self.store(key, fingerprint, text)
+            except Exception:
+                logger.exception("background report refresh failed for %s", key)
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.create_task(run())
+
+    async def drain(self) -> None:
+        """Wait for background refreshes (tests, shutdown)."""
+        while self._refreshing:
+            await asyncio.gather(*list(self._refreshing.values()), return_exceptions=True)
+
+
+_cache: Optional[ReportCache] = None
+
+
+def get_report_cache() -> Optional[ReportCache]:
+    global _cache
+    if settings.report_cache == "off":
+        return None
+    if _cache is None:
+        _cache = ReportCache()
+    return _cache
+
+
+def reset_report_cache() -> None:
+    global _cache
+    _cache = None
@@ -1,17 +1,131 @@
-﻿import json
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from dataclasses import dataclass
 from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Mapping, Optional, Tuple
 
 DATA_PATH = Path(__file__).resolve().parent.parent / "data" / "tasks.json"
+TASK_COUNT = 28
+REQUIRED_FIELDS = ("title", "instruction")
+# The file is stat'ed at most this often; edits show up within this window.
+CHECK_INTERVAL_SECONDS = 2.0
 
+logger = logging.getLogger(__name__)
 
-def load_tasks() -> list:
-    # Use utf-8-sig to tolerate BOM from Windows editors
-    with open(DATA_PATH, "r", encoding="utf-8-sig") as f:
-        return json.load(f)
 
+@dataclass(frozen=True)
+class Task:
+    day_index: int
+    title: str
+    instruction: str
+    hint: Optional[str] = None
 
-def get_task_by_day_index(day_index: int) -> dict:
-    tasks = load_tasks()
-    if day_index < 1 or day_index > len(tasks):
-        raise ValueError("dayIndex must be between 1 and 28")
-    return tasks[day_index - 1]
+
+@dataclass(frozen=True)
+class TaskCatalog:
+    tasks: Tuple[Task, ...]
+    # read-only dict views handed to callers, built once per load
+    views: Tuple[Mapping[str, Any], ...]
+    digest: str
+    mtime_ns: int
+    size: int
+
+    def get(self, day_index: int) -> Mapping[str, Any]:
+        if day_index < 1 or day_index > len(self.views):
+            raise ValueError("dayIndex must be between 1 and 28")
+        return self.views[day_index - 1]
+
+
+_catalog: Optional[TaskCatalog] = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def _build_catalog(raw: bytes, digest: str, stat: os.stat_result) -> TaskCatalog:
+    entries = json.loads(raw.decode("utf-8-sig"))
+    if not isinstance(entries, list) or len(entries) != TASK_COUNT:
+        raise ValueError(f"tasks.json must contain exactly {TASK_COUNT} tasks")
+    tasks = []
+    for day_index, entry in enumerate(entries, start=1):
+        if not isinstance(entry, dict):
+            raise ValueError(f"task {day_index} must be an object")
+        for field in REQUIRED_FIELDS:
+            if not isinstance(entry.get(field), str) or not entry[field].strip():
+                raise ValueError(f"task {day_index} is missing {field}")
+        hint = entry.get("hint")
+        if hint is not None and not isinstance(hint, str):
+            raise ValueError(f"task {day_index} hint must be a string or null")
+        tasks.append(Task(day_index=day_index, title=entry["title"], instruction=entry["instruction"], hint=hint))
+    views = tuple(
+        MappingProxyType({"dayIndex": t.day_index, "title": t.title, "instruction": t.instruction, "hint": t.hint})
+        for t in tasks
+    )
+    return TaskCatalog(tasks=tuple(tasks), views=views, digest=digest, mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+
+
+def _load_if_changed(force: bool) -> TaskCatalog:
+    global _catalog, _checked_at
+    with _lock:
+        stat = os.stat(DATA_PATH)
+        current = _catalog
+        _checked_at = time.monotonic()
+        if not force and current and (current.mtime_ns, current.size) == (stat.st_mtime_ns, stat.st_size):
+            return current
+        raw = DATA_PATH.read_bytes()
+        digest = hashlib.sha256(raw).hexdigest()
+        if not force and current and current.digest == digest:
+            # touched but not edited: keep the parsed catalog, remember the new stat
+            _catalog = TaskCatalog(current.tasks, current.views, digest, stat.st_mtime_ns, stat.st_size)
+            return _catalog
+        try:
+            _catalog = _build_catalog(raw, digest, stat)
+        except ValueError:
+            if force or current is None:
+                raise
+            logger.exception("tasks.json changed but is invalid; keeping the previous catalog")
+            return current
+        return _catalog
+
+
+def get_catalog() -> TaskCatalog:
+    catalog = _catalog
+    if catalog is not None and time.monotonic() - _checked_at < CHECK_INTERVAL_SECONDS:
+        return catalog
+    return _load_if_changed(force=False)
+
+
+def reload_tasks() -> TaskCatalog:
+    """Re-read tasks.json now. Raises ValueError if the file does not validate."""
+    return _load_if_changed(force=True)
+
+
+def _reload_on_signal() -> None:
+    try:
+        catalog = reload_tasks()
+    except (OSError, ValueError):
+        logger.exception("SIGHUP: tasks.json reload failed; keeping the previous catalog")
+        return
+    logger.info("SIGHUP: reloaded tasks.json (%s)", catalog.digest[:12])
+
+
+def install_reload_signal(loop: asyncio.AbstractEventLoop) -> bool:
+    """Reload tasks.json when the process gets SIGHUP (``kill -HUP <pid>``), once per worker process."""
+    if not hasattr(signal, "SIGHUP"):
+        return False
+    try:
+        loop.add_signal_handler(signal.SIGHUP, _reload_on_signal)
+    except (NotImplementedError, RuntimeError):
+        # not the main thread (e.g. test clients) or no signal support in this loop
+        return False
+    return True
+
+
+def get_task_by_day_index(day_index: int) -> Mapping[str, Any]:
+    return get_catalog().get(day_index)
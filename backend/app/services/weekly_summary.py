@@ -0,0 +1,115 @@
+"""Per-week report summaries, the map step of the final report.
+
+Challenge week w covers days 7(w-1)+1 .. 7w. Once a week is complete (all seven days logged, or
+a later day checked in) its summary is generated with the weekly report prompt and stored in
+weeklysummary with a fingerprint of the logs it was written from; /report?range=week for that
+week and every later final report reuse it instead of calling the LLM again. Rows are written in
+their own session, like the SQL reflection cache, so report reads stay out of the request's
+transaction.
+"""
+import asyncio
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+from starlette.concurrency import run_in_threadpool
+
+from .. import database
+from ..metrics import counter
+from ..models import WeeklySummary
+from .crypto import sha256_hex
+from .progress_summary import DAYS
+from .report import FALLBACK_WEEK, PROMPT_VERSION, generate_report_text
+
+WEEK_DAYS = 7
+
+summary_requests = counter(
+    "weekly_summary_requests_total",
+    "Stored weekly summary lookups by result (hit / miss: generated now)",
+    ("result",),
+)
+
+
+def week_of(day_index: int) -> int:
+    return (day_index - 1) // WEEK_DAYS + 1
+
+
+def split_weeks(logs: Iterable[Any]) -> Dict[int, List[Any]]:
+    weeks: Dict[int, List[Any]] = {}
+    for log in logs:
+        if 1 <= log.day_index <= DAYS:
+            weeks.setdefault(week_of(log.day_index), []).append(log)
+    return weeks
+
+
+def is_complete(week: int, weeks: Dict[int, List[Any]]) -> bool:
+    return len(weeks.get(week, ())) >= WEEK_DAYS or any(later > week for later in weeks)
+
+
+def fingerprint(logs: Iterable[Any]) -> str:
+    # a deferred reflection filled in later (PENDING -> READY) changes what the summary would say
+    parts = [f"{log.id}:{log.reflection_status}" for log in sorted(logs, key=lambda l: l.day_index)]
+    return sha256_hex(PROMPT_VERSION + "|" + "|".join(parts))
+
+
+def _load(address: str, challenge_id: int, weeks: List[int]) -> Dict[int, WeeklySummary]:
+    with Session(database.engine) as session:
+        rows = session.exec(select(WeeklySummary).where(
+            WeeklySummary.address == address,
+            WeeklySummary.challenge_id == challenge_id,
+            WeeklySummary.week.in_(weeks),
+        )).all()
+        return {row.week: row for row in rows}
+
+
+def _save(rows: List[WeeklySummary]) -> None:
+    with Session(database.engine) as session:
+        for row in rows:
+            existing = session.get(WeeklySummary, (row.address, row.challenge_id, row.week))
+            if existing is None:
+                session.add(row)
+            else:
+                existing.fingerprint, existing.text, existing.created_at = row.fingerprint, row.text, row.created_at
+                session.add(existing)
+        try:
+            session.commit()
+        except IntegrityError:
+            # a concurrent request stored the same weeks first; its text is as good as ours
+            session.rollback()
+
+
+async def weekly_summaries(
+    address: str, challenge_id: int, weeks: Dict[int, List[Any]], only: Optional[Iterable[int]] = None,
+) -> Dict[int, str]:
+    """Summary text for each complete week in ``weeks`` (restricted to ``only`` if given): stored
+    rows whose fingerprint still matches, the rest generated concurrently and stored. Weeks whose
+    generation fell back to the canned text are left out, so callers use the logs instead."""
+    wanted = {
+        week: logs for week, logs in weeks.items()
+        if is_complete(week, weeks) and (only is None or week in only)
+    }
+    if not wanted:
+        return {}
+    stored = await run_in_threadpool(_load, address, challenge_id, list(wanted))
+
+    result: Dict[int, str] = {}
+    missing: Dict[int, str] = {}
+    for week, logs in wanted.items():
+        digest = fingerprint(logs)
+        row = stored.get(week)
+        if row is not None and row.fingerprint == digest:
+            summary_requests.inc(result="hit")
+            result[week] = row.text
+        else:
+            summary_requests.inc(result="miss")
+            missing[week] = digest
+    if missing:
+        texts = await asyncio.gather(*(generate_report_text(wanted[week], "week") for week in missing))
+        fresh = []
+        for (week, digest), text in zip(missing.items(), texts):
+            if text and text != FALLBACK_WEEK:
+                result[week] = text
+                fresh.append(WeeklySummary(address=address, challenge_id=challenge_id, week=week, fingerprint=digest, text=text))
+        if fresh:
+            await run_in_threadpool(_save, fresh)
+    return dict(sorted(result.items()))
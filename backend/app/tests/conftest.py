@@ -0,0 +1,167 @@
+import asyncio
+import json
+import threading
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from sqlmodel import SQLModel, create_engine
+
+from backend.app import database
+from backend.app.main import app
+from backend.app.services.reflection_worker import stop_reflection_worker
+
+
+class FakeStreamManager:
+    """Streams FakeChatBot.reply in small chunks, FakeChatBot.chunk_delay apart."""
+
+    async def chat_stream(self, messages, provider=None, **kwargs):
+        FakeChatBot.calls += 1
+        reply = FakeChatBot.reply
+        size = FakeChatBot.chunk_size
+        for i in range(0, len(reply), size):
+            if i and FakeChatBot.chunk_delay:
+                await asyncio.sleep(FakeChatBot.chunk_delay)
+            yield reply[i:i + size]
+
+
+class FakeChatBot:
+    """Stands in for spoon_ai ChatBot; class attributes are reset per test by the fake_llm fixture."""
+
+    llm_provider = "fake"
+    llm_manager = FakeStreamManager()
+    delay = 0.0
+    chunk_delay = 0.0
+    chunk_size = 8
+    reply = json.dumps({"note": "今天你认真照顾了自己。", "next": "现在去喝一杯温水。"}, ensure_ascii=False)
+    instances = 0
+    calls = 0
+
+    def __init__(self, *args, **kwargs):
+        FakeChatBot.instances += 1
+
+    async def ask(self, messages, system_msg=None, output_queue=None):
+        FakeChatBot.calls += 1
+        if FakeChatBot.delay:
+            await asyncio.sleep(FakeChatBot.delay)
+        return FakeChatBot.reply
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    from backend.app.services import llm
+
+    monkeypatch.setattr(FakeChatBot, "delay", 0.0)
+    monkeypatch.setattr(FakeChatBot, "chunk_delay", 0.0)
+    monkeypatch.setattr(FakeChatBot, "reply", FakeChatBot.reply)
+    monkeypatch.setattr(FakeChatBot, "instances", 0)
+    monkeypatch.setattr(FakeChatBot, "calls", 0)
+    monkeypatch.setattr(llm, "ChatBot", FakeChatBot)
+    monkeypatch.setattr(llm, "_pool", None)
+    return FakeChatBot
+
+
+@pytest.fixture
+def db_engine(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    monkeypatch.setattr(database, "engine", engine)
+    monkeypatch.setattr(database, "async_engine", None)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def api(db_engine, fake_llm):
+    """Run a coroutine against the app in-process: api(lambda client: client.get(...))."""
+
+    def run(fn):
+        async def main():
+            transport = httpx.ASGITransport(app=app)
+            try:
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                    return await fn(client)
+            finally:
+                await stop_reflection_worker()
+
+        return asyncio.run(main())
+
+    return run
+
+
+@pytest.fixture(autouse=True)
+def _fresh_reflection_cache():
+    from backend.app.services.reflection_cache import reset_reflection_cache
+
+    reset_reflection_cache()
+    yield
+    reset_reflection_cache()
+
+
+@pytest.fixture(autouse=True)
+def _fresh_report_cache():
+    from backend.app.services.report_cache import reset_report_cache
+
+    reset_report_cache()
+    yield
+    reset_report_cache()
+
+
+@pytest.fixture
+def image_store(tmp_path, monkeypatch):
+    from backend.app.services import image_store as store_module
+
+    store = store_module.ImageStore(tmp_path / "images", max_bytes=1024 * 1024)
+    monkeypatch.setattr(store_module, "_store", store)
+    return store
+
+
+@pytest.fixture
+def nft_jobs(monkeypatch, image_store):
+    """A one-worker, two-slot image queue whose jobs block until ``release`` is set."""
+    from backend.app.services import nft_image, nft_jobs as jobs
+
+    release = threading.Event()
+
+    def fake_generate(day_index, **kwargs):
+        release.wait(5)
+        stored = image_store.put(f"png for day {day_index}".encode(), "image/png")
+        return nft_image.ImageResult(image=stored, provider="fake", elapsed=0.0)
+
+    monkeypatch.setattr(nft_image, "generate_nft_image", fake_generate)
+    monkeypatch.setattr(jobs, "_queue", jobs.NftJobQueue(workers=1, max_pending=2, ttl_seconds=60))
+    yield SimpleNamespace(queue=jobs._queue, release=release)
+    release.set()
+    jobs.shutdown_nft_job_queue()
+
+
+@pytest.fixture
+def query_budget():
+    """with query_budget(statements=8, repeats=2): ... fails if any request that finished inside
+    the block issued more SQL statements, or repeated one statement more often, than allowed."""
+    from backend.app import query_stats
+
+    @contextmanager
+    def budget(statements, repeats=None):
+        seen = []
+
+        def listener(route, stats):
+            seen.append((route, stats))
+
+        query_stats.add_listener(listener)
+        try:
+            yield seen
+        finally:
+            query_stats.remove_listener(listener)
+        assert seen, "no request finished inside the query budget block"
+        for route, stats in seen:
+            assert stats.count <= statements, (
+                f"{route} issued {stats.count} SQL statements, budget {statements}; "
+                f"slowest ({stats.slowest_seconds * 1000:.1f} ms): {stats.slowest_statement}"
+            )
+            statement, count = stats.most_repeated()
+            if repeats is not None:
+                assert count <= repeats, f"{route} ran the same statement {count} times (budget {repeats}): {statement}"
+
+    return budget
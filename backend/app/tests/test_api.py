@@ -0,0 +1,900 @@
+import asyncio
+import gc
+import hashlib
+import json
+import math
+import time
+
+import httpx
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from backend.app import database
+from backend.app.services.reflection_worker import stop_reflection_worker
+
+ADDRESS = "0x" + "ab" * 20
+
+
+def _checkin_payload(day_index=1, text="今天还活着"):
+    return {"address": ADDRESS, "dayIndex": day_index, "text": text, "timezone": "Asia/Shanghai"}
+
+
+def test_checkin_and_progress(api):
+    async def flow(client):
+        first = await client.post("/checkin", json=_checkin_payload())
+        again = await client.post("/checkin", json=_checkin_payload())
+        progress = await client.get("/progress", params={"address": ADDRESS})
+        return first, again, progress
+
+    first, again, progress = api(flow)
+    assert first.status_code == 200, first.text
+    assert again.json()["alreadyCheckedIn"] is True
+    assert again.json()["log"]["id"] == first.json()["log"]["id"]
+    assert progress.json()["completedDays"] == [1]
+    assert progress.json()["streak"] == 1
+
+
+def test_app_starts_on_database_from_before_reflection_status(fake_llm, tmp_path, monkeypatch):
+    from datetime import datetime
+
+    from sqlalchemy import Column, MetaData, Table, create_engine, inspect, insert
+
+    from backend.app.main import app, on_startup
+    from backend.app.models import DailyLog, UserProgress
+
+    # the dailylog table as the baseline schema created it, with one existing log
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}", connect_args={"check_same_thread": False})
+    metadata = MetaData()
+    old_log = Table("dailylog", metadata, *(
+        Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable)
+        for c in DailyLog.__table__.columns if c.name != "reflection_status"
+    ))
+    UserProgress.__table__.to_metadata(metadata)
+    metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(UserProgress.__table__).values(
+            address=ADDRESS, timezone="Asia/Shanghai", challenge_id=1, start_date_key="2026-01-01", streak=1,
+            last_date_key="2026-01-01", last_day_index=1, day_mint_count=0, final_minted=False,
+            milestones={"1": None, "2": None, "3": None}, created_at=datetime.utcnow(), updated_at=datetime.utcnow(),
+        ))
+        conn.execute(insert(old_log).values(
+            id="old-log", address=ADDRESS, challenge_id=1, day_index=1, date_key="2026-01-01",
+            reflection={"note": "n", "next": "m"}, salt_hex="00", proof_hash="0x00", status="CREATED",
+            created_at=datetime.utcnow(),
+        ))
+    monkeypatch.setattr(database, "engine", engine)
+    monkeypatch.setattr(database, "async_engine", None)
+
+    async def main():
+        await on_startup()
+        transport = httpx.ASGITransport(app=app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await client.get("/progress", params={"address": ADDRESS}), await client.get("/report", params={"address": ADDRESS, "range": "final"})
+        finally:
+            await stop_reflection_worker()
+
+    progress, report = asyncio.run(main())
+    assert progress.status_code == 200, progress.text
+    assert progress.json()["completedDays"] == [1]
+    assert report.status_code == 200, report.text
+    assert "ix_dailylog_reflection_status" in {index["name"] for index in inspect(engine).get_indexes("dailylog")}
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT reflection_status FROM dailylog").scalar_one() == "READY"
+    engine.dispose()
+
+
+def test_checkin_with_async_driver(api, tmp_path, monkeypatch):
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setattr(database, "async_engine", async_engine)
+
+    async def flow(client):
+        try:
+            checkin = await client.post("/checkin", json=_checkin_payload())
+            progress = await client.get("/progress", params={"address": ADDRESS})
+            return checkin, progress
+        finally:
+            await async_engine.dispose()
+
+    checkin, progress = api(flow)
+    assert checkin.status_code == 200, checkin.text
+    assert progress.json()["completedDays"] == [1]
+
+
+def test_slow_db_does_not_stall_event_loop(api, db_engine):
+    @event.listens_for(db_engine, "before_cursor_execute")
+    def _slow(conn, cursor, statement, parameters, context, executemany):
+        time.sleep(0.3)
+
+    async def timed(request):
+        start = time.perf_counter()
+        response = await request
+        return response, time.perf_counter() - start
+
+    async def flow(client):
+        slow = asyncio.ensure_future(timed(client.get("/progress", params={"address": ADDRESS})))
+        await asyncio.sleep(0.05)
+        fast = await timed(client.post("/ai/reflection", json={
+            "task": {"dayIndex": 1, "title": "t", "instruction": "i"},
+            "userText": "hello",
+            "dayIndex": 1,
+        }))
+        return await slow, fast
+
+    (slow_resp, slow_elapsed), (fast_resp, fast_elapsed) = api(flow)
+    assert slow_resp.status_code == 200 and fast_resp.status_code == 200
+    assert slow_elapsed > 0.6
+    assert fast_elapsed < 0.2
+
+
+def test_async_reflection_mode_returns_before_llm(api, fake_llm, monkeypatch):
+    from backend.app.config import settings
+    from backend.app.services.reflection_worker import get_reflection_worker
+
+    monkeypatch.setattr(settings, "reflection_mode", "async")
+    monkeypatch.setattr(fake_llm, "delay", 0.5)
+
+    async def flow(client):
+        start = time.perf_counter()
+        checkin = await client.post("/checkin", json=_checkin_payload())
+        elapsed = time.perf_counter() - start
+        log_id = checkin.json()["log"]["id"]
+        pending = await client.get("/reflection/status", params={"logId": log_id})
+        await get_reflection_worker().join()
+        ready = await client.get("/reflection/status", params={"logId": log_id})
+        snapshot = await client.get("/dailySnapshot", params={"address": ADDRESS, "dayIndex": 1})
+        return checkin, elapsed, pending, ready, snapshot
+
+    checkin, elapsed, pending, ready, snapshot = api(flow)
+    assert elapsed < 0.4
+    assert checkin.json()["log"]["reflectionStatus"] == "PENDING"
+    assert pending.json()["status"] == "PENDING"
+    assert ready.json()["status"] == "READY"
+    assert ready.json()["reflection"]["note"]
+    assert snapshot.json()["log"]["reflectionStatus"] == "READY"
+    assert fake_llm.calls == 1
+
+
+def test_reflection_worker_requeues_pending_rows_on_start(db_engine, fake_llm):
+    import uuid
+    from sqlmodel import Session
+    from backend.app.models import DailyLog
+    from backend.app.services.reflection_worker import ReflectionWorker
+
+    log_id = str(uuid.uuid4())
+    with Session(db_engine) as session:
+        session.add(DailyLog(
+            id=log_id, address=ADDRESS, challenge_id=1, day_index=3, date_key="2026-01-03",
+            normalized_text="hi", reflection={"note": "", "next": ""}, reflection_status="PENDING",
+            salt_hex="0x1", proof_hash="0x" + "0" * 64,
+        ))
+        session.commit()
+
+    async def restart():
+        worker = ReflectionWorker(concurrency=1, max_queue=4, sweep_seconds=60)
+        try:
+            assert await worker.requeue_pending() == 1
+            await asyncio.sleep(0)
+            await worker.join()
+        finally:
+            await worker.stop()
+
+    asyncio.run(restart())
+    with Session(db_engine) as session:
+        log = session.get(DailyLog, log_id)
+        assert log.reflection_status == "READY"
+        assert log.reflection["note"]
+
+
+def _asgi_stream(method, path, query="", body=None):
+    """Drive the ASGI app directly (httpx buffers ASGI bodies) and time the first streamed event."""
+    from backend.app.main import app
+
+    payload = json.dumps(body).encode() if body is not None else b""
+    chunks = []
+    timings = {}
+
+    sent_body = asyncio.Event()
+
+    async def receive():
+        if not sent_body.is_set():
+            sent_body.set()
+            return {"type": "http.request", "body": payload, "more_body": False}
+        # the client stays connected until the response ends
+        await asyncio.Event().wait()
+
+    async def send(message):
+        now = time.perf_counter()
+        if message["type"] == "http.response.start":
+            timings["status"] = message["status"]
+        elif message["type"] == "http.response.body" and message.get("body"):
+            timings.setdefault("first_byte", now)
+            if b"event: delta" in message["body"]:
+                timings.setdefault("first_delta", now)
+            chunks.append(message["body"].decode())
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query.encode(),
+        "root_path": "", "headers": [(b"content-type", b"application/json")],
+        "client": ("test", 1), "server": ("test", 80),
+    }
+
+    async def main():
+        # a full collection over the app's imports takes ~0.2s; keep it out of the timed window
+        gc.collect()
+        start = time.perf_counter()
+        try:
+            await app(scope, receive, send)
+        finally:
+            await stop_reflection_worker()
+        end = time.perf_counter()
+        return {
+            "status": timings.get("status"),
+            "ttfb": timings["first_byte"] - start,
+            "first_delta": timings.get("first_delta", end) - start,
+            "total": end - start,
+            "events": _parse_sse("".join(chunks)),
+        }
+
+    return asyncio.run(main())
+
+
+def _parse_sse(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_reflection_written_back_once_across_workers(db_engine, fake_llm, monkeypatch):
+    import uuid
+    from sqlmodel import Session
+    from backend.app.config import settings
+    from backend.app.models import DailyLog
+    from backend.app.services.reflection_worker import ReflectionWorker
+
+    monkeypatch.setattr(settings, "reflection_cache_backend", "off")
+    monkeypatch.setattr(fake_llm, "delay", 0.1)
+    log_id = str(uuid.uuid4())
+    with Session(db_engine) as session:
+        session.add(DailyLog(
+            id=log_id, address=ADDRESS, challenge_id=1, day_index=2, date_key="2026-01-02",
+            normalized_text="hi", reflection={"note": "", "next": ""}, reflection_status="PENDING",
+            salt_hex="0x1", proof_hash="0x" + "0" * 64,
+        ))
+        session.commit()
+
+    async def two_processes():
+        workers = [ReflectionWorker(concurrency=1, max_queue=4, sweep_seconds=60) for _ in range(2)]
+        return await asyncio.gather(*(w.process(log_id) for w in workers))
+
+    assert sorted(asyncio.run(two_processes())) == [False, True]
+    assert fake_llm.calls == 2
+    with Session(db_engine) as session:
+        assert session.get(DailyLog, log_id).reflection_status == "READY"
+
+
+def test_reflection_stream_time_to_first_byte(db_engine, fake_llm, monkeypatch):
+    monkeypatch.setattr(fake_llm, "chunk_delay", 0.05)
+    body = {"task": {"dayIndex": 1, "title": "t", "instruction": "i"}, "userText": "hello", "dayIndex": 1}
+    result = _asgi_stream("POST", "/ai/reflection/stream", body=body)
+
+    assert result["status"] == 200
+    # the whole reply needs one delay between consecutive chunks; the first delta must not wait for them
+    gaps = math.ceil(len(fake_llm.reply) / fake_llm.chunk_size) - 1
+    assert result["total"] >= gaps * fake_llm.chunk_delay
+    assert result["first_delta"] < 0.1
+    kinds = [kind for kind, _ in result["events"]]
+    assert kinds[0] == "delta" and kinds[-1] == "done" and kinds.count("done") == 1
+    streamed = "".join(data["text"] for kind, data in result["events"] if kind == "delta")
+    assert json.loads(streamed) == result["events"][-1][1]["reflection"]
+
+    # the validated result was cached, so a repeat is a single "done" event
+    again = _asgi_stream("POST", "/ai/reflection/stream", body=body)
+    assert [kind for kind, _ in again["events"]] == ["done"]
+    assert fake_llm.calls == 1
+
+
+def test_report_stream_guards_final_text(api, fake_llm, monkeypatch):
+    api(lambda client: client.post("/checkin", json=_checkin_payload()))
+    monkeypatch.setattr(fake_llm, "reply", "很长的总结" * 60)
+    monkeypatch.setattr(fake_llm, "chunk_delay", 0.01)
+    result = _asgi_stream("GET", "/report/stream", query=f"address={ADDRESS}&range=week")
+
+    kinds = [kind for kind, _ in result["events"]]
+    assert kinds[0] == "meta" and kinds[-1] == "done"
+    assert result["ttfb"] < result["first_delta"] < 0.1
+    final = result["events"][-1][1]
+    assert len(final["reportText"]) == 120
+    assert final["chartByDay"][0] == 1 and final["recentLogs"][0]["dayIndex"] == 1
+
+
+def test_nft_jobs_backpressure_and_polling(api, nft_jobs):
+    body = {"dayIndex": 3, "taskTitle": "t", "userText": "hello"}
+
+    async def flow(client):
+        accepted = [await client.post("/ai/generate-nft/jobs", json=body) for _ in range(2)]
+        rejected = await client.post("/ai/generate-nft/jobs", json=body)
+        start = time.perf_counter()
+        prompt = await client.get("/dailyPrompt", params={"dayIndex": 1})
+        prompt_elapsed = time.perf_counter() - start
+        job_id = accepted[0].json()["jobId"]
+        still_running = await client.get(f"/ai/generate-nft/jobs/{job_id}")
+        nft_jobs.release.set()
+        done = await client.get(f"/ai/generate-nft/jobs/{job_id}", params={"wait": 5})
+        inline = await client.post("/ai/generate-nft", json=body)
+        missing = await client.get("/ai/generate-nft/jobs/nope")
+        return accepted, rejected, prompt, prompt_elapsed, still_running, done, inline, missing
+
+    accepted, rejected, prompt, prompt_elapsed, still_running, done, inline, missing = api(flow)
+    assert [r.status_code for r in accepted] == [202, 202]
+    assert rejected.status_code == 503 and rejected.headers["Retry-After"] == "5"
+    assert rejected.json()["detail"]["error"]["code"] == "BUSY"
+    # blocked image jobs hold their own threads, not the shared pool the sync routes run on
+    assert prompt.status_code == 200 and prompt_elapsed < 0.5
+    assert still_running.json()["status"] in ("QUEUED", "RUNNING")
+    digest = hashlib.sha256(b"png for day 3").hexdigest()
+    assert done.json() == {
+        "jobId": accepted[0].json()["jobId"], "status": "DONE", "dayIndex": 3,
+        "image": f"http://test/images/{digest}.png", "imageDigest": digest, "provider": "fake", "error": None,
+    }
+    assert inline.json()["image"] == f"http://test/images/{digest}.png"
+    assert missing.status_code == 404
+
+
+def test_images_served_immutable_by_digest(api, image_store):
+    stored = image_store.put(b"\x89PNG" + bytes(200_000), "image/png")
+
+    async def flow(client):
+        url = f"/images/{stored.name}"
+        first = await client.get(url)
+        revalidated = await client.get(url, headers={"If-None-Match": first.headers["ETag"]})
+        unknown = await client.get("/images/" + "0" * 64 + ".png")
+        traversal = await client.get("/images/..%2Fsecret.png")
+        return first, revalidated, unknown, traversal
+
+    first, revalidated, unknown, traversal = api(flow)
+    assert first.status_code == 200 and first.content == b"\x89PNG" + bytes(200_000)
+    assert first.headers["Content-Type"] == "image/png"
+    assert first.headers["ETag"] == f'"{stored.digest}"'
+    assert first.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+    assert revalidated.status_code == 304 and not revalidated.content
+    assert unknown.status_code == 404 and traversal.status_code == 404
+
+
+def test_progress_summary_follows_checkin_tx_and_mint(api, db_engine):
+    from sqlmodel import Session
+    from backend.app import cli
+    from backend.app.models import ProgressSummary
+    from backend.app.services.progress_summary import check_progress_summaries
+
+    async def flow(client):
+        log = (await client.post("/checkin", json=_checkin_payload())).json()["log"]
+        await client.post("/tx/confirm", json={
+            "address": ADDRESS, "logId": log["id"], "txHash": "0x" + "1" * 64, "chainId": 1, "contractAddress": "0x" + "0" * 40,
+        })
+        before_mint = await client.get("/progress", params={"address": ADDRESS})
+        await client.post("/nft/confirm", json={"address": ADDRESS, "type": "DAY", "dayIndex": 1, "txHash": "0x" + "2" * 64, "chainId": 1, "contractAddress": "0x" + "0" * 40})
+        after_mint = await client.get("/progress", params={"address": ADDRESS})
+        return before_mint.json(), after_mint.json()
+
+    before_mint, after_mint = api(flow)
+    assert before_mint["completedDays"] == [1]
+    assert before_mint["mintableDayIndex"] == 1 and before_mint["dayMintCount"] == 0
+    assert after_mint["mintableDayIndex"] is None and after_mint["dayMintCount"] == 1
+
+    with Session(db_engine) as session:
+        summary = session.get(ProgressSummary, (ADDRESS, 1))
+        assert (summary.completed_mask, summary.submitted_mask, summary.minted_mask) == (1, 1, 1)
+        assert summary.mint_count == 1 and summary.streak == 1
+        assert check_progress_summaries(session) == []
+
+        summary.completed_mask = 0b11
+        session.add(summary)
+        session.commit()
+        drift = check_progress_summaries(session)
+        assert [(d.field, d.stored, d.expected) for d in drift] == [("completed_mask", 3, 1)]
+        assert cli.main(["check-progress-summaries", "--fix"]) == 0
+        session.expire_all()
+        assert check_progress_summaries(session) == []
+
+
+def test_concurrent_confirms_keep_every_summary_bit(api, db_engine, monkeypatch):
+    from sqlmodel import Session, delete
+    from backend.app.config import settings
+    from backend.app.models import ProgressSummary
+    from backend.app.services import progress_summary
+
+    monkeypatch.setattr(settings, "demo_mode", True)
+    monkeypatch.setattr(settings, "demo_start_date_key", "2026-01-01")
+
+    async def checkins(client):
+        return [(await client.post("/checkin", json=_checkin_payload(day_index=day))).json()["log"] for day in (1, 2, 3, 4)]
+
+    logs = api(checkins)
+    # no summary row yet: every request of the first round rebuilds it and races to store it
+    with Session(db_engine) as session:
+        session.exec(delete(ProgressSummary))
+        session.commit()
+
+    # widen the window between reading the summary and writing it
+    load_summary, load_summary_sync = progress_summary.load_summary, progress_summary.load_summary_sync
+
+    async def slow_load_summary(*args, **kwargs):
+        summary = await load_summary(*args, **kwargs)
+        await asyncio.sleep(0.05)
+        return summary
+
+    def slow_load_summary_sync(*args, **kwargs):
+        summary = load_summary_sync(*args, **kwargs)
+        time.sleep(0.05)
+        return summary
+
+    monkeypatch.setattr(progress_summary, "load_summary", slow_load_summary)
+    monkeypatch.setattr(progress_summary, "load_summary_sync", slow_load_summary_sync)
+
+    def confirms(tx_days, mint_days):
+        async def flow(client):
+            tx = [
+                client.post("/tx/confirm", json={
+                    "address": ADDRESS, "logId": logs[day - 1]["id"], "txHash": "0x" + str(day) * 64,
+                    "chainId": 1, "contractAddress": "0x" + "0" * 40,
+                })
+                for day in tx_days
+            ]
+            mints = [
+                client.post("/nft/confirm", json={
+                    "address": ADDRESS, "type": "DAY", "dayIndex": day, "txHash": "0x" + "9" * 63 + str(day),
+                    "chainId": 1, "contractAddress": "0x" + "0" * 40,
+                })
+                for day in mint_days
+            ]
+            return await asyncio.gather(*tx, *mints)
+
+        return api(flow)
+
+    # first round races to create the row, the second to set bits on the existing row
+    responses = confirms((1, 2), (1,)) + confirms((3, 4), (2,))
+    assert [r.status_code for r in responses] == [200] * 6, [r.text for r in responses]
+    with Session(db_engine) as session:
+        summary = session.get(ProgressSummary, (ADDRESS, 1))
+        assert (summary.completed_mask, summary.submitted_mask, summary.minted_mask) == (0b1111, 0b1111, 0b11)
+        assert summary.mint_count == 2
+        assert progress_summary.check_progress_summaries(session) == []
+
+
+def _count_writes(engine):
+    """Session commits and flushes, plus INSERT/UPDATE/DELETE statements reaching the database."""
+    from sqlalchemy.orm import Session as OrmSession
+
+    counts = {"commits": 0, "flushes": 0, "writes": 0}
+
+    def _commit(session):
+        counts["commits"] += 1
+
+    def _flush(session, context):
+        counts["flushes"] += 1
+
+    def _statement(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().split(None, 1)[0].upper() in ("INSERT", "UPDATE", "DELETE"):
+            counts["writes"] += 1
+
+    event.listen(OrmSession, "after_commit", _commit)
+    event.listen(OrmSession, "after_flush", _flush)
+    event.listen(engine, "before_cursor_execute", _statement)
+
+    def take():
+        snapshot = dict(counts)
+        counts.update(commits=0, flushes=0, writes=0)
+        return snapshot
+
+    def remove():
+        event.remove(OrmSession, "after_commit", _commit)
+        event.remove(OrmSession, "after_flush", _flush)
+
+    return take, remove
+
+
+def test_write_budget_per_endpoint(api, db_engine):
+    take, remove = _count_writes(db_engine)
+    reads = [
+        ("/progress", {"address": ADDRESS}),
+        ("/user", {"address": ADDRESS}),
+        ("/homeSnapshot", {"address": ADDRESS}),
+        ("/dailySnapshot", {"address": ADDRESS, "dayIndex": 1}),
+        ("/report", {"address": ADDRESS, "range": "week"}),
+    ]
+
+    async def flow(client):
+        budgets = {}
+        # unknown user: nothing may be created by looking
+        await client.get("/progress", params={"address": ADDRESS})
+        budgets["GET /progress (new user)"] = take()
+        first, second = await asyncio.gather(
+            client.post("/checkin", json=_checkin_payload()),
+            client.post("/checkin", json=_checkin_payload()),
+        )
+        assert first.json()["log"]["id"] == second.json()["log"]["id"]
+        budgets["POST /checkin x2 (racing)"] = take()
+        await client.post("/checkin", json=_checkin_payload())
+        budgets["POST /checkin (repeat)"] = take()
+        await client.post("/tx/confirm", json={
+            "address": ADDRESS, "logId": first.json()["log"]["id"], "txHash": "0x" + "1" * 64,
+            "chainId": 1, "contractAddress": "0x" + "0" * 40,
+        })
+        budgets["POST /tx/confirm"] = take()
+        # the first report generates its text and stores it in the report cache (own session)
+        await client.get("/report", params={"address": ADDRESS, "range": "week"})
+        budgets["GET /report (cache fill)"] = take()
+        for path, params in reads:
+            response = await client.get(path, params=params)
+            assert response.status_code == 200, (path, response.text)
+            budgets["GET " + path] = take()
+        return budgets
+
+    try:
+        budgets = api(flow)
+    finally:
+        remove()
+
+    assert budgets["GET /progress (new user)"] == {"commits": 0, "flushes": 0, "writes": 0}
+    # one commit each; progress row, log, streak and summary are flushed together
+    assert budgets["POST /checkin x2 (racing)"]["commits"] == 2
+    assert budgets["POST /checkin x2 (racing)"]["flushes"] <= 2
+    assert budgets["POST /checkin (repeat)"]["writes"] == 0
+    assert budgets["POST /tx/confirm"]["commits"] == 1
+    assert budgets["POST /tx/confirm"]["flushes"] == 1
+    assert budgets["GET /report (cache fill)"]["commits"] == 1
+    assert budgets["GET /report (cache fill)"]["writes"] == 1
+    for path, _ in reads:
+        assert budgets["GET " + path] == {"commits": 0, "flushes": 0, "writes": 0}, path
+
+
+def test_query_budget_per_endpoint(api, query_budget, monkeypatch):
+    from backend.app.config import settings
+    from backend.app.metrics import REGISTRY
+
+    monkeypatch.setattr(settings, "debug_headers", True)
+
+    async def flow(client):
+        with query_budget(statements=4, repeats=1):
+            await client.get("/progress", params={"address": ADDRESS})
+        # a new user's progress row is read back once after it is inserted; the summary row is
+        # inserted as rebuilt, then the day bit is set by its own UPDATE
+        with query_budget(statements=10, repeats=2):
+            checkin = await client.post("/checkin", json=_checkin_payload())
+        with query_budget(statements=3, repeats=1):
+            await client.post("/checkin", json=_checkin_payload())
+        with query_budget(statements=3, repeats=1):
+            progress = await client.get("/progress", params={"address": ADDRESS})
+        with query_budget(statements=2, repeats=1):
+            await client.get("/homeSnapshot", params={"address": ADDRESS})
+            await client.get("/dailySnapshot", params={"address": ADDRESS, "dayIndex": 1})
+        # logs, cache lookup, then the cache fill (own session: lookup and insert)
+        with query_budget(statements=4, repeats=2):
+            await client.get("/report", params={"address": ADDRESS, "range": "week"})
+        with query_budget(statements=2, repeats=1):
+            await client.get("/report", params={"address": ADDRESS, "range": "week"})
+        return checkin, progress
+
+    checkin, progress = api(flow)
+    assert int(checkin.headers["x-db-queries"]) > 0
+    assert float(progress.headers["x-db-time-ms"]) >= float(progress.headers["x-db-slowest-ms"]) > 0
+    statements = {metric.name: metric for metric in REGISTRY.metrics()}["db_statements_per_request"]
+    assert statements.count(route="POST /checkin") >= 2
+
+
+def test_checkin_reads_each_row_once(api, query_budget, monkeypatch):
+    from backend.app.config import settings
+
+    monkeypatch.setattr(settings, "demo_mode", True)
+    monkeypatch.setattr(settings, "demo_start_date_key", "2026-01-01")
+
+    async def flow(client):
+        await client.post("/checkin", json=_checkin_payload(day_index=1))
+        # existing user, new day: progress, log and summary are each selected once across
+        # the route, DailyPrompt, ProgressUpdate and the route's final log lookup
+        with query_budget(statements=6, repeats=1) as seen:
+            second = await client.post("/checkin", json=_checkin_payload(day_index=2))
+        return second, seen
+
+    second, seen = api(flow)
+    assert second.status_code == 200 and second.json()["log"]["dayIndex"] == 2
+    selects = [s for s in seen[0][1].by_statement if s.lstrip().upper().startswith("SELECT")]
+    assert len(selects) == 3
+
+
+def _samples(text):
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+def test_metrics_endpoint_covers_routes_nodes_and_llm(api, fake_llm, monkeypatch):
+    from backend.app import metrics
+    from backend.app.config import settings
+
+    async def flow(client):
+        await client.post("/checkin", json=_checkin_payload())
+        fake_llm.reply = "not json"
+        await client.post("/ai/reflection", json={
+            "task": {"dayIndex": 1, "title": "t", "instruction": "i"}, "userText": "metrics", "dayIndex": 1,
+        })
+        return await client.get("/metrics")
+
+    response = api(flow)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    samples = _samples(response.text)
+    provider = settings.llm_provider
+    assert samples['http_request_seconds_count{route="POST /checkin",status="200"}'] >= 1
+    assert samples['graph_node_seconds_count{node="ProgressUpdate",outcome="ok"}'] >= 1
+    assert samples[f'llm_request_seconds_count{{operation="reflection",provider="{provider}",outcome="ok"}}'] >= 1
+    assert samples['llm_fallbacks_total{operation="reflection",reason="fallback"}'] >= 1
+    assert samples['db_statements_per_request_count{route="POST /checkin"}'] >= 1
+    assert "# TYPE reflection_cache_requests_total counter" in response.text
+    assert "# TYPE nft_image_provider_requests_total counter" in response.text
+
+    monkeypatch.setattr(metrics, "REGISTRY", metrics.Registry())
+    histogram = metrics.histogram("test_seconds", 'doc with "quotes"', ("path",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, path='a"b')
+    text = metrics.render_text()
+    assert 'test_seconds_bucket{path="a\\"b",le="0.1"} 1' in text
+    assert 'test_seconds_bucket{path="a\\"b",le="1"} 2' in text
+    assert 'test_seconds_bucket{path="a\\"b",le="+Inf"} 3' in text
+    assert 'test_seconds_sum{path="a\\"b"} 5.55' in text
+    assert 'test_seconds_count{path="a\\"b"} 3' in text
+
+
+def test_checkin_trace_spans_exported(api, tmp_path, monkeypatch):
+    from backend.app.config import settings
+    from backend.app.graph import agent
+
+    trace_file = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(settings, "trace_file", str(trace_file))
+    monkeypatch.setattr(settings, "debug_headers", True)
+
+    async def flow(client):
+        untraced = await client.get("/progress", params={"address": ADDRESS})
+        forced = await client.post("/checkin", json=_checkin_payload(), headers={"X-Trace-Sample": "1"})
+        monkeypatch.setattr(settings, "trace_sample_rate", 1.0)
+        sampled = await client.get("/progress", params={"address": ADDRESS})
+        return untraced, forced, sampled
+
+    untraced, forced, sampled = api(flow)
+    assert "x-trace-id" not in untraced.headers
+    timing = forced.headers["server-timing"]
+    for name in ("DailyPrompt", "Reflection", "ProgressUpdate", "graph"):
+        assert f"{name};dur=" in timing
+
+    traces = [json.loads(line) for line in trace_file.read_text().splitlines()]
+    assert [t["route"] for t in traces] == ["POST /checkin", "GET /progress"]
+    checkin = traces[0]
+    assert checkin["trace_id"] == forced.headers["x-trace-id"] and checkin["status"] == 200
+    nodes = [s for s in checkin["spans"] if s["kind"] == "node"]
+    assert nodes[0]["name"] == "DailyPrompt" and nodes[-1]["name"] == "BadgeCheck"
+    assert all(s["flow"] == "checkin" and s["outcome"] == "ok" for s in checkin["spans"])
+    assert "Prepare" in [s["name"] for s in checkin["spans"] if s["kind"] == "group"]
+    # fan-out branches overlap; the graph contains the groups and the nodes outside them
+    branches = {name for names in agent.FAN_OUTS.values() for name in names}
+    top_level = [s for s in checkin["spans"] if s["kind"] == "group" or (s["kind"] == "node" and s["name"] not in branches)]
+    graph = next(s for s in checkin["spans"] if s["kind"] == "graph")
+    assert graph["duration_ms"] >= sum(s["duration_ms"] for s in top_level)
+    assert [s["name"] for s in traces[1]["spans"]][-1] == "graph"
+
+
+def test_checkin_overlaps_db_reads_with_reflection(api, db_engine, fake_llm, tmp_path, monkeypatch):
+    from sqlalchemy import create_engine
+    from sqlmodel import Session
+    from backend.app.config import settings
+    from backend.app.models import UserProgress
+    from backend.app.services import progress_summary
+
+    delay = 0.3
+    fake_llm.delay = delay
+    load_summary = progress_summary.load_summary
+
+    async def slow_load_summary(*args, **kwargs):
+        await asyncio.sleep(delay)
+        return await load_summary(*args, **kwargs)
+
+    monkeypatch.setattr(progress_summary, "load_summary", slow_load_summary)
+    trace_file = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(settings, "trace_file", str(trace_file))
+    monkeypatch.setattr(settings, "trace_sample_rate", 1.0)
+
+    # another process writing while the first-time user's reflection is generated; it gives up
+    # on a lock held longer than 50 ms
+    other = create_engine(db_engine.url, connect_args={"check_same_thread": False, "timeout": 0.05})
+
+    def write_elsewhere():
+        started = time.perf_counter()
+        with Session(other) as session:
+            session.add(UserProgress(address="0x" + "3" * 40, start_date_key="2026-01-01"))
+            session.commit()
+        return time.perf_counter() - started
+
+    async def flow(client):
+        started = time.perf_counter()
+        checkin = asyncio.create_task(client.post("/checkin", json=_checkin_payload()))
+        await asyncio.sleep(delay / 2)
+        write_elapsed = await asyncio.to_thread(write_elsewhere)
+        response = await checkin
+        return response, time.perf_counter() - started, write_elapsed
+
+    response, elapsed, write_elapsed = api(flow)
+    other.dispose()
+    assert response.status_code == 200 and response.json()["log"]["reflection"]["note"]
+    # sequential would be LLM + summary load; overlapped it is about the slower of the two
+    assert elapsed < 2 * delay * 0.85
+    # nothing is written before the reflection returns, so the other writer never waits on us
+    assert write_elapsed < delay / 2
+
+    spans = {s["name"]: s for s in json.loads(trace_file.read_text().splitlines()[0])["spans"]}
+    reflection, prefetch = spans["Reflection"], spans["CheckinPrefetch"]
+    assert prefetch["duration_ms"] >= delay * 1000 * 0.9
+    assert prefetch["start_ms"] < reflection["start_ms"] + reflection["duration_ms"]
+    assert reflection["start_ms"] < prefetch["start_ms"] + prefetch["duration_ms"]
+
+
+
+def test_reports_reuse_stored_weekly_summaries(api, fake_llm, db_engine, monkeypatch):
+    from types import SimpleNamespace
+    from sqlmodel import Session
+    from backend.app.config import settings
+    from backend.app.models import WeeklySummary
+    from backend.app.services.report import estimate_tokens, final_prompt
+
+    monkeypatch.setattr(settings, "demo_mode", True)
+    monkeypatch.setattr(settings, "demo_start_date_key", "2026-01-01")
+    prompts = []
+    ask = fake_llm.ask
+
+    async def recording_ask(self, messages, system_msg=None, output_queue=None):
+        prompts.append(messages[-1]["content"])
+        return await ask(self, messages, system_msg, output_queue)
+
+    monkeypatch.setattr(fake_llm, "ask", recording_ask)
+
+    async def flow(client):
+        for day in range(1, 8):
+            await client.post("/checkin", json=_checkin_payload(day_index=day, text=f"第{day}天的记录"))
+        calls = fake_llm.calls
+        weeks = [await client.get("/report", params={"address": ADDRESS, "range": "week"}) for _ in range(2)]
+        week_calls = fake_llm.calls - calls
+        await client.post("/checkin", json=_checkin_payload(day_index=8, text="第8天的记录"))
+        calls, before = fake_llm.calls, len(prompts)
+        final = await client.get("/report", params={"address": ADDRESS, "range": "final"})
+        return weeks, week_calls, final, fake_llm.calls - calls, prompts[before:]
+
+    weeks, week_calls, final, final_calls, final_prompts = api(flow)
+    # week 1 is complete: summarized once, then served from weeklysummary
+    assert week_calls == 1
+    assert weeks[0].json()["reportText"] == weeks[1].json()["reportText"] != ""
+    with Session(db_engine) as session:
+        stored = session.get(WeeklySummary, (ADDRESS, 1, 1))
+    assert stored.text == weeks[0].json()["reportText"]
+
+    # the final report is one call over the stored week plus the day no summary covers yet
+    assert final.status_code == 200 and final_calls == 1
+    assert f"第1周: {stored.text}" in final_prompts[0]
+    assert "Day 8: 第8天的记录" in final_prompts[0] and "Day 1:" not in final_prompts[0]
+
+    summaries = {week: "很长的周总结" * 100 for week in (1, 2, 3)}
+    logs = [SimpleNamespace(day_index=day, normalized_text="记录" * 40, reflection={"next": "喝水"}) for day in range(22, 29)]
+    prompt = final_prompt(summaries, logs, budget=300)
+    assert estimate_tokens(prompt) <= 300 and "第3周:" in prompt
+
+
+def test_report_cache_follows_new_checkins(api, fake_llm, monkeypatch):
+    from backend.app.config import settings
+    from backend.app.services.report_cache import get_report_cache
+
+    monkeypatch.setattr(settings, "demo_mode", True)
+    monkeypatch.setattr(settings, "demo_start_date_key", "2026-01-01")
+
+    async def week_report(client):
+        return (await client.get("/report", params={"address": ADDRESS, "range": "week"})).json()["reportText"]
+
+    async def flow(client):
+        seen = {}
+        await client.post("/checkin", json=_checkin_payload(day_index=1))
+        fake_llm.reply = "第一版周报"
+        calls = fake_llm.calls
+        seen["first"] = [await week_report(client), await week_report(client)]
+        seen["first_calls"] = fake_llm.calls - calls
+
+        # a new log invalidates the cached text
+        await client.post("/checkin", json=_checkin_payload(day_index=2))
+        fake_llm.reply = "第二版周报"
+        calls = fake_llm.calls
+        seen["second"] = await week_report(client)
+        seen["second_calls"] = fake_llm.calls - calls
+
+        # stale-while-revalidate: the old text comes back at once, the new one is generated behind it
+        monkeypatch.setattr(settings, "report_cache", "swr")
+        await client.post("/checkin", json=_checkin_payload(day_index=3))
+        fake_llm.reply = "第三版周报"
+        fake_llm.delay = 0.3
+        started = time.perf_counter()
+        seen["stale"] = await week_report(client)
+        seen["stale_elapsed"] = time.perf_counter() - started
+        await get_report_cache().drain()
+        calls = fake_llm.calls
+        seen["revalidated"] = await week_report(client)
+        seen["revalidated_calls"] = fake_llm.calls - calls
+        return seen
+
+    seen = api(flow)
+    assert seen["first"] == ["第一版周报", "第一版周报"] and seen["first_calls"] == 1
+    assert seen["second"] == "第二版周报" and seen["second_calls"] == 1
+    assert seen["stale"] == "第二版周报" and seen["stale_elapsed"] < 0.3
+    assert seen["revalidated"] == "第三版周报" and seen["revalidated_calls"] == 0
+
+
+def test_concurrent_report_misses_store_one_entry(api, db_engine, fake_llm, monkeypatch):
+    from sqlmodel import Session, select
+
+    from backend.app.config import settings
+    from backend.app.models import ReportCacheEntry
+
+    monkeypatch.setattr(settings, "demo_mode", True)
+    monkeypatch.setattr(settings, "demo_start_date_key", "2026-01-01")
+
+    async def flow(client):
+        await client.post("/checkin", json=_checkin_payload(day_index=1))
+        fake_llm.reply = "同一份周报"
+        fake_llm.delay = 0.05
+        return await asyncio.gather(*(
+            client.get("/report", params={"address": ADDRESS, "range": "week"}) for _ in range(4)
+        ))
+
+    responses = api(flow)
+    assert [r.status_code for r in responses] == [200] * 4, [r.text for r in responses]
+    assert {r.json()["reportText"] for r in responses} == {"同一份周报"}
+    with Session(db_engine) as session:
+        assert len(session.exec(select(ReportCacheEntry)).all()) == 1
+
+
+def test_nightly_batch_pregenerates_weekly_reports(api, fake_llm, tmp_path, monkeypatch):
+    from backend.app import cli
+    from backend.app.config import settings
+    from backend.app.report_batch import pregenerate_weekly_reports
+
+    monkeypatch.setattr(settings, "demo_mode", True)
+    monkeypatch.setattr(settings, "demo_start_date_key", "2026-01-01")
+    other = "0x" + "2" * 40
+
+    async def checkins(client):
+        for day in range(1, 8):
+            await client.post("/checkin", json=_checkin_payload(day_index=day, text=f"第{day}天"))
+        await client.post("/checkin", json={**_checkin_payload(day_index=1), "address": other})
+
+    api(checkins)
+    checkpoint = tmp_path / "weekly.jsonl"
+    not_due = asyncio.run(pregenerate_weekly_reports(checkpoint=checkpoint, as_of="2026-01-05"))
+    assert (not_due.processed, not_due.failed, not_due.skipped) == (0, 0, 2)
+
+    calls = fake_llm.calls
+    result = asyncio.run(pregenerate_weekly_reports(concurrency=2, rate=50, checkpoint=checkpoint, as_of="2026-01-08"))
+    assert (result.processed, result.failed, result.skipped) == (2, 0, 0)
+    assert fake_llm.calls - calls == 2 and len(result.latencies) == 2
+
+    async def reports(client):
+        calls = fake_llm.calls
+        for address in (ADDRESS, other):
+            response = await client.get("/report", params={"address": address, "range": "week"})
+            assert response.json()["reportText"]
+        return fake_llm.calls - calls
+
+    # request time is a cache read now: the completed week from weeklysummary, the other from the report cache
+    assert api(reports) == 0
+    # a resumed run of the same day skips what the checkpoint holds
+    assert cli.main(["pregenerate-weekly-reports", "--as-of", "2026-01-08", "--checkpoint", str(checkpoint)]) == 0
+    assert checkpoint.read_text().count('"processed"') == 2
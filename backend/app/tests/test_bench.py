@@ -0,0 +1,78 @@
+from backend.app.bench import load
+
+
+def test_load_harness_reports_percentiles_per_endpoint():
+    result = load.run(users=3, days=2, llm_latency="0.01", image_latency="uniform:0:0.01", with_nft=True)
+
+    assert result["errors"] == 0
+    assert result["requests"] == 3 * (1 + 2 * 7)
+    assert result["throughput_rps"] > 0
+    checkin = result["endpoints"]["POST /checkin"]
+    assert checkin["count"] == 6
+    assert checkin["p50_ms"] <= checkin["p95_ms"] <= checkin["p99_ms"] <= checkin["max_ms"]
+    assert result["endpoints"]["POST /ai/generate-nft"]["count"] == 6
+    assert result["config"]["database"] == "sqlite (temp)"
+
+
+def test_percentile_nearest_rank():
+    values = [float(v) for v in range(1, 101)]
+    assert load.percentile(values, 50) == 50.0
+    assert load.percentile(values, 99) == 99.0
+    assert load.percentile(values[:1], 95) == 1.0
+
+
+def test_seed_cohort_is_internally_consistent(db_engine):
+    from sqlmodel import Session, func, select
+    from backend.app import cli
+    from backend.app.models import DailyLog, MilestoneToken, ProgressSummary, UserProgress
+    from backend.app.services.crypto import compute_proof_hash, sha256_hex
+    from backend.app.services.milestones import token_id_for_milestone
+    from backend.app.services.progress_summary import check_progress_summaries, streak_from_logs
+
+    assert cli.main(["seed-cohort", "--users", "60", "--seed", "7", "--batch-size", "25", "--start-date", "2026-01-01"]) == 0
+
+    with Session(db_engine) as session:
+        assert session.exec(select(func.count()).select_from(UserProgress)).one() == 60
+        assert session.exec(select(func.count()).select_from(ProgressSummary)).one() == 60
+        assert check_progress_summaries(session) == []
+
+        logs = session.exec(select(DailyLog)).all()
+        assert 0 < len(logs) <= 60 * 28
+        assert any(log.tx_hash is None for log in logs) and any(log.tx_hash for log in logs)
+        for log in logs:
+            assert log.proof_hash == compute_proof_hash(log.date_key, log.normalized_text, log.salt_hex)
+            assert log.input_hash == sha256_hex(log.normalized_text)
+            assert not log.day_nft_tx_hash or log.tx_hash
+
+        by_user = {}
+        for log in logs:
+            by_user.setdefault(log.address, []).append(log)
+        assert any(streak_from_logs(user_logs) < len(user_logs) for user_logs in by_user.values())  # gaps
+        for progress in session.exec(select(UserProgress)).all():
+            user_logs = sorted(by_user.get(progress.address, []), key=lambda l: l.date_key)
+            assert progress.streak == streak_from_logs(user_logs)
+            assert progress.last_day_index == (user_logs[-1].day_index if user_logs else None)
+
+        for token in session.exec(select(MilestoneToken)).all():
+            assert token.token_id == str(token_id_for_milestone(token.address, token.milestone_id))
+            assert session.get(UserProgress, token.address).milestones[str(token.milestone_id)] == token.tx_hash
+
+
+def test_micro_benchmarks_flag_regressions_against_baseline(tmp_path):
+    import json
+    from backend.app.bench import micro
+
+    names = [name for name, _ in micro.cases()]
+    assert "compute_proof_hash[500]" in names and "normalize_text[2000]" in names
+
+    baseline = tmp_path / "baseline.json"
+    assert micro.main(["run", "--out", str(baseline), "--repeat", "1", "--only", "diff_days"]) == 0
+    recorded = json.loads(baseline.read_text())
+    assert list(recorded["results"]) == ["diff_days"] and recorded["results"]["diff_days"] > 0
+
+    slower = tmp_path / "slower.json"
+    slower.write_text(json.dumps({"results": {"diff_days": recorded["results"]["diff_days"] * 2}}))
+    assert micro.main(["compare", str(baseline), str(slower), "--threshold", "0.5"]) == 1
+    assert micro.main(["compare", str(baseline), str(baseline)]) == 0
+    rows = micro.compare({"results": {"a": 100.0, "b": 100.0}}, {"results": {"a": 110.0}}, threshold=0.05)
+    assert rows == [{"case": "a", "baseline_ns": 100.0, "current_ns": 110.0, "ratio": 1.1, "regressed": True}]
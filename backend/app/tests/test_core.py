@@ -1,8 +1,12 @@
 ﻿import pytest
+from sqlalchemy import event
 from sqlmodel import SQLModel, Session, create_engine, select
-from backend.app.models import DailyLog
+from backend.app.models import DailyLog, UserProgress
 from backend.app.services.crypto import compute_proof_hash
 from backend.app.services.time import diff_days
+import json
+import os
+import time
 import uuid
 
 
@@ -53,3 +57,187 @@ def test_dailylog_idempotent_unique():
         session.add(dup)
         with pytest.raises(Exception):
             session.commit()
+
+
+def _count_statements(engine):
+    counter = {"n": 0}
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        counter["n"] += 1
+
+    return counter
+
+
+def test_metadata_lookup_constant_as_users_grow(monkeypatch):
+    from backend.app import routes
+    from backend.app.services import milestones as milestone_service
+
+    statements_per_lookup = []
+    for user_count in (5, 200):
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False})
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            for i in range(user_count):
+                session.add(UserProgress(
+                    address="0x" + f"{i:040x}",
+                    start_date_key="2026-01-01",
+                    milestones={"1": "0xtx", "2": None, "3": None},
+                ))
+            session.commit()
+            assert milestone_service.backfill_milestone_tokens(session) == user_count
+            assert milestone_service.backfill_milestone_tokens(session) == 0
+
+            target = "0x" + f"{user_count - 1:040x}"
+            token_id = str(milestone_service.token_id_for_milestone(target, 1))
+            monkeypatch.setattr(milestone_service, "token_id_for_milestone", lambda *a: pytest.fail("hashed on lookup"))
+            counter = _count_statements(engine)
+            meta = routes.metadata(token_id, session=session)
+            monkeypatch.undo()
+            assert meta["name"] == "Alive28 - Week1"
+            statements_per_lookup.append(counter["n"])
+
+    assert statements_per_lookup[0] == statements_per_lookup[1] == 1
+
+
+def test_concurrent_milestone_mint_records_token_once(tmp_path):
+    from backend.app.models import MilestoneToken
+    from backend.app.services import milestones as milestone_service
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'mint.db'}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    address = "0x" + "1" * 40
+    with Session(engine) as ours, Session(engine) as theirs:
+        # both requests read "no token" before either writes
+        real_get = ours.get
+        reads = []
+
+        def racing_get(model, ident):
+            if not reads:
+                reads.append(ident)
+                milestone_service.record_milestone_token(theirs, address, 1, "0xtheirs")
+                theirs.commit()
+                return None
+            return real_get(model, ident)
+
+        ours.get = racing_get
+        token = milestone_service.record_milestone_token(ours, address, 1, "0xours")
+        ours.commit()
+
+        assert token.tx_hash == "0xtheirs"
+        assert len(ours.exec(select(MilestoneToken)).all()) == 1
+
+
+def _write_tasks(path, count=28, **overrides):
+    entries = [{"title": f"Day {i}", "instruction": f"do {i}", "hint": None} for i in range(1, count + 1)]
+    entries[0].update(overrides)
+    path.write_text(json.dumps(entries, ensure_ascii=False), encoding="utf-8")
+
+
+@pytest.fixture
+def task_file(tmp_path, monkeypatch):
+    from backend.app.services import tasks
+
+    path = tmp_path / "tasks.json"
+    _write_tasks(path)
+    monkeypatch.setattr(tasks, "DATA_PATH", path)
+    monkeypatch.setattr(tasks, "_catalog", None)
+    return path
+
+
+def test_task_catalog_parsed_once(task_file, monkeypatch):
+    from backend.app.services import tasks
+
+    reads = {"n": 0}
+    real_build = tasks._build_catalog
+
+    def counting_build(*args):
+        reads["n"] += 1
+        return real_build(*args)
+
+    monkeypatch.setattr(tasks, "_build_catalog", counting_build)
+    monkeypatch.setattr(tasks, "CHECK_INTERVAL_SECONDS", 0)
+    for day in range(1, 29):
+        task = tasks.get_task_by_day_index(day)
+        assert task["title"] == f"Day {day}" and task.get("hint") is None
+    assert reads["n"] == 1
+    with pytest.raises(TypeError):
+        task["title"] = "changed"
+
+    _write_tasks(task_file, title="Day 1 edited")
+    os.utime(task_file, ns=(0, time.time_ns() + 10**9))
+    assert tasks.get_task_by_day_index(1)["title"] == "Day 1 edited"
+    assert reads["n"] == 2
+
+
+def test_task_catalog_validation(task_file):
+    from backend.app.services import tasks
+
+    assert tasks.reload_tasks().tasks[0].title == "Day 1"
+    _write_tasks(task_file, count=27)
+    with pytest.raises(ValueError):
+        tasks.reload_tasks()
+    _write_tasks(task_file, instruction="")
+    with pytest.raises(ValueError):
+        tasks.reload_tasks()
+    with pytest.raises(ValueError):
+        tasks.get_task_by_day_index(29)
+
+
+def test_sighup_reloads_task_catalog(task_file, monkeypatch):
+    import asyncio
+    import signal
+    from backend.app.services import tasks
+
+    if not hasattr(signal, "SIGHUP"):
+        pytest.skip("no SIGHUP on this platform")
+    monkeypatch.setattr(tasks, "CHECK_INTERVAL_SECONDS", 3600)
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        assert tasks.install_reload_signal(loop)
+        try:
+            assert tasks.get_task_by_day_index(1)["title"] == "Day 1"
+            _write_tasks(task_file, title="Day 1 edited")
+            os.kill(os.getpid(), signal.SIGHUP)
+            await asyncio.sleep(0.05)
+            assert tasks.get_task_by_day_index(1)["title"] == "Day 1 edited"
+
+            _write_tasks(task_file, count=27)
+            os.kill(os.getpid(), signal.SIGHUP)
+            await asyncio.sleep(0.05)
+            assert tasks.get_task_by_day_index(1)["title"] == "Day 1 edited"
+        finally:
+            loop.remove_signal_handler(signal.SIGHUP)
+
+    asyncio.run(scenario())
+
+
+def test_request_context_fetches_each_row_once(tmp_path):
+    import asyncio
+    from backend.app.database import ThreadedSession
+    from backend.app.models import UserProgress
+    from backend.app.request_context import RequestContext
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'ctx.db'}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(UserProgress(address="0xabc", start_date_key="2026-01-01", milestones={}))
+        session.commit()
+    statements = _count_statements(engine)
+
+    async def lookups():
+        ctx = RequestContext(ThreadedSession(Session(engine)))
+        first = await ctx.progress("0xabc")
+        assert await ctx.progress("0xabc") is first
+        assert await ctx.log("missing") is None
+        assert await ctx.log("missing") is None
+        counted = (dict(ctx.fetches), statements["n"])
+        ctx.invalidate("progress", "0xabc")
+        await ctx.progress("0xabc")
+        await ctx.db.close()
+        return counted, dict(ctx.fetches)
+
+    (fetches, selects), after_invalidate = asyncio.run(lookups())
+    assert fetches == {"progress": 1, "log": 1} and selects == 2
+    assert after_invalidate["progress"] == 2
@@ -0,0 +1,27 @@
+import asyncio
+
+from backend.app.graph import agent
+
+
+def test_graph_compiled_once(monkeypatch):
+    builds = {"n": 0}
+    real_build = agent.build_graph
+
+    def counting_build():
+        builds["n"] += 1
+        return real_build()
+
+    monkeypatch.setattr(agent, "build_graph", counting_build)
+    monkeypatch.setattr(agent, "_compiled_graph", None)
+
+    async def run_many():
+        states = [{"flow": "tx_confirm", "db": None, "address": None, "n": i} for i in range(20)]
+        results = await asyncio.gather(*(agent.invoke_graph(s) for s in states))
+        return states, results
+
+    states, results = asyncio.run(run_many())
+    assert builds["n"] == 1
+    for i, (state, result) in enumerate(zip(states, results)):
+        assert result["n"] == i
+        assert result["txStatus"] == "CREATED"
+        assert "txStatus" not in state
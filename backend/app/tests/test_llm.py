@@ -0,0 +1,224 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+from backend.app.config import settings
+from backend.app.services import reflection, reflection_cache
+from backend.app.services.reflection_cache import MemoryCacheBackend, SqlCacheBackend
+
+TASK = {"dayIndex": 2, "title": "Day 2 感恩自己", "instruction": "感恩自己：今天我还活着", "hint": None}
+
+
+def test_reflection_cache_hits_identical_input(fake_llm, db_engine):
+    hits_before = reflection_cache.cache_requests.value(result="hit", tier="memory")
+    first = asyncio.run(reflection.generate_reflection(TASK, "今天还活着"))
+    second = asyncio.run(reflection.generate_reflection(TASK, "  今天还活着 "))
+    other_day = asyncio.run(reflection.generate_reflection({**TASK, "dayIndex": 3}, "今天还活着"))
+    assert first == second == other_day
+    assert fake_llm.calls == 2
+    assert reflection_cache.cache_requests.value(result="hit", tier="memory") == hits_before + 1
+
+
+def test_reflection_cache_never_stores_fallback(fake_llm, db_engine, monkeypatch):
+    monkeypatch.setattr(fake_llm, "reply", "not json")
+    assert asyncio.run(reflection.generate_reflection(TASK, "x")) == reflection.FALLBACK
+    assert asyncio.run(reflection.generate_reflection(TASK, "x")) == reflection.FALLBACK
+    assert fake_llm.calls == 2
+
+
+def test_memory_backend_ttl_and_lru(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(reflection_cache.time, "monotonic", lambda: now[0])
+    backend = MemoryCacheBackend(max_entries=2, ttl_seconds=10)
+    backend.set("a", {"note": "a"})
+    backend.set("b", {"note": "b"})
+    assert backend.get("a") == {"note": "a"}
+    backend.set("c", {"note": "c"})
+    assert backend.get("b") is None
+    assert len(backend) == 2
+    now[0] += 11
+    assert backend.get("a") is None
+
+
+def test_sql_backend_survives_restart(fake_llm, db_engine, monkeypatch):
+    monkeypatch.setattr(settings, "reflection_cache_backend", "sql")
+    asyncio.run(reflection.generate_reflection(TASK, "今天还活着"))
+    reflection_cache.reset_reflection_cache()
+    asyncio.run(reflection.generate_reflection(TASK, "今天还活着"))
+    assert fake_llm.calls == 1
+
+
+def test_sql_backend_evicts_only_over_cap(db_engine, monkeypatch):
+    backend = SqlCacheBackend(max_entries=20, ttl_seconds=60)
+    evictions = []
+    real_evict = backend._evict
+    monkeypatch.setattr(backend, "_evict", lambda *a: evictions.append(1) or real_evict(*a))
+
+    keys = [f"k{i}" for i in range(60)]
+    for key in keys:
+        backend.set(key, {"note": key, "next": key})
+    assert backend.get(keys[-1]) == {"note": keys[-1], "next": keys[-1]}
+    assert backend.get(keys[0]) is None
+    assert sum(backend.get(k) is not None for k in keys) <= 20
+    # trims to 18 rows at insert 21, then again every third insert (24, 27, ..., 60)
+    assert backend.low_water == 18
+    assert len(evictions) == 14
+
+
+def test_sql_backend_concurrent_sets_on_same_key(db_engine):
+    from concurrent.futures import ThreadPoolExecutor
+
+    from sqlmodel import Session, select
+
+    from backend.app.models import ReflectionCacheEntry
+
+    backend = SqlCacheBackend(max_entries=20, ttl_seconds=60)
+    start = threading.Barrier(8)
+
+    def store(i):
+        start.wait()
+        backend.set("same", {"note": f"n{i}", "next": "m"})
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(store, range(8)))
+    with Session(db_engine) as session:
+        assert len(session.exec(select(ReflectionCacheEntry)).all()) == 1
+    assert backend.get("same")["next"] == "m"
+    assert backend._rows == 1
+
+
+def test_reflection_survives_cache_write_failure(fake_llm, db_engine, monkeypatch):
+    monkeypatch.setattr(settings, "reflection_cache_backend", "sql")
+
+    def broken(*args):
+        raise RuntimeError("disk full")
+
+    cache = reflection_cache.get_reflection_cache()
+    monkeypatch.setattr(cache.persistent, "set", broken)
+    result = asyncio.run(reflection.generate_reflection(TASK, "今天还活着"))
+    assert result != reflection.FALLBACK and result["next"]
+
+
+def test_reflection_cache_key_follows_task_wording():
+    key = reflection_cache.reflection_cache_key(TASK, "x", "p", "m", "v1")
+    assert key == reflection_cache.reflection_cache_key(dict(TASK), "x", "p", "m", "v1")
+    for field in ("title", "instruction", "hint"):
+        assert key != reflection_cache.reflection_cache_key({**TASK, field: "edited"}, "x", "p", "m", "v1")
+
+
+def test_llm_client_reused_across_calls(fake_llm, db_engine, monkeypatch):
+    from backend.app.services import llm, report
+
+    monkeypatch.setattr(settings, "reflection_cache_backend", "off")
+
+    async def many_calls():
+        for i in range(10):
+            await reflection.generate_reflection(TASK, f"text {i}")
+        log = SimpleNamespace(day_index=1, date_key="2026-01-01", normalized_text="x", reflection={"note": "n", "next": "m"})
+        await report.generate_report_text([log], "week")
+        await llm.close_llm_pool()
+
+    asyncio.run(many_calls())
+    assert fake_llm.calls == 11
+    assert fake_llm.instances == 1
+
+
+def test_llm_pool_bounds_clients_per_provider(fake_llm):
+    from backend.app.services.llm import LLMClientPool
+
+    pool = LLMClientPool(max_clients_per_provider=2)
+    in_use = {"now": 0, "max": 0}
+
+    async def call():
+        async with pool.client() as bot:
+            in_use["now"] += 1
+            in_use["max"] = max(in_use["max"], in_use["now"])
+            await asyncio.sleep(0.01)
+            in_use["now"] -= 1
+
+    async def main():
+        await asyncio.gather(*(call() for _ in range(8)))
+
+    asyncio.run(main())
+    assert in_use["max"] == 2
+    assert pool.clients_created() == 2
+
+
+def test_governor_serves_interactive_calls_before_background(fake_llm):
+    from backend.app.services.llm import BACKGROUND, INTERACTIVE, REPORT, LLMClientPool, llm_priority
+
+    pool = LLMClientPool(max_clients_per_provider=1)
+    order = []
+
+    async def call(name, priority=INTERACTIVE):
+        async with pool.client(priority=priority):
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    async def background(name):
+        with llm_priority(BACKGROUND):
+            # the floor wins over the priority the service asked for
+            await call(name, INTERACTIVE)
+
+    async def main():
+        first = asyncio.create_task(call("running"))
+        await asyncio.sleep(0)
+        await asyncio.gather(background("batch"), call("report", REPORT), call("checkin"))
+        await first
+
+    asyncio.run(main())
+    assert order == ["running", "checkin", "report", "batch"]
+
+
+def test_governor_rejects_when_queue_is_full_or_wait_times_out(fake_llm, monkeypatch):
+    from backend.app.services import llm
+
+    monkeypatch.setattr(settings, "reflection_cache_backend", "off")
+    pool = llm.LLMClientPool(max_clients_per_provider=1, max_queue=1, queue_timeout=0.05)
+    monkeypatch.setattr(llm, "_pool", pool)
+    labels = {"provider": settings.llm_provider, "priority": "interactive"}
+    before = {reason: llm.llm_rejected.value(reason=reason, **labels) for reason in ("queue_full", "timeout")}
+
+    async def hold(seconds):
+        async with pool.client():
+            await asyncio.sleep(seconds)
+
+    async def main():
+        holder = asyncio.create_task(hold(0.2))
+        await asyncio.sleep(0.01)
+        # the first reflection waits in the queue until it times out; the second finds it full
+        waiting = asyncio.create_task(reflection.generate_reflection(TASK, "waits"))
+        await asyncio.sleep(0.01)
+        turned_away = await reflection.generate_reflection(TASK, "turned away")
+        timed_out = await waiting
+        await holder
+        return turned_away, timed_out
+
+    assert asyncio.run(main()) == (reflection.FALLBACK, reflection.FALLBACK)
+    assert fake_llm.calls == 0
+    for reason in ("queue_full", "timeout"):
+        assert llm.llm_rejected.value(reason=reason, **labels) == before[reason] + 1
+    governor = pool.governor(settings.llm_provider)
+    assert governor.in_flight == 0 and governor.queued() == 0
+
+
+def test_governor_holds_calls_to_the_token_budget(fake_llm):
+    from backend.app.services.llm import ProviderGovernor
+
+    # 600 tokens per minute refill at 10 per second
+    governor = ProviderGovernor("fake", max_concurrency=4, tokens_per_minute=600)
+
+    async def call(tokens):
+        await governor.acquire(tokens=tokens)
+        governor.release()
+
+    async def main():
+        await call(600)
+        started = time.perf_counter()
+        await call(3)
+        return time.perf_counter() - started
+
+    waited = asyncio.run(main())
+    assert 0.2 <= waited < 1.0
+    assert governor.in_flight == 0
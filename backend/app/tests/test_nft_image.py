@@ -0,0 +1,156 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from backend.app.config import settings
+from backend.app.services import nft_image
+
+PNG = b"\x89PNG fake"
+
+
+class FakeProvider:
+    """Local HTTP server answering like Pollinations or Gemini after ``delay`` seconds."""
+
+    def __init__(self, kind: str, delay: float = 0.0, ok: bool = True):
+        self.kind, self.delay, self.ok = kind, delay, ok
+        self.hits = 0
+        provider = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self):
+                provider.hits += 1
+                time.sleep(provider.delay)
+                if not provider.ok:
+                    self.send_response(500)
+                    self.end_headers()
+                    return
+                if provider.kind == "pollinations":
+                    body, content_type = PNG, "image/png"
+                else:
+                    part = {"inlineData": {"mimeType": "image/png", "data": "R0VNSU5J"}}
+                    body = json.dumps({"candidates": [{"content": {"parts": [part]}}]}).encode()
+                    content_type = "application/json"
+                try:
+                    self.send_response(200)
+                    self.send_header("Content-Type", content_type)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client cancelled this provider
+
+            def do_GET(self):
+                self._reply()
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                self._reply()
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def providers(monkeypatch, image_store):
+    created = []
+
+    def make(pollinations: dict, gemini: dict):
+        p, g = FakeProvider("pollinations", **pollinations), FakeProvider("gemini", **gemini)
+        created.extend([p, g])
+        monkeypatch.setattr(settings, "pollinations_base_url", p.url)
+        monkeypatch.setattr(settings, "gemini_base_url", g.url)
+        return p, g
+
+    monkeypatch.setattr(settings, "nft_image_mode", "hedged")
+    monkeypatch.setattr(settings, "nft_hedge_delay_seconds", 0.1)
+    monkeypatch.setattr(settings, "nft_image_deadline_seconds", 2.0)
+    yield make
+    for server in created:
+        server.close()
+
+
+def _generate():
+    return nft_image.generate_nft_image(3, "t", "hello", "note", "next", gemini_api_key="key")
+
+
+def _outcomes(result):
+    return {a.provider: a.outcome for a in result.attempts}
+
+
+def test_fast_primary_never_launches_secondary(providers):
+    pollinations, gemini = providers({}, {})
+    result = _generate()
+    assert result.provider == "pollinations"
+    assert result.image.digest == hashlib.sha256(PNG).hexdigest()
+    assert gemini.hits == 0
+
+
+def test_hedge_wins_and_cancels_slow_primary(providers):
+    providers({"delay": 1.5}, {})
+    result = _generate()
+    assert result.provider == "gemini"
+    assert result.elapsed < 0.6
+    assert _outcomes(result) == {"gemini": "ok", "pollinations": "cancelled"}
+
+
+def test_failed_primary_starts_secondary_without_waiting(providers, monkeypatch):
+    monkeypatch.setattr(settings, "nft_hedge_delay_seconds", 5.0)
+    providers({"ok": False}, {})
+    result = _generate()
+    assert result.provider == "gemini" and result.elapsed < 1.0
+    assert _outcomes(result) == {"pollinations": "empty", "gemini": "ok"}
+
+
+def test_deadline_falls_back_to_svg(providers, monkeypatch):
+    monkeypatch.setattr(settings, "nft_image_deadline_seconds", 0.3)
+    providers({"delay": 1.5}, {"delay": 1.5})
+    result = _generate()
+    assert result.provider == "fallback"
+    assert result.image.content_type == "image/svg+xml"
+    assert result.elapsed < 0.6
+    assert set(_outcomes(result).values()) == {"cancelled"}
+
+
+def test_sequential_mode_waits_for_primary(providers, monkeypatch):
+    monkeypatch.setattr(settings, "nft_image_mode", "sequential")
+    providers({"delay": 0.4, "ok": False}, {})
+    result = _generate()
+    assert result.provider == "gemini" and result.elapsed >= 0.4
+
+
+def test_image_store_dedupes_and_evicts_least_recently_used(image_store):
+    from backend.app.services.image_store import ImageStore
+
+    store = ImageStore(image_store.root, max_bytes=250)
+    first = store.put(b"a" * 100, "image/png")
+    assert store.put(b"a" * 100, "image/png") == first
+    second = store.put(b"b" * 100, "image/png")
+    os.utime(store.open(second.name)[0], (0, 0))
+    assert store.open(first.name) is not None  # touched: now the most recently used
+    third = store.put(b"c" * 100, "image/webp")
+    assert store.open(second.name) is None
+    assert store.open(first.name) and store.open(third.name)
+    assert store.total_bytes == 200
+    assert not list((image_store.root / "tmp").iterdir())
+    assert ImageStore(image_store.root, max_bytes=250).total_bytes == 200
+
+
+def test_streamed_provider_leaves_no_partial_file_when_cancelled(providers, monkeypatch):
+    providers({"delay": 1.5}, {})
+    result = _generate()
+    assert result.provider == "gemini"
+    assert not list((nft_image.get_image_store().tmp_dir).iterdir())
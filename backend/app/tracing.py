@@ -0,0 +1,128 @@
+"""Per-request traces of graph execution: one span per graph run and per node invocation.
+
+TracingMiddleware decides per request whether to trace (TRACE_SAMPLE_RATE, or an
+``X-Trace-Sample: 1`` request header when DEBUG_HEADERS is on) and holds the Trace in a context
+variable; graph/agent.py records spans into it. A finished trace is appended to TRACE_FILE as one
+JSON line and, with DEBUG_HEADERS, summarized in ``X-Trace-Id`` and ``Server-Timing`` headers
+(only spans finished before the response starts, so streamed bodies show in the file only).
+"""
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from typing import List, Optional
+
+from .config import settings
+from .metrics import route_label
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Span:
+    name: str
+    kind: str  # graph | group (fan-out node) | node
+    flow: Optional[str]
+    start_ms: float  # offset from the start of the request
+    duration_ms: float
+    outcome: str  # ok | error
+    error: Optional[str] = None
+
+
+@dataclass
+class Trace:
+    trace_id: str
+    route: str = ""
+    started_at: float = field(default_factory=time.time)
+    started: float = field(default_factory=time.perf_counter)
+    status: Optional[int] = None
+    duration_ms: Optional[float] = None
+    spans: List[Span] = field(default_factory=list)
+
+    def add(self, name: str, kind: str, flow: Optional[str], started: float, error: Optional[BaseException]) -> None:
+        self.spans.append(Span(
+            name=name,
+            kind=kind,
+            flow=flow,
+            start_ms=round((started - self.started) * 1000, 3),
+            duration_ms=round((time.perf_counter() - started) * 1000, 3),
+            outcome="ok" if error is None else "error",
+            error=None if error is None else f"{error.__class__.__name__}: {error}",
+        ))
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{span.name};dur={span.duration_ms:.1f}" for span in self.spans)
+
+    def to_json(self) -> str:
+        record = asdict(self)
+        del record["started"]
+        return json.dumps(record, ensure_ascii=False)
+
+
+_current: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+_file_lock = threading.Lock()
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+def record_span(name: str, kind: str, flow: Optional[str], started: float, error: Optional[BaseException] = None) -> None:
+    """Add a span that began at time.perf_counter() == started and ends now; no-op when untraced."""
+    trace = _current.get()
+    if trace is not None:
+        trace.add(name, kind, flow, started, error)
+
+
+def _sampled(scope) -> bool:
+    if settings.debug_headers and (b"x-trace-sample", b"1") in scope.get("headers", ()):
+        return True
+    rate = settings.trace_sample_rate
+    return rate > 0 and (rate >= 1 or random.random() < rate)
+
+
+def export(trace: Trace) -> None:
+    if not settings.trace_file:
+        return
+    line = trace.to_json() + "\n"
+    try:
+        with _file_lock, open(settings.trace_file, "a", encoding="utf-8") as handle:
+            handle.write(line)
+    except OSError:
+        logger.exception("could not write trace to %s", settings.trace_file)
+
+
+class TracingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _sampled(scope):
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(trace_id=uuid.uuid4().hex)
+        token = _current.set(trace)
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start":
+                trace.status = message["status"]
+                if settings.debug_headers:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-trace-id", trace.trace_id.encode()))
+                    if trace.spans:
+                        headers.append((b"server-timing", trace.server_timing().encode()))
+                    message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            _current.reset(token)
+            trace.route = route_label(scope)
+            trace.duration_ms = round((time.perf_counter() - trace.started) * 1000, 3)
+            export(trace)